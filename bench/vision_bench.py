@@ -0,0 +1,364 @@
+# reproducible benchmarks for the vision pipeline, no webcam needed
+#
+#   python -m bench.vision_bench run --out results.json
+#   python -m bench.vision_bench run --clips bench/clips --resolutions 720p
+#   python -m bench.vision_bench compare baseline.json results.json
+#
+# every stage runs against deterministic synthetic frames at each resolution
+# and against any recorded clips found in --clips (bench/clips by default).
+# results are written as JSON with fps and p50/p95/p99 latency per stage,
+# plus how much each stage grew the resident set and its peak.
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import sys
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import vision.analysis as analysis
+from core.buffers import FrameArena
+import vision.contact_logic as contact_logic
+import vision.grass_detection as grass_detection
+import vision.render as render
+import vision.sources as frame_sources
+import vision.trackers as trackers
+from ui.meme_compositor import MemeCompositor
+
+RESOLUTIONS = {
+    "480p": (640, 480),
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+}
+
+STAGES = ("detect_grass", "grass_mask", "grass_incremental", "contact",
+          "body_tracker", "composite", "end_to_end")
+
+CLIPS_DIR = os.path.join(os.path.dirname(__file__), "clips")
+CLIP_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", frame_sources.RAW_EXTENSION)
+MEME_DIR = os.path.join(ROOT, "ui", "assets")
+MEME_FILES = ("grass-meme1.jpg", "grass-meme2.jpg", "grass-meme3.jpg",
+              "leaf.jpg", "warning-text.jpg")
+
+DEFAULT_FRAMES = 120
+WARMUP_FRAMES = 5
+# relative p95 slowdown that compare reports as a regression
+REGRESSION_THRESHOLD = 0.10
+
+
+def synthetic_frames(width, height, count, seed=0):
+    # sky, a textured lawn and a figure walking across it; fully deterministic
+    rng = np.random.default_rng(seed)
+    base = np.empty((height, width, 3), dtype=np.uint8)
+    horizon = int(height * 0.45)
+    base[:horizon] = (200, 170, 120)
+    base[horizon:] = (40, 150, 60)
+    noise = rng.integers(0, 40, (height, width, 3), dtype=np.uint8)
+    base = cv2.add(base, noise)
+    base = cv2.GaussianBlur(base, (5, 5), 0)
+
+    frames = []
+    for i in range(count):
+        frame = base.copy()
+        cx = int(width * (0.2 + 0.6 * (i % 60) / 60))
+        unit = height / 10
+        # torso, head and limbs as skin and clothing coloured blobs
+        cv2.ellipse(frame, (cx, int(height * 0.55)), (int(unit), int(unit * 2)),
+                    0, 0, 360, (60, 60, 160), -1)
+        cv2.circle(frame, (cx, int(height * 0.3)), int(unit * 0.7), (140, 170, 220), -1)
+        swing = int(unit * math.sin(i * 0.3))
+        for side in (-1, 1):
+            foot = (cx + side * int(unit) + swing * side, int(height * 0.95))
+            cv2.line(frame, (cx, int(height * 0.7)), foot, (80, 60, 40), int(unit * 0.4))
+        frames.append(frame)
+    return frames
+
+
+def clip_frames(path, width, height, count):
+    # the first `count` frames of a recorded clip, resized to the resolution
+    cap = frame_sources.open_source(path, realtime=False, decode_ahead=0).acquire()
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame.shape[:2] != (height, width):
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def synthetic_landmarks(count, seed=0):
+    # plausible landmark arrays for the contact stage
+    rng = np.random.default_rng(seed)
+    landmarks = rng.random((count, contact_logic.LANDMARK_COUNT, 4)).astype(np.float32)
+    landmarks[..., 1] = 0.3 + 0.7 * landmarks[..., 1]
+    landmarks[..., 3] = 1.0
+    return landmarks
+
+
+def load_memes():
+    images = []
+    for name in MEME_FILES:
+        img = cv2.imread(os.path.join(MEME_DIR, name))
+        if img is not None:
+            images.append(cv2.resize(img, (300, 300)))
+    return images
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def rss_mb():
+    # current resident set size; the peak where /proc is not available
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def summarize(samples):
+    ms = np.asarray(samples) * 1000.0
+    mean = float(ms.mean())
+    return {
+        "frames": int(ms.size),
+        "fps": 1000.0 / mean if mean > 0 else 0.0,
+        "mean_ms": mean,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+def time_stage(step, frames):
+    # runs step(i, frame) over every frame after a short warm-up
+    for i, frame in enumerate(frames[:WARMUP_FRAMES]):
+        step(i, frame)
+
+    samples = []
+    for i, frame in enumerate(frames):
+        start = time.perf_counter()
+        step(i, frame)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+class StageRunner:
+    # owns the models shared by the stages; everything that caches per
+    # resolution is built fresh in steps(), so results do not depend on the
+    # order the resolutions run in
+    def __init__(self, tracker_backend, model_complexity):
+        self.tracker = None
+        self.tracker_backend = tracker_backend
+        self.model_complexity = model_complexity
+        self.meme_images = load_memes()
+
+    def get_tracker(self):
+        if self.tracker is None:
+            self.tracker = trackers.create_tracker(self.tracker_backend,
+                                                   self.model_complexity)
+        return self.tracker
+
+    def close(self):
+        if self.tracker is not None:
+            self.tracker.close()
+
+    def steps(self, width, height, count):
+        landmarks = synthetic_landmarks(count)
+        detector = grass_detection.IncrementalGrassDetector()
+        e2e_detector = grass_detection.IncrementalGrassDetector()
+        e2e_arena = FrameArena()
+        # sprites are cached per scale and angle, which the frame size bounds
+        memes = MemeCompositor(self.meme_images)
+        masks = {}
+
+        def grass_for(i, frame):
+            if i not in masks:
+                masks[i] = grass_detection.detect_grass_mask(frame)
+            return masks[i]
+
+        def detect_grass(i, frame):
+            grass_detection.detect_grass(frame)
+
+        def grass_mask(i, frame):
+            grass_detection.detect_grass_mask(frame)
+
+        def grass_incremental(i, frame):
+            detector.detect(frame)
+
+        def contact(i, frame):
+            grass = grass_for(i, frame)
+            contact_logic.detect_contacts(landmarks[i % count], grass)
+
+        def body(i, frame):
+            image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            self.get_tracker().process(image)
+
+        def composite(i, frame):
+            out = frame.copy()
+            for m in range(len(memes)):
+                memes.draw(out, m, (i * 37 + m * 211) % width,
+                                (i * 23 + m * 97) % height,
+                                (i * 9 + m * 72) % 360,
+                                0.5 + 0.8 * abs(math.sin(i * 0.15 + m)), 0.6)
+
+        def end_to_end(i, frame):
+            mirrored = cv2.flip(frame, 1, dst=e2e_arena.frame_like(frame))
+            result = analysis.analyze_frame(mirrored, self.get_tracker(), e2e_detector,
+                                            arena=e2e_arena)
+            scene = render.render(mirrored, result, render.RENDER_FULL, arena=e2e_arena)
+            composite(i, scene)
+            cv2.cvtColor(scene, cv2.COLOR_BGR2RGB, dst=e2e_arena.scratch_like("display", scene))
+
+        return {
+            "detect_grass": detect_grass,
+            "grass_mask": grass_mask,
+            "grass_incremental": grass_incremental,
+            "contact": contact,
+            "body_tracker": body,
+            "composite": composite,
+            "end_to_end": end_to_end,
+        }
+
+
+def run(args):
+    resolutions = args.resolutions.split(",")
+    stages = args.stages.split(",") if args.stages else list(STAGES)
+    for name in resolutions:
+        if name not in RESOLUTIONS:
+            raise SystemExit(f"Unknown resolution: {name}")
+    for stage in stages:
+        if stage not in STAGES:
+            raise SystemExit(f"Unknown stage: {stage}")
+
+    clips = []
+    if os.path.isdir(args.clips):
+        clips = sorted(os.path.join(args.clips, name) for name in os.listdir(args.clips)
+                       if name.lower().endswith(CLIP_EXTENSIONS))
+
+    runner = StageRunner(args.tracker, args.model_complexity)
+    results = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "system": platform.system(),
+            "cpu_count": os.cpu_count(),
+            "cv2_threads": cv2.getNumThreads(),
+            "frames": args.frames,
+            "tracker": f"{args.tracker}:{args.model_complexity}",
+        },
+        "runs": [],
+    }
+
+    try:
+        for name in resolutions:
+            width, height = RESOLUTIONS[name]
+            sources = [("synthetic", synthetic_frames(width, height, args.frames))]
+            for clip in clips:
+                frames = clip_frames(clip, width, height, args.frames)
+                if frames:
+                    sources.append((os.path.basename(clip), frames))
+
+            for source, frames in sources:
+                steps = runner.steps(width, height, len(frames))
+                for stage in stages:
+                    rss_before, peak_before = rss_mb(), peak_rss_mb()
+                    summary = time_stage(steps[stage], frames)
+                    summary.update({
+                        "stage": stage,
+                        "resolution": name,
+                        "source": source,
+                        # growth during this stage only: ru_maxrss is a
+                        # process-wide peak and never comes down again
+                        "rss_delta_mb": rss_mb() - rss_before,
+                        "peak_rss_delta_mb": peak_rss_mb() - peak_before,
+                    })
+                    results["runs"].append(summary)
+                    print(f"{name:>6} {source:<20} {stage:<18} "
+                          f"{summary['fps']:8.1f} fps  p50 {summary['p50_ms']:7.2f} ms  "
+                          f"p95 {summary['p95_ms']:7.2f} ms  p99 {summary['p99_ms']:7.2f} ms")
+    finally:
+        runner.close()
+
+    results["meta"]["peak_rss_mb"] = peak_rss_mb()
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Peak RSS {results['meta']['peak_rss_mb']:.0f} MB, wrote {args.out}")
+    return 0
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    def key(run):
+        return run["resolution"], run["source"], run["stage"]
+
+    before = {key(run): run for run in baseline["runs"]}
+    regressions = 0
+    for run in current["runs"]:
+        old = before.get(key(run))
+        if old is None or old["p95_ms"] <= 0:
+            continue
+        change = run["p95_ms"] / old["p95_ms"] - 1.0
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{run['resolution']:>6} {run['source']:<20} {run['stage']:<18} "
+              f"p95 {old['p95_ms']:7.2f} -> {run['p95_ms']:7.2f} ms ({change * 100:+6.1f}%){flag}")
+
+    print(f"{regressions} regression(s) above {args.threshold * 100:.0f}%")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vision pipeline benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--out", default="bench_results.json")
+    run_parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES)
+    run_parser.add_argument("--resolutions", default=",".join(RESOLUTIONS))
+    run_parser.add_argument("--stages", help=f"comma separated subset of {','.join(STAGES)}")
+    run_parser.add_argument("--clips", default=CLIPS_DIR,
+                            help="directory of recorded clips to replay")
+    run_parser.add_argument("--tracker", default=trackers.DEFAULT_BACKEND,
+                            choices=trackers.BACKENDS)
+    run_parser.add_argument("--model-complexity", type=int,
+                            default=trackers.DEFAULT_MODEL_COMPLEXITY)
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        return run(args)
+    return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# preallocated frame buffers, so steady-state frames allocate nothing
+#
+# a FrameArena belongs to one thread (a pipeline stage, the GUI) and holds two
+# kinds of buffers, both allocated once per resolution:
+#   scratch(name, shape) - temporaries that never leave the current call
+#                          chain, such as the HSV copy or a blend target
+#   frame(shape)         - frames handed to other threads. they come from a
+#                          small pool as leases: the array handed out wraps
+#                          a pooled buffer, every view of it keeps it alive,
+#                          and once the last of them is gone a finalizer puts
+#                          the buffer back. a frame still sitting in a queue
+#                          or on screen is never overwritten, and nobody has
+#                          to remember to give a frame back
+import collections
+import weakref
+
+import numpy as np
+
+# frames a pool keeps before it gives up recycling and just allocates
+MAX_POOLED_FRAMES = 8
+
+
+class FrameArena:
+    def __init__(self, max_frames=MAX_POOLED_FRAMES):
+        self.max_frames = max_frames
+        self._scratch = {}
+        # pooled buffers that are not leased; leases end on whichever thread
+        # drops the last reference, and deque appends and pops are atomic
+        self._free = collections.deque()
+        self._pooled = 0
+        self._frame_key = None
+        self.allocations = 0
+        self.overflows = 0
+
+    def scratch(self, name, shape, dtype=np.uint8):
+        buffer = self._scratch.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = self._scratch[name] = np.empty(shape, dtype)
+            self.allocations += 1
+        return buffer
+
+    def scratch_like(self, name, array):
+        return self.scratch(name, array.shape, array.dtype)
+
+    def filled(self, name, shape, value, dtype=np.uint8):
+        # constant image, e.g. a solid colour to blend with; only written
+        # when it is (re)allocated, so callers must not draw on it
+        key = (name, value)
+        buffer = self._scratch.get(key)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = self._scratch[key] = np.empty(shape, dtype)
+            buffer[...] = value
+            self.allocations += 1
+        return buffer
+
+    def frame(self, shape, dtype=np.uint8):
+        key = (tuple(shape), np.dtype(dtype))
+        if key != self._frame_key:
+            # new resolution: leased buffers go away with their last user
+            self._free.clear()
+            self._pooled = 0
+            self._frame_key = key
+
+        while self._free:
+            buffer = self._free.pop()
+            # a lease of the old resolution may end after the switch
+            if (buffer.shape, buffer.dtype) == key:
+                return self._lease(buffer, key)
+
+        buffer = np.empty(shape, dtype)
+        self.allocations += 1
+        if self._pooled >= self.max_frames:
+            # more frames in flight than the pool holds
+            self.overflows += 1
+            return buffer
+        self._pooled += 1
+        return self._lease(buffer, key)
+
+    def _lease(self, buffer, key):
+        # an array over the buffer's memory, not a view of the buffer: views
+        # taken from it keep it (not just the buffer) alive, so the finalizer
+        # runs after the last of them
+        frame = np.asarray(memoryview(buffer))
+        finalizer = weakref.finalize(frame, self._return, buffer, key)
+        finalizer.atexit = False
+        return frame
+
+    def _return(self, buffer, key):
+        if key == self._frame_key:
+            self._free.append(buffer)
+
+    def frame_like(self, array):
+        return self.frame(array.shape, array.dtype)
+
+    def copy(self, array):
+        # pooled replacement for array.copy()
+        out = self.frame_like(array)
+        np.copyto(out, array)
+        return out
+
+    def nbytes(self):
+        frame_bytes = 0
+        if self._frame_key is not None:
+            shape, dtype = self._frame_key
+            frame_bytes = self._pooled * int(np.prod(shape)) * dtype.itemsize
+        return sum(buffer.nbytes for buffer in self._scratch.values()) + frame_bytes
+
+    def stats(self):
+        return {
+            "allocations": self.allocations,
+            "overflows": self.overflows,
+            "pooled_frames": self._pooled,
+            "free_frames": len(self._free),
+            "bytes": self.nbytes(),
+        }
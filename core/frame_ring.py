@@ -0,0 +1,133 @@
+# shared-memory ring of frames, one writer process and any number of readers
+#
+# the ring is a header followed by `slots` fixed-size slots. the writer fills
+# slots round robin; every slot carries the sequence number of the frame in it,
+# which is cleared while the slot is being written (a seqlock). readers map a
+# slot without copying and check the sequence number again once they are done:
+# if it changed, the writer lapped them and the frame is dropped. with a few
+# slots a reader has several frame times to use a frame before that happens.
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+RING_MAGIC = b"TGFR"
+RING_VERSION = 1
+DEFAULT_SLOTS = 4
+
+HEADER = np.dtype([
+    ("magic", "S4"),
+    ("version", "<u4"),
+    ("slots", "<u4"),
+    ("slot_bytes", "<u8"),
+    ("latest", "<u8"),  # sequence number of the newest complete frame
+])
+SLOT_HEADER = np.dtype([
+    ("seq", "<u8"),  # 0 while the slot is being written
+    ("height", "<u4"),
+    ("width", "<u4"),
+    ("channels", "<u4"),
+    ("timestamp", "<f8"),
+])
+HEADER_SIZE = 64
+SLOT_HEADER_SIZE = 64
+
+
+class FrameRing:
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        buf = shm.buf
+        self.header = np.ndarray((), dtype=HEADER, buffer=buf)
+        if self.header["magic"] != RING_MAGIC or self.header["version"] != RING_VERSION:
+            raise ValueError(f"{shm.name} is not a frame ring")
+
+        self.slots = int(self.header["slots"])
+        self.slot_bytes = int(self.header["slot_bytes"])
+        stride = SLOT_HEADER_SIZE + self.slot_bytes
+        self._slot_headers = []
+        self._slot_data = []
+        for i in range(self.slots):
+            offset = HEADER_SIZE + i * stride
+            self._slot_headers.append(np.ndarray((), dtype=SLOT_HEADER, buffer=buf, offset=offset))
+            self._slot_data.append(np.ndarray((self.slot_bytes,), dtype=np.uint8, buffer=buf,
+                                              offset=offset + SLOT_HEADER_SIZE))
+
+    @classmethod
+    def create(cls, slot_bytes, slots=DEFAULT_SLOTS, name=None):
+        size = HEADER_SIZE + slots * (SLOT_HEADER_SIZE + slot_bytes)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((), dtype=HEADER, buffer=shm.buf)
+        header["magic"] = RING_MAGIC
+        header["version"] = RING_VERSION
+        header["slots"] = slots
+        header["slot_bytes"] = slot_bytes
+        header["latest"] = 0
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        shm = shared_memory.SharedMemory(name=name)
+        # the creating process owns the block; without this the resource
+        # tracker would unlink it when this reader exits
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def latest(self):
+        return int(self.header["latest"])
+
+    def publish(self, frame, timestamp=0.0):
+        # copy a frame into the next slot; returns its sequence number
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"frame of {frame.nbytes} bytes does not fit a "
+                             f"{self.slot_bytes} byte slot")
+        seq = self.latest + 1
+        slot = self._slot_headers[seq % self.slots]
+        slot["seq"] = 0
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        data = self._slot_data[seq % self.slots][:frame.nbytes].reshape(frame.shape)
+        np.copyto(data, frame)
+        slot["height"], slot["width"], slot["channels"] = height, width, channels
+        slot["timestamp"] = timestamp
+        slot["seq"] = seq
+        self.header["latest"] = seq
+        return seq
+
+    def view(self, seq):
+        # zero-copy view of frame `seq`, or None if it has been overwritten;
+        # check valid(seq) after using the view
+        slot = self._slot_headers[seq % self.slots]
+        if seq == 0 or int(slot["seq"]) != seq:
+            return None
+        height, width, channels = int(slot["height"]), int(slot["width"]), int(slot["channels"])
+        shape = (height, width, channels) if channels > 1 else (height, width)
+        count = height * width * channels
+        return self._slot_data[seq % self.slots][:count].reshape(shape)
+
+    def valid(self, seq):
+        return int(self._slot_headers[seq % self.slots]["seq"]) == seq
+
+    def read(self, seq, out=None):
+        # copy of frame `seq`, or None if it was overwritten before or during
+        # the copy
+        view = self.view(seq)
+        if view is None:
+            return None
+        if out is None or out.shape != view.shape:
+            out = np.empty_like(view)
+        np.copyto(out, view)
+        return out if self.valid(seq) else None
+
+    def close(self):
+        self.header = None
+        self._slot_headers = []
+        self._slot_data = []
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,289 @@
+# lightweight per-stage timing hooks with rolling histograms
+#
+#   with metrics.stage("grass"):
+#       ...
+#
+# hooks are a shared no-op when metrics are disabled. when enabled every stage
+# feeds a log-bucketed histogram covering the last WINDOW_SECONDS or so, which
+# can be shown on the lockout screen and exported for the fleet dashboards:
+#
+#   TOUCH_GRASS_METRICS=hud,jsonl=/tmp/touch-grass.jsonl,http=9464
+import json
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_ENV = "TOUCH_GRASS_METRICS"
+
+# buckets grow by 2^(1/4) from 10 us, which covers up to ~40 s in 88 buckets
+BUCKET_BASE_SECONDS = 1e-5
+BUCKETS_PER_OCTAVE = 4
+BUCKET_COUNT = 88
+
+# a histogram keeps two windows and rotates them, so percentiles cover
+# between one and two windows of samples
+WINDOW_SECONDS = 10.0
+
+EXPORT_INTERVAL = 5.0
+HTTP_HOST = "127.0.0.1"
+
+
+class Histogram:
+    def __init__(self, window=WINDOW_SECONDS, clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        self._current = [0] * BUCKET_COUNT
+        self._previous = [0] * BUCKET_COUNT
+        self._rotated_at = clock()
+        self.total = 0
+        self.last = 0.0
+
+    def record(self, seconds):
+        now = self.clock()
+        if now - self._rotated_at >= self.window:
+            self._previous = self._current
+            self._current = [0] * BUCKET_COUNT
+            self._rotated_at = now
+
+        if seconds <= BUCKET_BASE_SECONDS:
+            bucket = 0
+        else:
+            bucket = int(math.log2(seconds / BUCKET_BASE_SECONDS) * BUCKETS_PER_OCTAVE)
+            bucket = min(bucket, BUCKET_COUNT - 1)
+        self._current[bucket] += 1
+        self.total += 1
+        self.last = seconds
+
+    @staticmethod
+    def bucket_upper(bucket):
+        return BUCKET_BASE_SECONDS * 2 ** ((bucket + 1) / BUCKETS_PER_OCTAVE)
+
+    def percentiles(self, quantiles=(0.5, 0.95, 0.99)):
+        counts = [a + b for a, b in zip(self._current, self._previous)]
+        total = sum(counts)
+        if total == 0:
+            return [0.0] * len(quantiles)
+
+        results = []
+        for q in quantiles:
+            target = q * total
+            seen = 0
+            for bucket, count in enumerate(counts):
+                seen += count
+                if seen >= target:
+                    results.append(self.bucket_upper(bucket))
+                    break
+        return results
+
+    def window_count(self):
+        return sum(self._current) + sum(self._previous)
+
+
+class _NullTimer:
+    # shared context manager used while metrics are off
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _StageTimer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.record(time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.hud = False
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._exporters = []
+        self._frame_times = Histogram()
+        self._last_frame = None
+
+    def enable(self, hud=False):
+        self.enabled = True
+        self.hud = hud
+
+    def _histogram(self, name):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram())
+        return histogram
+
+    def stage(self, name):
+        # `with metrics.stage("name"):` times the block
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self._histogram(name))
+
+    def record(self, name, seconds):
+        if self.enabled:
+            self._histogram(name).record(seconds)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        if self.enabled:
+            self._gauges[name] = value
+
+    def frame(self):
+        # call once per presented frame; feeds the fps figure
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self._last_frame is not None:
+            self._frame_times.record(now - self._last_frame)
+        self._last_frame = now
+
+    def snapshot(self):
+        stages = {}
+        with self._lock:
+            histograms = list(self._histograms.items())
+        for name, histogram in histograms:
+            p50, p95, p99 = histogram.percentiles()
+            stages[name] = {
+                "count": histogram.total,
+                "last_ms": histogram.last * 1000.0,
+                "p50_ms": p50 * 1000.0,
+                "p95_ms": p95 * 1000.0,
+                "p99_ms": p99 * 1000.0,
+            }
+
+        frame_p50 = self._frame_times.percentiles((0.5,))[0]
+        return {
+            "time": time.time(),
+            "fps": 1.0 / frame_p50 if frame_p50 > 0 else 0.0,
+            "stages": stages,
+            "counters": dict(self._counters),
+            "gauges": dict(self._gauges),
+        }
+
+    def add_exporter(self, exporter):
+        self._exporters.append(exporter)
+        exporter.start(self)
+
+    def close(self):
+        for exporter in self._exporters:
+            exporter.stop()
+        self._exporters = []
+
+
+class JsonlExporter:
+    # appends one snapshot per interval to a JSON lines file
+    def __init__(self, path, interval=EXPORT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, metrics):
+        self._thread = threading.Thread(
+            target=self._run, args=(metrics,), name="metrics-jsonl", daemon=True)
+        self._thread.start()
+
+    def _run(self, metrics):
+        while not self._stop.wait(self.interval):
+            try:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(metrics.snapshot()) + "\n")
+            except OSError as e:
+                print(f"Warning: Could not write metrics to {self.path}: {e}")
+
+    def stop(self):
+        self._stop.set()
+
+
+class HttpExporter:
+    # serves the latest snapshot as JSON on http://127.0.0.1:<port>/metrics
+    def __init__(self, port, host=HTTP_HOST):
+        self.port = port
+        self.host = host
+        self._server = None
+
+    def start(self, metrics):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = json.dumps(metrics.snapshot()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            print(f"Warning: Could not serve metrics on port {self.port}: {e}")
+            return
+        threading.Thread(target=self._server.serve_forever,
+                         name="metrics-http", daemon=True).start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# process-wide registry used by the timing hooks
+metrics = Metrics()
+
+
+def configure_from_env():
+    # parses $TOUCH_GRASS_METRICS, e.g. "hud,jsonl=/tmp/m.jsonl,http=9464"
+    spec = os.environ.get(METRICS_ENV, "")
+    if not spec:
+        return metrics
+
+    hud = False
+    for item in spec.split(","):
+        name, _, value = item.strip().partition("=")
+        if name == "hud":
+            hud = True
+        elif name == "jsonl":
+            metrics.add_exporter(JsonlExporter(value or "touch_grass_metrics.jsonl"))
+        elif name == "http":
+            try:
+                port = int(value or 9464)
+            except ValueError:
+                port = -1
+            if 0 <= port <= 65535:
+                metrics.add_exporter(HttpExporter(port))
+            else:
+                print(f"Warning: Invalid metrics port {value}")
+        elif name not in ("on", "1"):
+            print(f"Warning: Unknown metrics option {name}")
+    metrics.enable(hud=hud)
+    return metrics
@@ -0,0 +1,432 @@
+# staged capture -> analysis pipeline that feeds the lockout screen
+#
+# the capture thread reads the camera, the analysis thread runs grass detection
+# and body tracking, and the GUI thread only picks up the newest finished result.
+# stages are linked by bounded "latest frame wins" queues, so a slow inference
+# call drops stale frames instead of piling up latency.
+import collections
+import threading
+import time
+
+import cv2
+
+from core.buffers import FrameArena
+from core.metrics import metrics
+
+
+class LatestQueue:
+    # bounded queue where a put on a full queue evicts the oldest item
+    def __init__(self, maxsize=1):
+        self.maxsize = max(1, maxsize)
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.put_count = 0
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self.put_count += 1
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        # blocks until an item arrives, the queue is closed or the timeout expires
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if self._items:
+                return self._items.popleft()
+            return None
+
+    def get_nowait(self):
+        with self._cond:
+            if self._items:
+                return self._items.popleft()
+            return None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def reopen(self):
+        with self._cond:
+            self._items.clear()
+            self._closed = False
+
+    def depth(self):
+        with self._cond:
+            return len(self._items)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "depth": len(self._items),
+                "maxsize": self.maxsize,
+                "put": self.put_count,
+                "dropped": self.dropped,
+            }
+
+
+class FramePacket:
+    # one frame travelling through the pipeline
+    __slots__ = ("seq", "captured_at", "frame", "result", "analysis_time")
+
+    def __init__(self, seq, captured_at, frame, result=None):
+        self.seq = seq
+        self.captured_at = captured_at
+        self.frame = frame
+        self.result = result
+        self.analysis_time = 0.0
+
+
+# seconds between retries once reading the source raises
+READ_ERROR_BACKOFF = 0.1
+
+
+class CaptureStage:
+    # reads and mirrors camera frames on its own thread
+    def __init__(self, cap, output, mirror=True):
+        self.cap = cap
+        self.output = output
+        self.mirror = mirror
+        # minimum seconds between reads, raised by the quality governor
+        self.frame_interval = 0.0
+        self.frames = 0
+        self.read_failures = 0
+        # reads that raised; the first one is printed
+        self.errors = 0
+        # mirrored frames are written into recycled buffers
+        self.arena = FrameArena()
+        self._seq = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="capture", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout=None):
+        # the handle is kept while the thread outlives the timeout, e.g. in
+        # a camera read that hangs, so it is not started a second time
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if not self._thread.is_alive():
+                self._thread = None
+
+    @property
+    def alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        last_read = 0.0
+        while not self._stop.is_set():
+            wait = last_read + self.frame_interval - time.monotonic()
+            if wait > 0 and self._stop.wait(wait):
+                break
+            last_read = time.monotonic()
+
+            try:
+                with metrics.stage("capture"):
+                    ret, frame = self.cap.read()
+            except Exception as e:
+                # e.g. a decoder error from a file source, raised again on
+                # every read: count it like a failed read, say so once and
+                # back off instead of losing the thread
+                self.read_failures += 1
+                self.errors += 1
+                if self.errors == 1:
+                    print(f"Capture failed: {e}")
+                self._stop.wait(READ_ERROR_BACKOFF)
+                continue
+            if not ret:
+                self.read_failures += 1
+                time.sleep(0.01)
+                continue
+
+            if self.mirror:
+                with metrics.stage("flip"):
+                    frame = cv2.flip(frame, 1, dst=self.arena.frame_like(frame))
+
+            self._seq += 1
+            self.frames += 1
+            self.output.put(FramePacket(self._seq, time.monotonic(), frame))
+
+
+class AnalysisStage:
+    # runs the analysis callback on the newest captured frame
+    def __init__(self, analyze, input_queue, output):
+        self.analyze = analyze
+        self.input = input_queue
+        self.output = output
+        self.frames = 0
+        self.errors = 0
+        self.last_latency = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="analysis", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout=None):
+        # see CaptureStage.join, e.g. an inference call that is still running
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if not self._thread.is_alive():
+                self._thread = None
+
+    @property
+    def alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop.is_set():
+            packet = self.input.get(timeout=0.1)
+            if packet is None:
+                continue
+
+            started = time.perf_counter()
+            try:
+                with metrics.stage("analysis"):
+                    packet.result = self.analyze(packet.frame)
+            except Exception as e:
+                self.errors += 1
+                print(f"Analysis failed: {e}")
+                continue
+
+            packet.analysis_time = time.perf_counter() - started
+            self.frames += 1
+            self.last_latency = time.monotonic() - packet.captured_at
+            self.output.put(packet)
+
+
+class FramePipeline:
+    # capture thread -> analysis thread -> results queue polled by the GUI
+    def __init__(self, cap, analyze, capture_depth=1, result_depth=1, mirror=True):
+        self.frames = LatestQueue(capture_depth)
+        self.results = LatestQueue(result_depth)
+        self.capture = CaptureStage(cap, self.frames, mirror=mirror)
+        self.analysis = AnalysisStage(analyze, self.frames, self.results)
+        self.presented = 0
+        self.running = False
+        # start() was asked for while threads of the last run were still busy
+        self.start_pending = False
+
+    def start(self):
+        # workers of the previous run may have outlived stop()'s timeout;
+        # restarting next to them would clear their stop flag and leave two
+        # threads per stage, so until they are gone the start is deferred to
+        # latest(), which the caller polls anyway
+        if self.running:
+            return True
+        self.capture.join(0)
+        self.analysis.join(0)
+        if self.capture.alive or self.analysis.alive:
+            if not self.start_pending:
+                print("Warning: Pipeline threads of the last run are still busy, "
+                      "starting once they are done")
+            self.start_pending = True
+            return False
+        self.start_pending = False
+        self.frames.reopen()
+        self.results.reopen()
+        self.analysis.start()
+        self.capture.start()
+        self.running = True
+        return True
+
+    def stop(self, timeout=1.0):
+        self.start_pending = False
+        if not self.running:
+            return
+        self.capture.stop()
+        self.analysis.stop()
+        self.frames.close()
+        self.results.close()
+        self.capture.join(timeout)
+        self.analysis.join(timeout)
+        self.running = False
+
+    def set_frame_interval(self, seconds):
+        self.capture.frame_interval = seconds
+
+    def latest(self, timeout=None):
+        # returns None when nothing new is ready; with a timeout, waits that
+        # long for the next result
+        if self.start_pending:
+            self.start()
+        if not self.running:
+            # the queues are closed, nothing arrives before the next start;
+            # a caller polling with a timeout must not spin meanwhile
+            if timeout:
+                time.sleep(timeout)
+            return None
+        if timeout is None:
+            packet = self.results.get_nowait()
+        else:
+            packet = self.results.get(timeout)
+        if packet is not None:
+            self.presented += 1
+            if metrics.enabled:
+                self.publish_metrics()
+        return packet
+
+    def publish_metrics(self):
+        metrics.gauge("capture_queue_depth", self.frames.depth())
+        metrics.gauge("capture_dropped", self.frames.dropped)
+        metrics.gauge("analysis_queue_depth", self.results.depth())
+        metrics.gauge("analysis_dropped", self.results.dropped)
+        metrics.gauge("analysis_errors", self.analysis.errors)
+
+    def stats(self):
+        return {
+            "capture": {
+                "frames": self.capture.frames,
+                "read_failures": self.capture.read_failures,
+                "errors": self.capture.errors,
+                "queue": self.frames.stats(),
+                "buffers": self.capture.arena.stats(),
+            },
+            "analysis": {
+                "frames": self.analysis.frames,
+                "errors": self.analysis.errors,
+                "latency_ms": self.analysis.last_latency * 1000.0,
+                "queue": self.results.stats(),
+            },
+            "present": {
+                "frames": self.presented,
+            },
+        }
+
+
+# lifecycle states of the vision pipeline
+IDLE = "idle"
+WARMING = "warming"
+ACTIVE = "active"
+DRAINING = "draining"
+
+# health value at which the camera and model start warming up
+WARM_THRESHOLD = 10
+
+
+class PipelineLifecycle:
+    # idle -> warming -> active -> draining -> idle, driven by the health value
+    #
+    # warm_up opens the camera and builds the model on a background thread,
+    # activate starts the worker threads, deactivate stops them and cool_down
+    # releases everything again so no compute runs while the bar ticks down.
+    # nothing here waits for the warm-up thread: a warm-up that is no longer
+    # needed cools down on that thread once it is done, and a lockout that
+    # arrives meanwhile starts the workers from there as well.
+    def __init__(self, warm_up, activate, deactivate, cool_down,
+                 warm_threshold=WARM_THRESHOLD):
+        self.warm_up = warm_up
+        self.activate = activate
+        self.deactivate = deactivate
+        self.cool_down = cool_down
+        self.warm_threshold = warm_threshold
+
+        self.state = IDLE
+        self._lock = threading.Lock()
+        self._warmed = False
+        self._activate_pending = False
+        self._cancel_pending = False
+
+    def on_health(self, value):
+        # called from the health bar every time the value changes
+        if value <= self.warm_threshold:
+            self._want_warm(activate=False)
+        elif self.state == WARMING:
+            # health came back before lockout, nothing needs the camera
+            self._cancel_warm()
+
+    def lock_out(self):
+        # lockout screen is showing: start as soon as warm-up has finished
+        self._want_warm(activate=True)
+
+    def recover(self):
+        # health restored, stop the workers and release the device
+        with self._lock:
+            self._activate_pending = False
+            was_active = self.state == ACTIVE
+            if was_active:
+                self.state = DRAINING
+        if was_active:
+            self.deactivate()
+            self._cool()
+        else:
+            self._cancel_warm()
+
+    def _want_warm(self, activate):
+        with self._lock:
+            self._cancel_pending = False
+            if activate and self.state != ACTIVE:
+                self._activate_pending = True
+            if self.state == WARMING and self._warmed and self._activate_pending:
+                self._start()
+            if self.state != IDLE:
+                # warming: _warm starts the workers if asked to. draining:
+                # _cool warms up again for a pending lockout
+                return
+            self.state = WARMING
+            self._warmed = False
+        threading.Thread(target=self._warm, name="warm-up", daemon=True).start()
+
+    def _cancel_warm(self):
+        with self._lock:
+            self._activate_pending = False
+            if self.state != WARMING:
+                return
+            if not self._warmed:
+                # the warm-up thread cools down when it gets to the end
+                self._cancel_pending = True
+                return
+            self.state = DRAINING
+        self._cool()
+
+    def _warm(self):
+        try:
+            self.warm_up()
+        except Exception as e:
+            print(f"Warm-up failed: {e}")
+
+        with self._lock:
+            self._warmed = True
+            cancelled, self._cancel_pending = self._cancel_pending, False
+            if cancelled:
+                self.state = DRAINING
+            elif self._activate_pending and self.state == WARMING:
+                self._start()
+        if cancelled:
+            self._cool()
+
+    def _start(self):
+        # caller holds the lock
+        self._activate_pending = False
+        self.state = ACTIVE
+        self.activate()
+
+    def _cool(self):
+        self.cool_down()
+        with self._lock:
+            self._warmed = False
+            self.state = IDLE
+            rewarm = self._activate_pending
+        if rewarm:
+            # locked out again while the last warm-up was being released
+            self._want_warm(activate=True)
@@ -0,0 +1,62 @@
+# loads slow-to-import parts of the app on a background thread ahead of use
+#
+# the health bar starts with Qt only. OpenCV, MediaPipe and the vision engine
+# are imported and built by a Preloader once the health gets low, so they are
+# ready by the time the lockout screen needs them.
+import os
+import threading
+import time
+
+# TOUCH_GRASS_PRELOAD_AT=25 starts loading the vision stack at 25 health;
+# 100 loads it right after startup
+PRELOAD_ENV = "TOUCH_GRASS_PRELOAD_AT"
+DEFAULT_PRELOAD_AT = 25
+
+
+def preload_threshold_from_env():
+    return float(os.environ.get(PRELOAD_ENV, DEFAULT_PRELOAD_AT))
+
+
+class Preloader:
+    # runs load() at most once on a background thread. on_done() is called on
+    # that thread when it has finished, result() waits for it
+    def __init__(self, load, on_done=None):
+        self.load = load
+        self.on_done = on_done
+        self.seconds = None
+        self._result = None
+        self._error = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def started(self):
+        return self._thread is not None
+
+    @property
+    def done(self):
+        return self.seconds is not None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="preload", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        began = time.perf_counter()
+        try:
+            self._result = self.load()
+        except Exception as e:
+            self._error = e
+        self.seconds = time.perf_counter() - began
+        if self.on_done is not None:
+            self.on_done()
+
+    def result(self):
+        # starts the load if nobody has yet, and blocks until it is done
+        self.start()
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._result
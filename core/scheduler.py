@@ -0,0 +1,327 @@
+# adaptive quality governor for the vision pipeline
+#
+# the governor watches how long each frame's analysis takes and how much CPU
+# the process burns, and walks a ladder of quality levels to stay inside a
+# frame budget: capture resolution, grass mask downscale, pose inference
+# interval and render level. it steps down as soon as a window of frames is
+# over budget and only steps back up after a few windows with clear headroom.
+# when nobody has been in frame for a while it drops to a low-rate presence
+# check and returns to the previous level on the first detection.
+#
+# the governor is opt-in: a fixed budget that the pose model cannot meet on a
+# given machine (Holistic alone takes about 38 ms on a laptop CPU) would only
+# walk every lockout down to the bottom of the ladder. the render level never
+# drops below the HUD, the lockout screen is useless without it.
+#
+# WakeScheduler is the app's single timer: every deadline goes into one heap,
+# one platform timer is armed for the earliest of them, and deadlines that may
+# run a little late are folded into wakeups that happen anyway.
+import heapq
+import itertools
+import os
+import sys
+import time
+
+# TOUCH_GRASS_BUDGET_MS=50 turns the governor on with a 50 ms per-frame
+# budget; unset or 0 leaves it off
+BUDGET_ENV = "TOUCH_GRASS_BUDGET_MS"
+DEFAULT_BUDGET = 1 / 30
+
+# share of all cores the process may use before quality is reduced
+CPU_BUDGET = 0.75
+
+# frames per evaluation window
+WINDOW_FRAMES = 30
+# step up only when the window's p90 is below this share of the budget ...
+RAISE_HEADROOM = 0.6
+# ... for this many windows in a row
+RAISE_AFTER_WINDOWS = 3
+
+# frames without anybody in view before switching to the presence check
+ABSENT_FRAMES = 60
+
+
+class QualitySettings:
+    __slots__ = ("name", "resolution", "mask_scale", "infer_every",
+                 "render_level", "frame_interval")
+
+    def __init__(self, name, resolution, mask_scale, infer_every, render_level,
+                 frame_interval=0.0):
+        self.name = name
+        self.resolution = resolution  # (width, height) requested from the camera
+        self.mask_scale = mask_scale  # grass mask pyramid scale
+        self.infer_every = infer_every  # pose inference on every Nth frame
+        self.render_level = render_level  # "none" / "hud" / "full"
+        self.frame_interval = frame_interval  # minimum seconds between captures
+
+    def __repr__(self):
+        return f"QualitySettings({self.name})"
+
+
+# best first; the governor moves one step at a time
+QUALITY_LEVELS = (
+    QualitySettings("high", (1280, 720), 0.25, 1, "full"),
+    QualitySettings("medium", (1280, 720), 0.25, 2, "full"),
+    QualitySettings("low", (960, 540), 0.2, 2, "hud"),
+    QualitySettings("lower", (640, 360), 0.25, 3, "hud"),
+    QualitySettings("lowest", (640, 360), 0.125, 4, "hud"),
+)
+
+# nobody in frame: a few cheap frames a second are enough to notice someone
+PRESENCE_CHECK = QualitySettings("presence", (640, 360), 0.125, 1, "hud", 0.5)
+
+
+class QualityGovernor:
+    # apply(settings) is called whenever the active settings change; it must
+    # push them into the camera, grass detector, tracker and renderer
+    def __init__(self, apply, budget=DEFAULT_BUDGET, cpu_budget=CPU_BUDGET,
+                 levels=QUALITY_LEVELS, presence=PRESENCE_CHECK,
+                 window=WINDOW_FRAMES, absent_frames=ABSENT_FRAMES,
+                 clock=time.monotonic, cpu_clock=time.process_time):
+        self.apply = apply
+        self.budget = budget
+        self.cpu_budget = cpu_budget
+        self.levels = levels
+        self.presence = presence
+        self.window = window
+        self.absent_frames = absent_frames
+        self.clock = clock
+        self.cpu_clock = cpu_clock
+        self.cores = os.cpu_count() or 1
+
+        self.level = 0
+        self.present = True
+        self.changes = 0
+        self.last_p90 = 0.0
+        self.last_cpu = 0.0
+        self.reset()
+
+    def reset(self):
+        # back to the best level, e.g. when the lockout screen comes up again
+        self.level = 0
+        self.present = True
+        self._absent = 0
+        self._headroom_windows = 0
+        self._start_window()
+        self.apply(self.settings)
+
+    @property
+    def settings(self):
+        return self.levels[self.level] if self.present else self.presence
+
+    def _start_window(self):
+        self._samples = []
+        self._window_wall = self.clock()
+        self._window_cpu = self.cpu_clock()
+
+    def observe(self, seconds, detected):
+        # one analysed frame: how long it took and whether anybody was in it
+        if detected:
+            self._absent = 0
+            if not self.present:
+                self.present = True
+                self._changed()
+                return
+        else:
+            self._absent += 1
+            if self.present and self._absent >= self.absent_frames:
+                self.present = False
+                self._changed()
+                return
+
+        if not self.present:
+            return
+
+        self._samples.append(seconds)
+        if len(self._samples) >= self.window:
+            self._evaluate()
+
+    def _evaluate(self):
+        samples = sorted(self._samples)
+        p90 = samples[int(0.9 * (len(samples) - 1))]
+        wall = self.clock() - self._window_wall
+        cpu = (self.cpu_clock() - self._window_cpu) / max(wall * self.cores, 1e-9)
+        self.last_p90, self.last_cpu = p90, cpu
+        self._start_window()
+
+        if p90 > self.budget or cpu > self.cpu_budget:
+            self._headroom_windows = 0
+            if self.level < len(self.levels) - 1:
+                self.level += 1
+                self._changed()
+        elif p90 < self.budget * RAISE_HEADROOM and cpu < self.cpu_budget * RAISE_HEADROOM:
+            self._headroom_windows += 1
+            if self._headroom_windows >= RAISE_AFTER_WINDOWS and self.level > 0:
+                self._headroom_windows = 0
+                self.level -= 1
+                self._changed()
+        else:
+            self._headroom_windows = 0
+
+    def _changed(self):
+        self.changes += 1
+        self._start_window()
+        self.apply(self.settings)
+
+    def stats(self):
+        return {
+            "level": self.settings.name,
+            "present": self.present,
+            "changes": self.changes,
+            "p90_ms": self.last_p90 * 1000.0,
+            "cpu": self.last_cpu,
+        }
+
+
+def budget_from_env():
+    # per-frame budget in seconds, or None when the governor is disabled
+    value = os.environ.get(BUDGET_ENV)
+    if not value:
+        return None
+    try:
+        budget = float(value) / 1000.0
+    except ValueError:
+        print(f"Warning: Invalid {BUDGET_ENV} value {value}, quality governor off")
+        return None
+    return budget if budget > 0 else None
+
+
+# monotonic clock that keeps counting while the machine is asleep
+if hasattr(time, "CLOCK_BOOTTIME"):
+    _SUSPEND_CLOCK = time.CLOCK_BOOTTIME  # Linux
+elif sys.platform == "darwin":
+    _SUSPEND_CLOCK = time.CLOCK_MONOTONIC  # includes sleep, unlike time.monotonic()
+else:
+    _SUSPEND_CLOCK = None
+
+
+def suspend_aware_clock():
+    if _SUSPEND_CLOCK is not None:
+        return time.clock_gettime(_SUSPEND_CLOCK)
+    if sys.platform == "win32":
+        # GetTickCount64 keeps counting through sleep
+        return time.monotonic()
+    # wall clock fallback: counts sleep, but follows clock adjustments too
+    return time.time()
+
+
+# how late a wakeup may run by default so it can share another one's wakeup
+DEFAULT_SLACK = 0.02
+
+
+class Wakeup:
+    __slots__ = ("deadline", "slack", "callback", "cancelled")
+
+    def __init__(self, deadline, slack, callback):
+        self.deadline = deadline
+        self.slack = slack
+        self.callback = callback
+        self.cancelled = False
+
+
+class WakeScheduler:
+    # arm(delay) must (re)start the one platform timer so fire() runs after
+    # `delay` seconds, or stop it when delay is None. a wakeup runs at the
+    # earliest at its deadline and at the latest `slack` seconds after it.
+    def __init__(self, arm, clock=suspend_aware_clock):
+        self.arm = arm
+        self.clock = clock
+        self.wakeups = 0
+        self.callbacks = 0
+        self._heap = []  # (latest, tie-breaker, Wakeup)
+        self._order = itertools.count()
+        self._armed_for = None
+
+    def call_at(self, deadline, callback, slack=DEFAULT_SLACK):
+        wakeup = Wakeup(deadline, slack, callback)
+        heapq.heappush(self._heap, (deadline + slack, next(self._order), wakeup))
+        self._rearm()
+        return wakeup
+
+    def call_later(self, delay, callback, slack=DEFAULT_SLACK):
+        return self.call_at(self.clock() + delay, callback, slack)
+
+    def cancel(self, wakeup):
+        # cancelled entries are dropped lazily as they reach the top
+        if wakeup is not None:
+            wakeup.cancelled = True
+        self._rearm()
+
+    def fire(self):
+        # run everything whose window has opened, including wakeups that could
+        # still have waited, then sleep until the next latest time
+        self.wakeups += 1
+        self._armed_for = None
+        now = self.clock()
+        due = []
+        waiting = []
+        for entry in self._heap:
+            if entry[2].cancelled:
+                continue
+            (due if entry[2].deadline <= now else waiting).append(entry)
+        heapq.heapify(waiting)
+        self._heap = waiting
+
+        due.sort(key=lambda entry: (entry[2].deadline, entry[1]))
+        for _, _, wakeup in due:
+            # an earlier callback may have cancelled this one
+            if wakeup.cancelled:
+                continue
+            wakeup.cancelled = True
+            self.callbacks += 1
+            wakeup.callback()
+        self._rearm()
+
+    def _rearm(self):
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            if self._armed_for is not None:
+                self._armed_for = None
+                self.arm(None)
+            return
+
+        latest = self._heap[0][0]
+        if self._armed_for != latest:
+            self._armed_for = latest
+            self.arm(max(latest - self.clock(), 0.0))
+
+
+class PeriodicTask:
+    # repeating callback on a WakeScheduler, started and stopped like a timer
+    def __init__(self, scheduler, interval, callback, slack=0.0):
+        self.scheduler = scheduler
+        self.interval = interval
+        self.callback = callback
+        self.slack = slack
+        self._wakeup = None
+
+    @property
+    def active(self):
+        return self._wakeup is not None
+
+    def start(self):
+        self.stop()
+        self._schedule(self.scheduler.clock())
+
+    def stop(self):
+        if self._wakeup is not None:
+            wakeup, self._wakeup = self._wakeup, None
+            self.scheduler.cancel(wakeup)
+
+    def set_interval(self, interval):
+        self.interval = interval
+        if self.active:
+            self.start()
+
+    def _schedule(self, base):
+        self._wakeup = self.scheduler.call_at(base + self.interval, self._tick, self.slack)
+
+    def _tick(self):
+        base = self._wakeup.deadline
+        now = self.scheduler.clock()
+        # after a stall, skip the missed ticks instead of firing them back to back
+        if now - base >= self.interval:
+            base = now
+        self._schedule(base)
+        self.callback()
@@ -0,0 +1,340 @@
+# crash-safe persistent health state
+#
+# every change to the health value is appended to a compact binary event log
+# (decay ticks, contact gains, lockouts, recoveries). a snapshot of the current
+# state plus the log offset it covers is written every so often, so restoring
+# is one snapshot read plus a replay of the short tail written after it.
+#
+# record() only appends to an in-memory queue. a writer thread batches the
+# queued events into one write, fsyncs at most once per FSYNC_INTERVAL and
+# takes the snapshots, so the GUI thread never waits on the disk. a torn or
+# corrupt record at the end of the log (power loss mid-write) is detected by
+# its CRC and dropped on restore; at worst the last FSYNC_INTERVAL is lost.
+import collections
+import math
+import os
+import struct
+import threading
+import time
+import zlib
+
+from core.scheduler import suspend_aware_clock
+
+STATE_DIR_ENV = "TOUCH_GRASS_STATE_DIR"
+DEFAULT_STATE_DIR = os.path.join(os.path.expanduser("~"), ".touch_grass")
+
+# event kinds
+DECAY = 1
+GAIN = 2
+LOCKOUT = 3
+RECOVER = 4
+RESET = 5
+# first record of every log generation, carrying the full state so a log can
+# be replayed without its snapshot; delta holds the lockout count
+CHECKPOINT = 6
+CHECKPOINT_LOCKED = 7
+
+FULL_HEALTH = 100.0
+# seconds for health to drop by one point
+DECAY_SECONDS_PER_POINT = 0.2
+
+# kind, wall time, delta, health after the event, then a CRC32 of those fields
+RECORD = struct.Struct("<Bdff")
+RECORD_CRC = struct.Struct("<I")
+RECORD_SIZE = RECORD.size + RECORD_CRC.size
+
+# magic, version, log generation, log offset covered, health, locked,
+# lockouts, updated time, then a CRC32 of those fields
+SNAPSHOT = struct.Struct("<4sBIQfBId")
+SNAPSHOT_CRC = struct.Struct("<I")
+SNAPSHOT_MAGIC = b"TGHS"
+SNAPSHOT_VERSION = 1
+
+SNAPSHOT_NAME = "health.snap"
+LOG_NAME = "health-{}.log"
+
+FSYNC_INTERVAL = 1.0
+SNAPSHOT_INTERVAL = 30.0
+# a new log generation is started at the next snapshot once the log is this big
+MAX_LOG_BYTES = 1024 * 1024
+
+
+class HealthState:
+    __slots__ = ("health", "locked", "lockouts", "updated_at")
+
+    def __init__(self, health=FULL_HEALTH, locked=False, lockouts=0, updated_at=0.0):
+        self.health = health
+        self.locked = locked
+        self.lockouts = lockouts
+        self.updated_at = updated_at
+
+    def apply(self, kind, t, delta, value):
+        # events carry the resulting health, so replay never accumulates error
+        self.health = value
+        self.updated_at = t
+        if kind == LOCKOUT:
+            self.locked = True
+            self.lockouts += 1
+        elif kind in (RECOVER, RESET):
+            self.locked = False
+        elif kind in (CHECKPOINT, CHECKPOINT_LOCKED):
+            self.locked = kind == CHECKPOINT_LOCKED
+            self.lockouts = int(delta)
+
+    def checkpoint(self):
+        kind = CHECKPOINT_LOCKED if self.locked else CHECKPOINT
+        return encode_record(kind, self.updated_at, self.lockouts, self.health)
+
+    def copy(self):
+        return HealthState(self.health, self.locked, self.lockouts, self.updated_at)
+
+
+class DecayingHealth:
+    # health as a function of time: the value at the last change minus the
+    # decay since, on a clock that keeps running while the machine sleeps.
+    # nothing has to tick for it to stay right; callers only look when the
+    # displayed value is due to change.
+    def __init__(self, value=FULL_HEALTH, seconds_per_point=DECAY_SECONDS_PER_POINT,
+                 clock=suspend_aware_clock):
+        self.seconds_per_point = seconds_per_point
+        self.clock = clock
+        self.decaying = False
+        self._value = value
+        self._since = clock()
+
+    def value(self):
+        if not self.decaying:
+            return self._value
+        elapsed = self.clock() - self._since
+        return max(self._value - elapsed / self.seconds_per_point, 0.0)
+
+    def displayed(self):
+        # whole points as shown on the bar; 100 until the first point is gone
+        return int(math.ceil(self.value()))
+
+    def set(self, value):
+        self._value = value
+        self._since = self.clock()
+
+    def start(self):
+        self.set(self.value())
+        self.decaying = True
+
+    def stop(self):
+        self.set(self.value())
+        self.decaying = False
+
+    def seconds_until(self, value):
+        # when health will have decayed to `value`, or None if it never will
+        if not self.decaying:
+            return None
+        return max((self.value() - value) * self.seconds_per_point, 0.0)
+
+
+def encode_record(kind, t, delta, value):
+    body = RECORD.pack(kind, t, delta, value)
+    return body + RECORD_CRC.pack(zlib.crc32(body))
+
+
+def decode_records(data):
+    # yields (kind, t, delta, value) up to the first torn or corrupt record
+    for offset in range(0, len(data) - RECORD_SIZE + 1, RECORD_SIZE):
+        body = data[offset:offset + RECORD.size]
+        (crc,) = RECORD_CRC.unpack_from(data, offset + RECORD.size)
+        if zlib.crc32(body) != crc:
+            return
+        yield RECORD.unpack(body)
+
+
+class HealthStore:
+    def __init__(self, directory=None, fsync_interval=FSYNC_INTERVAL,
+                 snapshot_interval=SNAPSHOT_INTERVAL, max_log_bytes=MAX_LOG_BYTES):
+        self.directory = directory or os.environ.get(STATE_DIR_ENV, DEFAULT_STATE_DIR)
+        self.fsync_interval = fsync_interval
+        self.snapshot_interval = snapshot_interval
+        self.max_log_bytes = max_log_bytes
+
+        self.generation = 0
+        self.state = HealthState()
+        self.written = 0
+        self.fsyncs = 0
+        self.snapshots = 0
+        self.replayed = 0
+
+        self._pending = collections.deque()
+        self._cond = threading.Condition()
+        self._closing = False
+        self._log = None
+        self._log_offset = 0
+        self._thread = None
+
+    def restore(self):
+        # latest snapshot plus the tail of its log; starts the writer thread
+        os.makedirs(self.directory, exist_ok=True)
+        offset = 0
+        snapshot = self._read_snapshot()
+        if snapshot is not None:
+            self.generation, offset, self.state = snapshot
+        else:
+            # no usable snapshot: replay the newest log from the start
+            self.generation = max(self._generations(), default=0)
+        self._remove_stale_logs()
+
+        log_path = self._log_path(self.generation)
+        try:
+            with open(log_path, "rb") as f:
+                # a log shorter than the snapshot says lost its unsynced tail;
+                # it may end inside a record, which is dropped so new records
+                # stay aligned for a replay from the start
+                size = os.fstat(f.fileno()).st_size
+                valid = min(offset, size - size % RECORD_SIZE)
+                f.seek(valid)
+                tail = f.read()
+        except FileNotFoundError:
+            tail = b""
+            valid = 0
+
+        for kind, t, delta, value in decode_records(tail):
+            self.state.apply(kind, t, delta, value)
+            self.replayed += 1
+            valid += RECORD_SIZE
+
+        # open for appending past the last good record, dropping a torn tail
+        self._log = open(log_path, "r+b" if os.path.exists(log_path) else "w+b")
+        self._log.truncate(valid)
+        self._log.seek(valid)
+        self._log_offset = valid
+
+        self._thread = threading.Thread(target=self._run, name="health-store", daemon=True)
+        self._thread.start()
+        return self.state.copy()
+
+    def record(self, kind, delta, value):
+        # never blocks on I/O; the state reflects the event immediately
+        t = time.time()
+        with self._cond:
+            self.state.apply(kind, t, delta, value)
+            self._pending.append(encode_record(kind, t, delta, value))
+            self._cond.notify()
+
+    def close(self):
+        # flushes, fsyncs and snapshots whatever is still queued
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        last_fsync = last_snapshot = time.monotonic()
+        dirty = False
+        while True:
+            with self._cond:
+                if not self._pending and not self._closing:
+                    self._cond.wait(self.fsync_interval)
+                batch = b"".join(self._pending)
+                self._pending.clear()
+                closing = self._closing
+                state = self.state.copy()
+
+            try:
+                if batch:
+                    self._log.write(batch)
+                    self._log_offset += len(batch)
+                    self.written += len(batch) // RECORD_SIZE
+                    dirty = True
+
+                now = time.monotonic()
+                if dirty and (closing or now - last_fsync >= self.fsync_interval):
+                    self._log.flush()
+                    os.fsync(self._log.fileno())
+                    self.fsyncs += 1
+                    last_fsync = now
+                    dirty = False
+
+                    if closing or now - last_snapshot >= self.snapshot_interval:
+                        self._snapshot(state)
+                        last_snapshot = now
+            except OSError as e:
+                print(f"Warning: Could not save health state: {e}")
+
+            if closing:
+                self._log.close()
+                return
+
+    def _snapshot(self, state):
+        # only called once the log is fsynced up to _log_offset
+        if self._log_offset >= self.max_log_bytes:
+            # the snapshot covers everything, so the next log starts empty
+            old_path = self._log_path(self.generation)
+            self.generation += 1
+            self._log.close()
+            self._log = open(self._log_path(self.generation), "w+b")
+            checkpoint = state.checkpoint()
+            self._log.write(checkpoint)
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._log_offset = len(checkpoint)
+            self._write_snapshot(state)
+            os.remove(old_path)
+        else:
+            self._write_snapshot(state)
+        self.snapshots += 1
+
+    def _write_snapshot(self, state):
+        body = SNAPSHOT.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, self.generation,
+                             self._log_offset, state.health, state.locked,
+                             state.lockouts, state.updated_at)
+        path = os.path.join(self.directory, SNAPSHOT_NAME)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body + SNAPSHOT_CRC.pack(zlib.crc32(body)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _read_snapshot(self):
+        path = os.path.join(self.directory, SNAPSHOT_NAME)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        size = SNAPSHOT.size
+        if len(data) != size + SNAPSHOT_CRC.size \
+                or zlib.crc32(data[:size]) != SNAPSHOT_CRC.unpack_from(data, size)[0]:
+            print(f"Warning: Ignoring corrupt health snapshot {path}")
+            return None
+        magic, version, generation, offset, health, locked, lockouts, updated_at = \
+            SNAPSHOT.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            return None
+        return generation, offset, HealthState(health, bool(locked), lockouts, updated_at)
+
+    def _log_path(self, generation):
+        return os.path.join(self.directory, LOG_NAME.format(generation))
+
+    def _generations(self):
+        prefix, suffix = LOG_NAME.split("{}")
+        for name in os.listdir(self.directory):
+            number = name[len(prefix):-len(suffix)]
+            if name.startswith(prefix) and name.endswith(suffix) and number.isdigit():
+                yield int(number)
+
+    def _remove_stale_logs(self):
+        # logs of older generations left behind by a crash during compaction
+        for generation in list(self._generations()):
+            if generation != self.generation:
+                os.remove(self._log_path(generation))
+
+    def stats(self):
+        return {
+            "generation": self.generation,
+            "log_bytes": self._log_offset,
+            "written": self.written,
+            "replayed": self.replayed,
+            "fsyncs": self.fsyncs,
+            "snapshots": self.snapshots,
+        }
@@ -1,5 +1,12 @@
-import vision.body_tracker as body_tracker
+import vision.analysis as analysis
+import vision.trackers as trackers
 import vision.grass_detection as grass_detection
+import vision.grass_lut as grass_lut
+import vision.render as render
+from vision.daemon import client_from_env
+from vision.sources import source_from_env
+from core.buffers import FrameArena
+from core.metrics import configure_from_env, metrics
 import mediapipe as mp
 import cv2
 
@@ -8,58 +15,84 @@ import cv2
 mp_drawing = mp.solutions.drawing_utils
 mp_holistic = mp.solutions.holistic
 
-# Start capturing video from the webcams
-cap = cv2.VideoCapture(0)
+# calibrated grass colour table, if one is configured
+lut = grass_lut.load_calibrated()
+grass_detector = grass_detection.IncrementalGrassDetector(lut=lut)
+render_level = render.level_from_env()
+# per-frame buffers (mirror, RGB copy, overlay, output), allocated once
+arena = FrameArena()
+# contact text, rendered once per change instead of every frame
+hud = render.HudLayer()
+# per-stage timings, see core/metrics.py for TOUCH_GRASS_METRICS
+configure_from_env()
+
+
+def show_daemon_frames(client):
+    # the vision daemon owns the camera and models, this window only shows
+    # its annotated frames
+    client.lock_out()
+    try:
+        while client.connected:
+            packet = client.latest(timeout=1.0)
+            if packet is not None:
+                frame, result = packet.result
+                hud.draw(frame, result.contact, client.render_level)
+                cv2.imshow('full body detection', frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    finally:
+        client.recover()
+        client.close()
+        cv2.destroyAllWindows()
+
+
+# TOUCH_GRASS_DAEMON set: show the vision daemon's frames instead
+client = client_from_env()
+if client is not None:
+    show_daemon_frames(client)
+    raise SystemExit
+
+# Start capturing video from the shared webcam handle, or the file/recording
+# named by TOUCH_GRASS_SOURCE
+cap = source_from_env().acquire()
 
 # next we process the video feed frame by frame
-with mp_holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=0.5) as holistic:
+# pose backend and inference decimation come from TOUCH_GRASS_TRACKER and
+# TOUCH_GRASS_INFER_EVERY (Holistic on every frame by default)
+tracker = trackers.tracker_from_env()
+try:
     while cap.isOpened():
-        ret, frame_orig = cap.read()
+        with metrics.stage("capture"):
+            ret, frame_orig = cap.read()
 
         if not ret:
             break
 
         # flip frame
-        frame = cv2.flip(frame_orig, 1)
-
-        # get the grass mask (but don't use the green overlay yet)
-        grass_result, grass_mask = grass_detection.detect_grass(frame)
-
-        # process body tracking on ORIGINAL frame (not grass overlay)
-        body_result, contact_status = body_tracker.body_tracker(
-            frame, grass_mask, holistic)
-
-        # Now blend the grass overlay onto the body result
-        # Create grass overlay
-        overlay = body_result.copy()
-        overlay[grass_mask > 0] = [0, 255, 0]
-
-        # Blend: 70% body result, 30% grass overlay
-        final_result = cv2.addWeighted(body_result, 0.7, overlay, 0.3, 0)
-
-        y_offset = 30
-        for part, in_contact in contact_status.items():
-            status_text = f"{part}: {'Contact' if in_contact else 'No Contact'}"
-            color = (0, 255, 0) if in_contact else (100, 100, 100)
-            cv2.putText(final_result, status_text, (10, y_offset),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
-            y_offset += 25
-
-        # draw contact percentage
-        total_parts = max(len(contact_status), 1)
-        contacting_parts = sum(
-            1 for contact in contact_status.values() if contact)
-        contact_percentage = (contacting_parts / total_parts) * 100
-        percentage_text = f"Contact Percentage: {contact_percentage:.1f}%"
-        cv2.putText(final_result, percentage_text, (10, y_offset),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        frame = cv2.flip(frame_orig, 1, dst=arena.scratch_like("mirrored", frame_orig))
+
+        # grass mask, landmarks and contact, without any drawing
+        result = analysis.analyze_frame(frame, tracker, grass_detector, arena=arena)
+
+        # grass overlay (30%), landmarks and contact text on top
+        with metrics.stage("render"):
+            final_result = render.render(frame, result, render_level, overlay_weight=0.3,
+                                         arena=arena, hud=hud)
+            if metrics.hud:
+                render.draw_perf_hud(final_result, metrics.snapshot())
 
         # display processed frame
-        cv2.imshow('full body detection', final_result)
+        with metrics.stage("display"):
+            cv2.imshow('full body detection', final_result)
+            key = cv2.waitKey(10)
+        metrics.frame()
 
         # temporary quit key
-        if cv2.waitKey(10) & 0xFF == ord('q'):
+        if key & 0xFF == ord('q'):
             break
+finally:
+    tracker.close()
+    metrics.close()
 
 # release resources
 cap.release()
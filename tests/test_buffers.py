@@ -0,0 +1,60 @@
+# frame pool leases
+import gc
+import threading
+
+import numpy as np
+
+from core.buffers import FrameArena
+
+
+def test_frame_returns_to_the_pool_with_its_last_view():
+    arena = FrameArena()
+    frame = arena.frame((4, 6, 3))
+    address = frame.ctypes.data
+    view = frame[1:, ::-1]
+    del frame
+    # the view still uses the memory
+    other = arena.frame((4, 6, 3))
+    assert other.ctypes.data != address
+
+    del view
+    again = arena.frame((4, 6, 3))
+    assert again.ctypes.data == address
+    assert arena.allocations == 2
+    assert other is not again
+
+
+def test_frames_in_flight_are_never_shared():
+    arena = FrameArena(max_frames=3)
+    frames = [arena.frame((8, 8)) for _ in range(5)]
+    assert len({frame.ctypes.data for frame in frames}) == 5
+    stats = arena.stats()
+    assert stats["pooled_frames"] == 3 and stats["overflows"] == 2
+
+    # overflow frames are plain arrays and do not come back
+    del frames
+    gc.collect()
+    assert arena.stats()["free_frames"] == 3
+
+
+def test_lease_ends_on_another_thread():
+    arena = FrameArena()
+    frame = arena.copy(np.ones((4, 4), np.uint8))
+    address = frame.ctypes.data
+    holder = [frame]
+    del frame
+    thread = threading.Thread(target=holder.clear)
+    thread.start()
+    thread.join()
+    assert arena.frame((4, 4)).ctypes.data == address
+
+
+def test_resolution_change_drops_old_buffers():
+    arena = FrameArena()
+    small = arena.frame((4, 4))
+    large = arena.frame((8, 8))
+    del small
+    assert arena.stats()["free_frames"] == 0
+    del large
+    assert arena.frame((8, 8)).shape == (8, 8)
+    assert arena.allocations == 2
@@ -0,0 +1,33 @@
+# lockout screen behaviour that does not need a window
+from types import SimpleNamespace
+
+import ui.camera_widget as camera_widget
+
+
+class Vision:
+    def __init__(self, connected=True):
+        self.connected = connected
+        self.calls = []
+
+    def lock_out(self):
+        self.calls.append("lock_out")
+
+    def close(self):
+        self.calls.append("close")
+
+
+def test_lost_daemon_falls_back_to_an_in_process_engine(monkeypatch, capsys):
+    monkeypatch.setattr(camera_widget, "VisionEngine", Vision)
+    lost = Vision(connected=False)
+    widget = SimpleNamespace(vision=lost)
+
+    camera_widget.CameraWidget.check_vision(widget)
+    assert lost.calls == ["close"]
+    assert isinstance(widget.vision, Vision) and widget.vision is not lost
+    assert widget.vision.calls == ["lock_out"]
+    assert "Vision daemon unavailable" in capsys.readouterr().out
+
+    # a working engine or client is left alone
+    engine = widget.vision
+    camera_widget.CameraWidget.check_vision(widget)
+    assert widget.vision is engine and engine.calls == ["lock_out"]
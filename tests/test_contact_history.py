@@ -0,0 +1,129 @@
+# contact hysteresis and the history ring
+import numpy as np
+import pytest
+
+from vision import contact_history
+from vision.contact_history import ContactHistory
+from vision.contact_logic import CONTACT, PART_FIELDS, PART_NAMES, X, Y
+
+FRAME = 1 / 30
+
+
+def rows(touching=(), x=0.5):
+    out = np.full((len(PART_NAMES), PART_FIELDS), np.nan, dtype=np.float32)
+    out[:, X] = x
+    out[:, Y] = 0.5
+    out[:, CONTACT] = 0.0
+    out[list(touching), CONTACT] = 1.0
+    return out
+
+
+def push_frames(history, count, touching=(), start=0):
+    for i in range(start, start + count):
+        history.push(rows(touching), i * FRAME)
+    return start + count
+
+
+def test_part_enters_on_the_tenth_frame_of_contact():
+    history = ContactHistory()
+    assert history.enter_frames == contact_history.ENTER_FRAMES == 10
+    t = push_frames(history, 9, touching=[0])
+    assert not history.active[0]
+    assert history.gain() == 0.0
+    push_frames(history, 1, touching=[0], start=t)
+    assert history.active[0]
+    assert history.active_count() == 1
+    assert history.gain() == pytest.approx(contact_history.BASE_INCREMENT)
+    # dwell starts from the frame the part entered on
+    assert history.dwell()[0] == pytest.approx(0.0)
+    assert history.dwell(9 * FRAME + 2.0)[0] == pytest.approx(2.0)
+
+
+def test_a_gap_restarts_the_enter_count():
+    history = ContactHistory()
+    t = push_frames(history, 9, touching=[0])
+    t = push_frames(history, 1, start=t)
+    t = push_frames(history, 9, touching=[0], start=t)
+    assert not history.active[0]
+    push_frames(history, 1, touching=[0], start=t)
+    assert history.active[0]
+
+
+def test_part_leaves_after_three_frames_without_contact():
+    history = ContactHistory()
+    assert history.exit_frames == contact_history.EXIT_FRAMES == 3
+    t = push_frames(history, 10, touching=[0])
+    t = push_frames(history, 2, start=t)
+    assert history.active[0]
+    t = push_frames(history, 1, start=t)
+    assert not history.active[0]
+    assert history.dwell()[0] == 0.0
+    assert history.gain() == 0.0
+
+
+def test_short_dropouts_do_not_end_a_contact():
+    history = ContactHistory()
+    t = push_frames(history, 10, touching=[0])
+    for _ in range(5):
+        t = push_frames(history, 2, start=t)
+        t = push_frames(history, 1, touching=[0], start=t)
+    assert history.active[0]
+    # it never left, so the dwell still counts from the first entry
+    assert history.dwell()[0] == pytest.approx((t - 10) * FRAME)
+
+
+def test_parts_are_debounced_independently():
+    history = ContactHistory()
+    t = push_frames(history, 10, touching=[0, 1])
+    push_frames(history, 3, touching=[1], start=t)
+    assert not history.active[0]
+    assert history.active[1]
+    assert history.active_count() == 1
+
+
+def test_gain_grows_with_every_active_part():
+    history = ContactHistory()
+    push_frames(history, 10, touching=[0, 1, 2])
+    assert history.gain() == pytest.approx(
+        contact_history.BASE_INCREMENT + 2 * contact_history.PER_PART_INCREMENT)
+
+
+def test_ring_wraps_around_oldest_first():
+    history = ContactHistory(capacity=4)
+    for i in range(11):
+        history.push(rows(x=i), i * FRAME)
+    assert history.frames == 11
+    assert history.last_time == pytest.approx(10 * FRAME)
+
+    recent, times = history.recent(10)
+    # only the newest `capacity` frames survive, in push order
+    assert recent.shape == (4, len(PART_NAMES), PART_FIELDS)
+    assert recent[:, 0, X].tolist() == [7, 8, 9, 10]
+    assert times == pytest.approx([7 * FRAME, 8 * FRAME, 9 * FRAME, 10 * FRAME])
+
+    recent, _ = history.recent(2)
+    assert recent[:, 0, X].tolist() == [9, 10]
+    assert history.smoothed(2)[0, 0] == pytest.approx(9.5)
+
+
+def test_recent_before_the_ring_fills():
+    history = ContactHistory(capacity=4)
+    assert history.last_time == 0.0
+    assert len(history.recent(3)[0]) == 0
+    history.push(rows(x=1), 0.5)
+    recent, times = history.recent(3)
+    assert recent[:, 0, X].tolist() == [1]
+    assert times.tolist() == [0.5]
+    assert history.last_time == 0.5
+
+
+def test_reset_clears_the_ring_and_the_counters():
+    history = ContactHistory(capacity=4)
+    t = push_frames(history, 12, touching=[0])
+    history.reset()
+    assert history.frames == 0
+    assert not history.active.any()
+    assert np.isnan(history.smoothed()).all()
+    # the enter count starts over too
+    push_frames(history, 9, touching=[0], start=t)
+    assert not history.active[0]
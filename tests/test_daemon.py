@@ -0,0 +1,258 @@
+# the vision daemon's shared-memory ring and its client protocol, with a
+# stand-in engine instead of the camera and the models
+import os
+import socket
+import stat
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import vision.daemon as daemon
+from core.frame_ring import FrameRing
+from core.pipeline import FramePacket, LatestQueue
+from vision.analysis import ContactResult
+
+
+class Analysis:
+    # what the engine's packets carry next to the scene
+    def summary(self):
+        return ContactResult({}, False)
+
+
+def test_ring_round_trip():
+    ring = FrameRing.create(64 * 48 * 3, slots=3)
+    reader = FrameRing.attach(ring.name)
+    try:
+        frame = np.arange(48 * 64 * 3, dtype=np.uint8).reshape(48, 64, 3)
+        seq = ring.publish(frame, 1.5)
+        assert reader.latest == seq
+        np.testing.assert_array_equal(reader.read(seq), frame)
+        np.testing.assert_array_equal(reader.view(seq), frame)
+        assert reader.valid(seq)
+    finally:
+        reader.close()
+        ring.close()
+
+
+def test_ring_lapped_reader_drops_the_frame():
+    ring = FrameRing.create(16, slots=2)
+    try:
+        first = ring.publish(np.zeros((4, 4), np.uint8))
+        view = ring.view(first)
+        # two more frames reuse the first one's slot
+        ring.publish(np.ones((4, 4), np.uint8))
+        ring.publish(np.full((4, 4), 2, np.uint8))
+        assert not ring.valid(first)
+        assert ring.view(first) is None
+        assert ring.read(first) is None
+        # the stale view now shows the newer frame, which valid() caught
+        assert view[0, 0] == 2
+    finally:
+        ring.close()
+
+
+def test_ring_slot_is_invalid_while_written(monkeypatch):
+    ring = FrameRing.create(16, slots=2)
+    try:
+        seq = ring.publish(np.zeros((4, 4), np.uint8))
+        observed = []
+
+        # a reader polling the slot from inside the writer's copy sees it
+        # cleared, never a half written frame under a valid sequence number
+        original = np.copyto
+
+        def copyto(dst, src, **kwargs):
+            observed.append((ring.valid(seq), ring.view(seq)))
+            original(dst, src, **kwargs)
+
+        monkeypatch.setattr(np, "copyto", copyto)
+        ring.publish(np.ones((4, 4), np.uint8))
+        ring.publish(np.full((4, 4), 2, np.uint8))
+        monkeypatch.undo()
+        # the first publish goes to the other slot, the second one
+        # overwrites the first frame's slot
+        assert observed[0][0] and observed[0][1] is not None
+        assert not observed[1][0] and observed[1][1] is None
+        assert not ring.valid(seq)
+        assert ring.valid(seq + 2)
+    finally:
+        ring.close()
+
+
+def test_ring_rejects_oversized_frames():
+    ring = FrameRing.create(16, slots=2)
+    try:
+        with pytest.raises(ValueError):
+            ring.publish(np.zeros((4, 5), np.uint8))
+        assert ring.latest == 0
+    finally:
+        ring.close()
+
+
+class FakeEngine:
+    # counts lockouts and recoveries and hands out queued scenes
+    def __init__(self):
+        self.render_level = "hud"
+        self.frame_interval = 0.0
+        self.locked_out = 0
+        self.recovered = 0
+        self.scenes = LatestQueue(4)
+        self.seq = 0
+
+    def on_health(self, value):
+        pass
+
+    def lock_out(self):
+        self.locked_out += 1
+
+    def recover(self):
+        self.recovered += 1
+
+    def show(self, scene):
+        self.seq += 1
+        packet = FramePacket(self.seq, time.monotonic(), scene,
+                             (scene, Analysis()))
+        self.scenes.put(packet)
+
+    def latest(self, timeout=None):
+        return self.scenes.get(timeout)
+
+    def close(self):
+        pass
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def served(tmp_path):
+    engine = FakeEngine()
+    server = daemon.VisionDaemon(str(tmp_path / "vision.sock"), engine=engine,
+                                 slots=2, slot_bytes=64 * 48 * 3)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    wait_for(lambda: os.path.exists(server.address))
+    yield server, engine
+    server.close()
+    thread.join(5.0)
+
+
+def test_authkey_is_random_and_private(served):
+    server, _ = served
+    path = daemon.key_path(server.address)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    key = daemon.read_authkey(server.address)
+    assert len(key) == daemon.AUTHKEY_BYTES
+    assert key != daemon.create_authkey(str(server.address) + "-other")
+    os.unlink(daemon.key_path(str(server.address) + "-other"))
+
+
+def test_wrong_key_is_rejected(served):
+    server, _ = served
+    with pytest.raises(daemon.AuthenticationError):
+        daemon.Client(server.address, authkey=b"touch-grass-vision")
+
+
+def test_recover_waits_for_every_locked_out_client(served):
+    server, engine = served
+    first, second = daemon.VisionClient(server.address), daemon.VisionClient(server.address)
+    try:
+        first.lock_out()
+        second.lock_out()
+        wait_for(lambda: engine.locked_out == 2)
+
+        first.recover()
+        # a health update sent after the recover has been handled with it
+        first.on_health(50)
+        time.sleep(0.2)
+        assert engine.recovered == 0
+
+        second.recover()
+        wait_for(lambda: engine.recovered == 1)
+    finally:
+        first.close()
+        second.close()
+
+
+def test_disconnect_releases_a_lockout(served):
+    server, engine = served
+    watcher, screen = daemon.VisionClient(server.address), daemon.VisionClient(server.address)
+    try:
+        screen.lock_out()
+        wait_for(lambda: engine.locked_out == 1)
+        # a client that never locked out leaving does not stop the engine
+        watcher.close()
+        time.sleep(0.2)
+        assert engine.recovered == 0
+    finally:
+        screen.close()
+    wait_for(lambda: engine.recovered == 1)
+
+
+def test_oversized_frames_are_dropped_not_fatal(served, capsys):
+    server, engine = served
+    client = daemon.VisionClient(server.address)
+    try:
+        engine.show(np.zeros((1080, 1920, 3), np.uint8))
+        wait_for(lambda: "Dropping 1920x1080" in capsys.readouterr().out)
+
+        frame = np.full((48, 64, 3), 7, np.uint8)
+        engine.show(frame)
+        packet = client.latest(timeout=5.0)
+        assert packet is not None
+        np.testing.assert_array_equal(packet.frame, frame)
+        assert server.published == 1
+    finally:
+        client.close()
+
+
+def second_daemon(address):
+    return daemon.VisionDaemon(address, engine=FakeEngine(), slots=1, slot_bytes=16)
+
+
+@pytest.mark.parametrize("damage", ["missing", "readable"])
+def test_live_daemon_keeps_its_socket_without_a_usable_key(served, damage):
+    server, _ = served
+    path = daemon.key_path(server.address)
+    if damage == "missing":
+        os.unlink(path)
+    else:
+        os.chmod(path, 0o644)
+    other = second_daemon(server.address)
+    try:
+        with pytest.raises(SystemExit, match="Cannot check"):
+            other._remove_stale_socket()
+    finally:
+        other.ring.close()
+    assert os.path.exists(server.address)
+
+
+def test_second_daemon_refuses_a_live_address(served):
+    server, _ = served
+    other = second_daemon(server.address)
+    try:
+        with pytest.raises(SystemExit, match="already running"):
+            other._remove_stale_socket()
+    finally:
+        other.ring.close()
+
+
+def test_stale_socket_is_removed(tmp_path):
+    address = str(tmp_path / "vision.sock")
+    # a socket file nobody listens on, and the key of the daemon that died
+    sock = socket.socket(socket.AF_UNIX)
+    sock.bind(address)
+    sock.close()
+    daemon.create_authkey(address)
+    other = second_daemon(address)
+    try:
+        other._remove_stale_socket()
+    finally:
+        other.ring.close()
+    assert not os.path.exists(address)
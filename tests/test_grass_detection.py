@@ -0,0 +1,184 @@
+# grass masks: pyramid, incremental tiles and contact queries against a full
+# pass / brute force over the same mask
+import cv2
+import numpy as np
+import pytest
+
+import vision.contact_logic as contact_logic
+import vision.grass_detection as grass_detection
+from vision.grass_regions import MIN_REGION_AREA, GrassRegions
+
+GRASS = (40, 160, 40)
+# dark soil: the change check compares grey levels
+SOIL = (30, 50, 70)
+
+
+def scene(height, width):
+    # soil with two grass fields in the lower part of the frame
+    frame = np.empty((height, width, 3), np.uint8)
+    frame[:] = SOIL
+    frame[height * 6 // 10:, :width // 3] = GRASS
+    frame[height * 8 // 10:, width // 2:] = GRASS
+    return frame
+
+
+@pytest.mark.parametrize("size", [(480, 640), (720, 1280), (1080, 1920)])
+def test_pyramid_mask_matches_full_resolution(size):
+    frame = scene(*size)
+    pyramid = grass_detection.detect_grass_mask(frame).full()
+    full = grass_detection.detect_grass_mask(frame, scale=1.0).full()
+    assert pyramid.shape == full.shape
+    # the cleanup kernels scale with the level, so only the field edges move
+    overlap = np.count_nonzero((pyramid > 0) & (full > 0))
+    union = np.count_nonzero((pyramid > 0) | (full > 0))
+    assert overlap / union > 0.9
+
+
+@pytest.mark.parametrize("size", [(480, 640), (720, 1280), (1080, 1920)])
+def test_incremental_matches_full_pass(size):
+    height, width = size
+    detector = grass_detection.IncrementalGrassDetector()
+    frame = scene(height, width)
+    detector.detect(frame)
+    first_pass = detector.tiles_reclassified
+
+    # small patches on the soil between the fields, along the bottom edge
+    # where the level size is not a multiple of the tile size
+    changed = frame.copy()
+    for x in (int(width * 0.36), int(width * 0.43)):
+        changed[height - 44:height - 12, x:x + 32] = GRASS
+    incremental = detector.detect(changed)
+    full = grass_detection.detect_grass_mask(changed)
+
+    if height >= 720:
+        # only the tiles around the two patches, not another full pass; at
+        # 480p those are more than half of the 5x3 tiles and a full pass wins
+        assert detector.full_refreshes == 1
+        assert 2 <= detector.tiles_reclassified - first_pass <= 18
+    np.testing.assert_array_equal(incremental.level, full.level)
+
+
+def test_incremental_reuses_unchanged_tiles():
+    detector = grass_detection.IncrementalGrassDetector()
+    frame = scene(720, 1280)
+    for _ in range(5):
+        mask = detector.detect(frame)
+    np.testing.assert_array_equal(mask.level, grass_detection.detect_grass_mask(frame).level)
+    assert detector.full_refreshes == 1
+    assert detector.stats()["hit_rate"] > 0.75
+
+
+def brute_force_contacts(landmarks, mask, radius):
+    height, width = mask.shape
+    contact = np.zeros(len(landmarks), bool)
+    for i, (x, y) in enumerate(landmarks[:, :2]):
+        if not (np.isfinite(x) and np.isfinite(y)):
+            continue
+        px, py = int(np.floor(x * width)), int(np.floor(y * height))
+        if not (0 <= px < width and 0 <= py < height):
+            continue
+        r = max(int(np.rint(radius)), 1)
+        box = mask[max(py - r, 0):max(py + r, 0), max(px - r, 0):max(px + r, 0)]
+        contact[i] = box.any()
+    return contact
+
+
+@pytest.mark.parametrize("mode", ["box", "distance"])
+def test_contact_queries_match_brute_force(mode):
+    rng = np.random.default_rng(4)
+    mask = np.zeros((480, 640), np.uint8)
+    for _ in range(12):
+        x, y = rng.integers(0, 600), rng.integers(0, 440)
+        mask[y:y + rng.integers(2, 40), x:x + rng.integers(2, 40)] = 255
+
+    landmarks = np.full((200, 4), np.nan, np.float32)
+    landmarks[:190, :2] = rng.uniform(-0.05, 1.05, (190, 2))
+    radius = 12.0
+
+    contact, coverage = contact_logic.detect_contacts(landmarks, mask, radius, mode=mode)
+    expected = brute_force_contacts(landmarks, mask > 0, radius)
+    if mode == "box":
+        np.testing.assert_array_equal(contact, expected)
+    else:
+        # the disc is inside the box: every disc contact is a box contact
+        assert not (contact & ~expected).any()
+    assert not contact[190:].any()
+    assert ((coverage >= 0) & (coverage <= 1)).all()
+
+
+def test_contact_queries_on_pyramid_mask():
+    frame = scene(720, 1280)
+    pyramid = grass_detection.detect_grass_mask(frame)
+    full = grass_detection.detect_grass_mask(frame, scale=1.0).full()
+
+    landmarks = np.full((contact_logic.LANDMARK_COUNT, 4), np.nan, np.float32)
+    # well inside a field, well outside any field
+    landmarks[0, :2] = (0.15, 0.8)
+    landmarks[1, :2] = (0.4, 0.3)
+    contact, _ = contact_logic.detect_contacts(landmarks, pyramid, 20.0)
+    expected = brute_force_contacts(landmarks, full > 0, 20.0)
+    np.testing.assert_array_equal(contact, expected)
+    assert contact[0] and not contact[1]
+
+
+def blobs(rng, height=480, width=640, cell=80):
+    # one rectangle or disc per cell, with gaps so no two blobs touch; sizes
+    # stay clear of MIN_REGION_AREA, where pixel counts and contour areas differ
+    mask = np.zeros((height, width), np.uint8)
+    for y in range(0, height, cell):
+        for x in range(0, width, cell):
+            big = rng.random() < 0.5
+            if rng.random() < 0.5:
+                w, h = rng.integers(26, 60, 2) if big else rng.integers(3, 18, 2)
+                x0, y0 = x + rng.integers(2, cell - 2 - w), y + rng.integers(2, cell - 2 - h)
+                mask[y0:y0 + h, x0:x0 + w] = 255
+            else:
+                r = int(rng.integers(18, 30) if big else rng.integers(2, 8))
+                cv2.circle(mask, (x + cell // 2, y + cell // 2), r, 255, -1)
+    return mask
+
+
+def legacy_regions(mask):
+    # what detect_grass did before GrassRegions: external contours, those
+    # under MIN_REGION_AREA filled in as noise
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    boxes, noise = [], np.zeros_like(mask)
+    for contour in contours:
+        if cv2.contourArea(contour) < MIN_REGION_AREA:
+            cv2.drawContours(noise, [contour], -1, 255, -1)
+        else:
+            x, y, w, h = cv2.boundingRect(contour)
+            boxes.append((x, y, x + w, y + h))
+    return np.array(sorted(boxes)), noise > 0
+
+
+def brute_force_near(boxes, x, y, radius):
+    dx = np.maximum(np.maximum(boxes[:, 0] - x, x - (boxes[:, 2] - 1)), 0)
+    dy = np.maximum(np.maximum(boxes[:, 1] - y, y - (boxes[:, 3] - 1)), 0)
+    distance = np.hypot(dx, dy)
+    return {tuple(box) for box in boxes[distance <= radius]}
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_region_grid_matches_legacy_contours(seed):
+    rng = np.random.default_rng(seed)
+    mask = blobs(rng)
+    boxes, noise = legacy_regions(mask)
+    regions = GrassRegions(mask, min_area=MIN_REGION_AREA)
+
+    # the same regions are kept and the same pixels are marked as noise
+    assert len(regions) == len(boxes) > 0
+    np.testing.assert_array_equal(np.array(sorted(map(tuple, regions.boxes))), boxes)
+    np.testing.assert_array_equal(regions.dropped_mask(), noise)
+    assert regions.dropped_area == np.count_nonzero(noise)
+
+    # grid lookups find exactly the regions a scan of every box finds, and
+    # the grid cells never hide a region from its own pixels
+    points = rng.uniform(-20, 660, (300, 2))
+    for (x, y), radius in zip(points, rng.uniform(0, 60, len(points))):
+        found = {tuple(regions.boxes[i]) for i in regions.near(x, y, radius)}
+        assert found == brute_force_near(boxes, x, y, radius)
+    for i, (x0, y0, x1, y1) in enumerate(regions.boxes):
+        assert i in regions.candidates(x0, y0, x1 - 1, y1 - 1)
+        cx, cy = regions.centroids[i]
+        assert regions.region_at(cx, cy) == i
@@ -0,0 +1,32 @@
+# grass lookup table files
+import numpy as np
+import pytest
+
+import vision.grass_lut as grass_lut
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "lawn.glut")
+    lut = grass_lut.GrassLUT.default()
+    lut.save(path)
+    np.testing.assert_array_equal(grass_lut.GrassLUT.load(path).table, lut.table)
+
+
+@pytest.mark.parametrize("keep", [0, 3, grass_lut.HEADER_SIZE, grass_lut.HEADER_SIZE + 100])
+def test_truncated_table_is_rejected(tmp_path, keep):
+    path = str(tmp_path / "lawn.glut")
+    grass_lut.GrassLUT.default().save(path)
+    with open(path, "r+b") as f:
+        f.truncate(keep)
+    with pytest.raises(ValueError):
+        grass_lut.GrassLUT.load(path)
+
+
+def test_load_calibrated_warns_about_a_bad_table(tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / "lawn.glut")
+    grass_lut.GrassLUT.default().save(path)
+    with open(path, "ab") as f:
+        f.write(b"\0")
+    monkeypatch.setenv(grass_lut.LUT_PATH_ENV, path)
+    assert grass_lut.load_calibrated() is None
+    assert "Warning" in capsys.readouterr().out
@@ -0,0 +1,23 @@
+# every module imports on its own, in a fresh interpreter, so an import cycle
+# that only breaks one entry point shows up here
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+MODULES = sorted(
+    f"{package}.{name[:-3]}"
+    for package in ("bench", "core", "ui", "vision")
+    for name in os.listdir(os.path.join(ROOT, package))
+    if name.endswith(".py") and name != "__init__.py"
+)
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_module_imports_first(module):
+    result = subprocess.run([sys.executable, "-c", f"import {module}"], cwd=ROOT,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr[-2000:]
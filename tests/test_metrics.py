@@ -0,0 +1,14 @@
+# TOUCH_GRASS_METRICS parsing
+import pytest
+
+import core.metrics as metrics
+
+
+@pytest.mark.parametrize("port", ["http", "94x4", "70000", "-1"])
+def test_bad_http_port_warns(monkeypatch, capsys, port):
+    monkeypatch.setenv(metrics.METRICS_ENV, f"hud,http={port}")
+    registry = metrics.Metrics()
+    monkeypatch.setattr(metrics, "metrics", registry)
+    assert metrics.configure_from_env() is registry
+    assert "Warning: Invalid metrics port" in capsys.readouterr().out
+    assert registry.enabled
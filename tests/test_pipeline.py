@@ -0,0 +1,119 @@
+# frame pipeline threads across stop/start
+import threading
+import time
+
+import numpy as np
+
+from core.pipeline import ACTIVE, IDLE, WARMING, FramePipeline, PipelineLifecycle
+
+
+class StillCamera:
+    def read(self):
+        time.sleep(0.005)
+        return True, np.zeros((48, 64, 3), np.uint8)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_restart_waits_for_a_busy_analysis_thread():
+    release = threading.Event()
+    running = []
+
+    def analyze(frame):
+        running.append(threading.current_thread())
+        release.wait(5.0)
+        return frame
+
+    pipeline = FramePipeline(StillCamera(), analyze)
+    pipeline.start()
+    wait_for(lambda: running)
+    pipeline.stop(timeout=0.05)
+    # the analysis call outlived the join; its thread is still known
+    assert pipeline.analysis.alive
+
+    assert not pipeline.start()
+    assert pipeline.start_pending and not pipeline.running
+    assert pipeline.latest() is None
+
+    release.set()
+    wait_for(lambda: not pipeline.analysis.alive)
+    # the next poll starts the new run
+    pipeline.latest()
+    assert pipeline.running and not pipeline.start_pending
+    wait_for(lambda: pipeline.latest() is not None)
+
+    analysis_threads = [t for t in threading.enumerate() if t.name == "analysis"]
+    assert len(analysis_threads) == 1
+    pipeline.stop()
+
+
+def test_stopped_pipeline_does_not_spin():
+    pipeline = FramePipeline(StillCamera(), lambda frame: frame)
+    pipeline.start()
+    pipeline.stop()
+    began = time.monotonic()
+    assert pipeline.latest(timeout=0.1) is None
+    assert time.monotonic() - began >= 0.1
+
+
+class Steps:
+    # lifecycle callbacks that record their calls; warm-up waits for `ready`
+    def __init__(self):
+        self.ready = threading.Event()
+        self.calls = []
+
+    def warm_up(self):
+        self.calls.append("warm_up")
+        self.ready.wait(5.0)
+
+    def activate(self):
+        self.calls.append("activate")
+
+    def deactivate(self):
+        self.calls.append("deactivate")
+
+    def cool_down(self):
+        self.calls.append("cool_down")
+
+    def lifecycle(self):
+        return PipelineLifecycle(self.warm_up, self.activate, self.deactivate,
+                                 self.cool_down)
+
+
+def test_lifecycle_never_waits_for_the_warm_up():
+    steps = Steps()
+    lifecycle = steps.lifecycle()
+    lifecycle.on_health(5)
+    assert lifecycle.state == WARMING
+
+    began = time.monotonic()
+    lifecycle.on_health(50)
+    lifecycle.recover()
+    assert time.monotonic() - began < 0.5
+    assert lifecycle.state == WARMING
+
+    # the warm-up thread releases what it opened once it is done
+    steps.ready.set()
+    wait_for(lambda: lifecycle.state == IDLE)
+    assert steps.calls == ["warm_up", "cool_down"]
+
+
+def test_lockout_during_warm_up_starts_the_workers():
+    steps = Steps()
+    lifecycle = steps.lifecycle()
+    lifecycle.on_health(5)
+    lifecycle.on_health(50)
+    # locked out before the cancelled warm-up finished: it is needed again
+    lifecycle.lock_out()
+    steps.ready.set()
+    wait_for(lambda: lifecycle.state == ACTIVE)
+    assert steps.calls == ["warm_up", "activate"]
+
+    lifecycle.recover()
+    assert lifecycle.state == IDLE
+    assert steps.calls == ["warm_up", "activate", "deactivate", "cool_down"]
@@ -0,0 +1,89 @@
+# cached HUD layer: where it lands, what it touches and when it is rebuilt
+import numpy as np
+import pytest
+
+import vision.contact_logic as contact_logic
+import vision.render as render
+
+
+def contact(*touching):
+    flags = np.zeros(len(contact_logic.PART_NAMES), bool)
+    flags[list(touching)] = True
+    return flags
+
+
+def drawn_box(image):
+    # bounding box (x0, y0, x1, y1) of the non-black pixels
+    ys, xs = np.nonzero(image.any(axis=2))
+    return xs.min(), ys.min(), xs.max() + 1, ys.max() + 1
+
+
+def test_blit_changes_only_masked_pixels():
+    hud = render.HudLayer(anchor=(0.1, 0.2))
+    frame = np.random.default_rng(0).integers(0, 256, (720, 1280, 3), dtype=np.uint8)
+    image = hud.draw(frame.copy(), contact(0, 2), render.RENDER_HUD)
+
+    x, y = round(0.1 * 1280), round(0.2 * 720)
+    height, width = hud._mask.shape
+    mask = np.zeros(frame.shape[:2], bool)
+    mask[y:y + height, x:x + width] = hud._mask > 0
+    assert mask.any()
+
+    # untouched outside the text, the block's pixels under it
+    np.testing.assert_array_equal(image[~mask], frame[~mask])
+    np.testing.assert_array_equal(image[mask], hud._block[hud._mask > 0])
+
+
+def test_layer_is_rebuilt_only_when_contact_changes():
+    hud = render.HudLayer()
+    frame = np.zeros((720, 1280, 3), np.uint8)
+    for _ in range(5):
+        hud.draw(frame, contact(1), render.RENDER_HUD)
+    # an equal array, not the same object, reuses the block too
+    hud.draw(frame, contact(1), render.RENDER_FULL)
+    assert hud.builds == 1
+
+    hud.draw(frame, contact(1, 3), render.RENDER_HUD)
+    hud.draw(frame, contact(1, 3), render.RENDER_HUD)
+    assert hud.builds == 2
+    hud.draw(frame, contact(1), render.RENDER_HUD)
+    assert hud.builds == 3
+
+
+def test_render_none_leaves_the_frame_alone():
+    hud = render.HudLayer()
+    frame = np.zeros((720, 1280, 3), np.uint8)
+    assert hud.draw(frame, contact(0), render.RENDER_NONE) is frame
+    assert not frame.any()
+    assert hud.builds == 0
+
+
+@pytest.mark.parametrize("height", [360, 1080, 1440])
+def test_anchor_and_sizes_scale_with_the_frame(height):
+    anchor = (0.25, 0.1)
+    hud = render.HudLayer(anchor=anchor, reference_height=720)
+    reference = drawn_box(hud.draw(np.zeros((720, 1280, 3), np.uint8),
+                                   contact(0), render.RENDER_HUD))
+
+    width = height * 16 // 9
+    image = hud.draw(np.zeros((height, width, 3), np.uint8), contact(0), render.RENDER_HUD)
+    # a new frame size renders the lines again at the new scale
+    assert hud.builds == 2
+
+    scale = height / 720
+    x0, y0, x1, y1 = drawn_box(image)
+    # the block's corner sits at the anchor, the text near it at any size
+    assert x0 >= round(anchor[0] * width) and y0 >= round(anchor[1] * height)
+    np.testing.assert_allclose((x0, y0), np.array(reference[:2]) * scale, atol=2)
+    # stroke widths are rounded to whole pixels, so the extent scales only roughly
+    np.testing.assert_allclose((x1 - x0, y1 - y0),
+                               np.subtract(reference[2:], reference[:2]) * scale, rtol=0.05)
+
+
+def test_block_is_clipped_at_the_frame_edge():
+    hud = render.HudLayer(anchor=(0.95, 0.9))
+    frame = np.zeros((720, 1280, 3), np.uint8)
+    image = hud.draw(frame, contact(0), render.RENDER_HUD)
+    assert image is frame
+    x0, y0, _, _ = drawn_box(image)
+    assert x0 >= round(0.95 * 1280) and y0 >= round(0.9 * 720)
@@ -0,0 +1,198 @@
+# quality governor, wake scheduler and decaying health, with fake clocks
+import sys
+import time
+
+import pytest
+
+import core.scheduler as scheduler
+import core.state as state
+import vision.render as render
+
+
+def test_governor_is_opt_in(monkeypatch):
+    monkeypatch.delenv(scheduler.BUDGET_ENV, raising=False)
+    assert scheduler.budget_from_env() is None
+    monkeypatch.setenv(scheduler.BUDGET_ENV, "0")
+    assert scheduler.budget_from_env() is None
+    monkeypatch.setenv(scheduler.BUDGET_ENV, "50")
+    assert scheduler.budget_from_env() == 0.05
+
+
+def test_invalid_budget_leaves_the_governor_off(monkeypatch, capsys):
+    monkeypatch.setenv(scheduler.BUDGET_ENV, "fast")
+    assert scheduler.budget_from_env() is None
+    assert "Warning" in capsys.readouterr().out
+
+
+def test_slow_frames_never_drop_the_hud():
+    applied = []
+    governor = scheduler.QualityGovernor(applied.append, budget=1 / 30, window=5)
+    # every frame over budget, with somebody in view
+    for _ in range(5 * len(scheduler.QUALITY_LEVELS) * 2):
+        governor.observe(0.038, True)
+    assert governor.settings is scheduler.QUALITY_LEVELS[-1]
+    assert all(settings.render_level != render.RENDER_NONE for settings in applied)
+
+
+class FakeClock:
+    def __init__(self, t=0.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+class Timer:
+    # records what the scheduler arms its one platform timer for
+    def __init__(self):
+        self.armed = []
+
+    def __call__(self, delay):
+        self.armed.append(delay)
+
+    @property
+    def delay(self):
+        return self.armed[-1]
+
+
+def scheduler_with_clock():
+    clock, timer = FakeClock(), Timer()
+    return scheduler.WakeScheduler(timer, clock=clock), clock, timer
+
+
+def test_one_timer_for_the_earliest_latest_time():
+    wakes, clock, timer = scheduler_with_clock()
+    wakes.call_at(1.0, lambda: None, slack=0.5)
+    assert timer.delay == 1.5
+    wakes.call_at(1.2, lambda: None, slack=0.0)
+    assert timer.delay == pytest.approx(1.2)
+    # a later deadline does not touch the timer
+    wakes.call_at(5.0, lambda: None)
+    assert len(timer.armed) == 2
+
+
+def test_due_wakeups_share_one_wakeup():
+    wakes, clock, timer = scheduler_with_clock()
+    ran = []
+    wakes.call_at(1.0, lambda: ran.append("slack"), slack=0.5)
+    wakes.call_at(1.2, lambda: ran.append("exact"), slack=0.0)
+    wakes.call_at(3.0, lambda: ran.append("later"), slack=0.5)
+
+    clock.t = 1.2
+    wakes.fire()
+    # the first one could have waited until 1.5 but rides along, in
+    # deadline order; the third one's window has not opened
+    assert ran == ["slack", "exact"]
+    assert (wakes.wakeups, wakes.callbacks) == (1, 2)
+    assert timer.delay == pytest.approx(2.3)
+
+    armed = len(timer.armed)
+    clock.t = 3.5
+    wakes.fire()
+    assert ran == ["slack", "exact", "later"]
+    # the single-shot timer has gone off, nothing is left to arm or stop
+    assert len(timer.armed) == armed
+
+
+def test_early_fire_rearms_for_the_rest():
+    wakes, clock, timer = scheduler_with_clock()
+    ran = []
+    wakes.call_at(1.0, lambda: ran.append(1), slack=0.0)
+    # the platform timer went off a little early
+    clock.t = 0.99
+    wakes.fire()
+    assert ran == []
+    assert timer.delay == pytest.approx(0.01)
+    clock.t = 1.0
+    wakes.fire()
+    assert ran == [1]
+
+
+def test_cancel_moves_the_timer():
+    wakes, clock, timer = scheduler_with_clock()
+    ran = []
+    first = wakes.call_at(1.0, lambda: ran.append(1), slack=0.0)
+    second = wakes.call_at(2.0, lambda: ran.append(2), slack=0.0)
+    wakes.cancel(first)
+    assert timer.delay == 2.0
+    wakes.cancel(second)
+    assert timer.delay is None
+    clock.t = 3.0
+    wakes.fire()
+    assert ran == []
+
+
+def test_callbacks_may_schedule_and_cancel():
+    wakes, clock, timer = scheduler_with_clock()
+    ran = []
+    later = wakes.call_at(1.1, lambda: ran.append("cancelled"), slack=0.0)
+
+    def first():
+        ran.append("first")
+        wakes.cancel(later)
+        wakes.call_later(1.0, lambda: ran.append("again"), slack=0.0)
+
+    wakes.call_at(1.0, first, slack=0.0)
+    clock.t = 1.1
+    wakes.fire()
+    assert ran == ["first"]
+    assert timer.delay == pytest.approx(1.0)
+    clock.t = 2.1
+    wakes.fire()
+    assert ran == ["first", "again"]
+
+
+def test_periodic_task_skips_missed_ticks():
+    wakes, clock, timer = scheduler_with_clock()
+    ticks = []
+    task = scheduler.PeriodicTask(wakes, 0.5, lambda: ticks.append(clock.t))
+    task.start()
+    clock.t = 0.5
+    wakes.fire()
+    # a stall of several intervals gives one tick, then the rhythm resumes
+    clock.t = 3.2
+    wakes.fire()
+    assert ticks == [0.5, 3.2]
+    assert timer.delay == pytest.approx(0.5)
+    task.stop()
+    assert not task.active and timer.delay is None
+
+
+def test_suspend_aware_clock_counts_sleep(monkeypatch):
+    if sys.platform.startswith("linux"):
+        assert scheduler._SUSPEND_CLOCK == time.CLOCK_BOOTTIME
+    asked = []
+
+    def clock_gettime(clock_id):
+        asked.append(clock_id)
+        return 42.0
+
+    monkeypatch.setattr(scheduler, "_SUSPEND_CLOCK", 7)
+    monkeypatch.setattr(time, "clock_gettime", clock_gettime)
+    assert scheduler.suspend_aware_clock() == 42.0
+    assert asked == [7]
+
+
+def test_decaying_health_follows_the_clock():
+    clock = FakeClock(100.0)
+    health = state.DecayingHealth(100.0, seconds_per_point=0.2, clock=clock)
+    clock.t += 10.0
+    assert health.value() == 100.0 and health.seconds_until(99) is None
+
+    health.start()
+    clock.t += 1.0
+    assert health.value() == pytest.approx(95.0)
+    assert health.displayed() == 95
+    clock.t += 0.1
+    assert health.displayed() == 95  # 94.5 still shows as 95
+    assert health.seconds_until(94) == pytest.approx(0.1)
+
+    health.stop()
+    clock.t += 50.0
+    assert health.value() == pytest.approx(94.5)
+
+    # a suspend longer than the whole bar comes back at zero, not below
+    health.start()
+    clock.t += 3600.0
+    assert health.value() == 0.0
+    assert health.seconds_until(0) == 0.0
@@ -0,0 +1,76 @@
+# decode-ahead wrapper around file sources
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import vision.sources as sources
+from core.pipeline import FramePipeline
+
+
+class ScriptedSource(sources.FrameSource):
+    # hands out `count` frames, then fails or blocks as told
+    def __init__(self, count, then="end"):
+        super().__init__()
+        self.count = count
+        self.then = then
+        self.unblock = threading.Event()
+
+    def _open(self):
+        self.index = 0
+
+    def _close(self):
+        pass
+
+    def _next(self):
+        if self.index < self.count:
+            self.index += 1
+            return np.full((4, 4, 3), self.index, np.uint8), self.index / 30.0
+        if self.then == "fail":
+            raise OSError("corrupt packet")
+        if self.then == "block":
+            self.unblock.wait(5.0)
+        return None
+
+
+def test_frames_then_end():
+    with sources.DecodeAhead(ScriptedSource(3)) as source:
+        frames = [source.read() for _ in range(5)]
+    assert [ret for ret, _ in frames] == [True, True, True, False, False]
+    assert frames[2][1][0, 0, 0] == 3
+
+
+def test_decoder_errors_reach_the_reader():
+    with sources.DecodeAhead(ScriptedSource(2, then="fail")) as source:
+        assert source.read()[0] and source.read()[0]
+        for _ in range(2):
+            with pytest.raises(OSError, match="corrupt packet"):
+                source.read()
+
+
+def test_stalled_decoder_times_out():
+    scripted = ScriptedSource(1, then="block")
+    with sources.DecodeAhead(scripted, timeout=0.05) as source:
+        assert source.read()[0]
+        assert source.read() == (False, None)
+        scripted.unblock.set()
+
+
+def test_decoder_error_does_not_end_the_capture_thread(capsys):
+    source = sources.DecodeAhead(ScriptedSource(3, then="fail")).acquire()
+    pipeline = FramePipeline(source, lambda frame: frame)
+    pipeline.start()
+    try:
+        deadline = time.monotonic() + 5.0
+        while pipeline.capture.errors < 2:
+            assert time.monotonic() < deadline, "timed out"
+            time.sleep(0.01)
+        # still reading, and the error was reported once
+        assert pipeline.capture.alive and pipeline.running
+        assert pipeline.capture.frames == 3
+        assert pipeline.stats()["capture"]["read_failures"] >= 2
+        assert capsys.readouterr().out.count("corrupt packet") == 1
+    finally:
+        pipeline.stop()
+        source.release()
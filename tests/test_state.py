@@ -0,0 +1,101 @@
+# health store recovery from torn logs and bad snapshots
+import os
+import time
+
+import core.state as state
+
+
+def write_session(directory, events):
+    store = state.HealthStore(str(directory))
+    store.restore()
+    for kind, delta, value in events:
+        store.record(kind, delta, value)
+    store.close()
+    return store
+
+
+def log_path(directory, generation=0):
+    return os.path.join(str(directory), state.LOG_NAME.format(generation))
+
+
+def restore(directory):
+    store = state.HealthStore(str(directory))
+    restored = store.restore()
+    return store, restored
+
+
+def test_round_trip(tmp_path):
+    write_session(tmp_path, [(state.DECAY, -5, 95.0), (state.LOCKOUT, 0, 0.0),
+                             (state.RECOVER, 30, 30.0)])
+    store, restored = restore(tmp_path)
+    store.close()
+    assert (restored.health, restored.locked, restored.lockouts) == (30.0, False, 1)
+
+
+def test_torn_tail_after_the_snapshot_is_dropped(tmp_path):
+    write_session(tmp_path, [(state.DECAY, -5, 95.0)])
+    # a crash after the snapshot: two whole records and half of a third
+    with open(log_path(tmp_path), "ab") as f:
+        f.write(state.encode_record(state.DECAY, time.time(), -5, 90.0))
+        f.write(state.encode_record(state.LOCKOUT, time.time(), 0, 0.0))
+        f.write(state.encode_record(state.RECOVER, time.time(), 50, 50.0)[:7])
+
+    store, restored = restore(tmp_path)
+    assert store.replayed == 2
+    assert (restored.health, restored.locked) == (0.0, True)
+    assert os.path.getsize(log_path(tmp_path)) % state.RECORD_SIZE == 0
+
+    # the next session appends after the last good record
+    store.record(state.RECOVER, 40, 40.0)
+    store.close()
+    store, restored = restore(tmp_path)
+    store.close()
+    assert (restored.health, restored.locked) == (40.0, False)
+
+
+def test_corrupt_record_ends_the_replay(tmp_path):
+    write_session(tmp_path, [(state.DECAY, -5, 95.0)])
+    with open(log_path(tmp_path), "ab") as f:
+        f.write(state.encode_record(state.DECAY, time.time(), -5, 90.0))
+        record = bytearray(state.encode_record(state.DECAY, time.time(), -5, 85.0))
+        record[3] ^= 0xFF
+        f.write(bytes(record))
+        f.write(state.encode_record(state.DECAY, time.time(), -5, 80.0))
+
+    store, restored = restore(tmp_path)
+    store.close()
+    assert store.replayed == 1
+    assert restored.health == 90.0
+
+
+def test_corrupt_snapshot_replays_the_whole_log(tmp_path, capsys):
+    write_session(tmp_path, [(state.DECAY, -5, 95.0), (state.LOCKOUT, 0, 0.0)])
+    snapshot = os.path.join(str(tmp_path), state.SNAPSHOT_NAME)
+    with open(snapshot, "r+b") as f:
+        f.truncate(10)
+
+    store, restored = restore(tmp_path)
+    store.close()
+    assert "corrupt health snapshot" in capsys.readouterr().out
+    assert (restored.health, restored.locked, restored.lockouts) == (0.0, True, 1)
+
+
+def test_log_shorter_than_its_snapshot(tmp_path):
+    # the snapshot says more of the log was synced than survived, and the
+    # log ends inside a record
+    write_session(tmp_path, [(state.DECAY, -5, 95.0), (state.DECAY, -5, 90.0),
+                             (state.LOCKOUT, 0, 0.0)])
+    with open(log_path(tmp_path), "r+b") as f:
+        f.truncate(state.RECORD_SIZE + 5)
+
+    store, restored = restore(tmp_path)
+    assert (restored.health, restored.locked) == (0.0, True)
+    store.record(state.RECOVER, 60, 60.0)
+    store.close()
+    assert os.path.getsize(log_path(tmp_path)) % state.RECORD_SIZE == 0
+
+    # without the snapshot the log alone still replays up to the new record
+    os.remove(os.path.join(str(tmp_path), state.SNAPSHOT_NAME))
+    store, restored = restore(tmp_path)
+    store.close()
+    assert (restored.health, restored.locked) == (60.0, False)
@@ -0,0 +1,217 @@
+# presence gate and decimation: which frames reach the pose model, and
+# what the predictors make of the rest
+import numpy as np
+import pytest
+
+import vision.contact_logic as contact_logic
+import vision.trackers as trackers
+
+
+class CountingTracker:
+    # stands in for the model: somebody is in view while `person` is set
+    def __init__(self):
+        self.person = True
+        self.calls = 0
+
+    def process(self, image):
+        self.calls += 1
+        landmarks = np.full((contact_logic.LANDMARK_COUNT, 4), np.nan, np.float32)
+        if not self.person:
+            return trackers.TrackingResult(landmarks)
+        landmarks[:, :2] = 0.5
+        landmarks[:, 3] = 1.0
+        return trackers.TrackingResult.from_array(landmarks, inferred=True)
+
+    def reset(self):
+        pass
+
+
+def frame(value=90):
+    image = np.zeros((240, 320, 3), np.uint8)
+    image[60:180, 100:220] = value
+    return image
+
+
+def test_still_person_reuses_the_last_result():
+    model = CountingTracker()
+    gate = trackers.PresenceGate(model, max_skipped=10)
+    first = gate.process(frame())
+    results = [gate.process(frame()) for _ in range(10)]
+    assert model.calls == 1
+    assert all(not result.inferred and result.pose_landmarks for result in results)
+    np.testing.assert_array_equal(results[-1].landmarks, first.landmarks)
+
+    # the cap: the model runs again after max_skipped still frames
+    assert gate.process(frame()).inferred
+    assert model.calls == 2
+
+
+def test_motion_runs_the_model():
+    model = CountingTracker()
+    gate = trackers.PresenceGate(model)
+    gate.process(frame())
+    gate.process(frame())
+    assert gate.process(frame(200)).inferred
+    assert model.calls == 2
+
+
+def test_empty_scene_skips_with_an_empty_result():
+    model = CountingTracker()
+    model.person = False
+    gate = trackers.PresenceGate(model)
+    gate.process(frame())
+    result = gate.process(frame())
+    assert model.calls == 1
+    assert not result.inferred and not result.pose_landmarks
+    assert np.isnan(result.landmarks).all()
+    assert gate.stats()["skipped"] == 1
+
+
+class Clock:
+    # injected time for DecimatedTracker
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+class MovingPerson:
+    # every landmark moves right at `speed` per second of the clock
+    def __init__(self, clock, speed=0.5):
+        self.clock = clock
+        self.speed = speed
+        self.person = True
+        self.calls = 0
+
+    def landmarks(self, t):
+        landmarks = np.zeros((contact_logic.LANDMARK_COUNT, 4), np.float32)
+        landmarks[:, 0] = 0.1 + self.speed * t
+        landmarks[:, 1] = np.linspace(0.2, 0.8, contact_logic.LANDMARK_COUNT)
+        landmarks[:, 3] = 1.0
+        return landmarks
+
+    def process(self, image):
+        self.calls += 1
+        if not self.person:
+            return trackers.TrackingResult(trackers._empty_landmarks())
+        return trackers.TrackingResult.from_array(self.landmarks(self.clock()), inferred=True)
+
+    def reset(self):
+        pass
+
+
+def run_decimated(tracker, clock, frames, dt=0.1):
+    results = []
+    for i in range(frames):
+        clock.t = i * dt
+        results.append(tracker.process(None))
+    return results
+
+
+@pytest.mark.parametrize("predictor", ["velocity", "kalman"])
+def test_decimation_schedule(predictor):
+    clock = Clock()
+    model = MovingPerson(clock)
+    tracker = trackers.DecimatedTracker(model, infer_every=3, predictor=predictor, clock=clock)
+    results = run_decimated(tracker, clock, 9)
+    assert [result.inferred for result in results] == [True, False, False] * 3
+    assert model.calls == tracker.inferences == 3
+    assert tracker.stats()["frames"] == 9
+
+
+def test_no_prediction_falls_through_to_the_model():
+    clock = Clock()
+    model = MovingPerson(clock)
+    model.person = False
+    tracker = trackers.DecimatedTracker(model, infer_every=3, clock=clock)
+    # nobody found: there is nothing to extrapolate, every frame is inferred
+    results = run_decimated(tracker, clock, 4)
+    assert model.calls == 4
+    assert all(result.inferred for result in results)
+
+    # frame 4 is due for a prediction, but there is none; once somebody is
+    # found, the next frames are predicted again
+    model.person = True
+    clock.t = 0.4
+    assert tracker.process(None).inferred
+    clock.t = 0.5
+    assert not tracker.process(None).inferred
+
+
+@pytest.mark.parametrize("predictor", ["velocity", "kalman"])
+def test_predictions_follow_constant_motion(predictor):
+    clock = Clock()
+    model = MovingPerson(clock)
+    tracker = trackers.DecimatedTracker(model, infer_every=2, predictor=predictor, clock=clock)
+    results = run_decimated(tracker, clock, 12)
+    for i, result in enumerate(results[4:], start=4):
+        expected = model.landmarks(i * 0.1)
+        # the Kalman filter settles on the velocity over a few inferences
+        np.testing.assert_allclose(result.landmarks[:, :2], expected[:, :2], atol=2e-3)
+        np.testing.assert_array_equal(result.landmarks[:, 3], 1.0)
+
+
+def kalman_reference(measurements, times, process_noise, measurement_noise):
+    # textbook filter for one coordinate, with the same start as the predictor
+    x = np.array([measurements[0], 0.0])
+    p = np.diag([measurement_noise, 1.0])
+    h = np.array([[1.0, 0.0]])
+    for z, dt in zip(measurements[1:], np.diff(times)):
+        f = np.array([[1.0, dt], [0.0, 1.0]])
+        q = process_noise * np.array([[dt ** 3 / 3, dt ** 2 / 2], [dt ** 2 / 2, dt]])
+        x = f @ x
+        p = f @ p @ f.T + q
+        s = h @ p @ h.T + measurement_noise
+        k = p @ h.T / s
+        x = x + (k * (z - h @ x)).ravel()
+        p = (np.eye(2) - k @ h) @ p
+    return x, p
+
+
+def test_kalman_matches_the_matrix_form():
+    rng = np.random.default_rng(8)
+    times = np.cumsum(rng.uniform(0.02, 0.2, 8))
+    measurements = rng.uniform(0.0, 1.0, 8)
+    predictor = trackers.KalmanPredictor(process_noise=0.5, measurement_noise=1e-3)
+    for z, t in zip(measurements, times):
+        landmarks = np.full((1, 4), 1.0, np.float32)
+        landmarks[0, 0] = z
+        predictor.update(landmarks, t)
+
+    x, p = kalman_reference(measurements.astype(np.float32).astype(np.float64), times, 0.5, 1e-3)
+    np.testing.assert_allclose(predictor._state[0, 0], x, rtol=1e-6, atol=1e-9)
+    np.testing.assert_allclose(predictor._cov[0, 0], p, rtol=1e-6, atol=1e-12)
+
+    # prediction is the propagated position
+    dt = 0.1
+    predicted = predictor.predict(times[-1] + dt)
+    assert predicted[0, 0] == pytest.approx(x[0] + x[1] * dt, abs=1e-6)
+
+
+@pytest.mark.parametrize("predictor", ["velocity", "kalman"])
+def test_landmarks_that_appear_start_at_rest(predictor):
+    model = trackers.PREDICTORS[predictor]()
+    landmarks = np.full((2, 4), np.nan, np.float32)
+    landmarks[0] = (0.2, 0.3, 0.0, 1.0)
+    model.update(landmarks, 0.0)
+    # the second landmark shows up, the first one keeps still
+    landmarks = landmarks.copy()
+    landmarks[1] = (0.6, 0.7, 0.0, 1.0)
+    model.update(landmarks, 0.1)
+
+    predicted = model.predict(0.5)
+    np.testing.assert_allclose(predicted[:, :2], [[0.2, 0.3], [0.6, 0.7]], atol=1e-6)
+    assert np.isfinite(predicted[:, :3]).all()
+
+
+def test_kalman_drops_landmarks_that_vanish():
+    model = trackers.KalmanPredictor()
+    landmarks = np.array([[0.2, 0.3, 0.0, 1.0], [0.6, 0.7, 0.0, 1.0]], np.float32)
+    model.update(landmarks, 0.0)
+    landmarks = landmarks.copy()
+    landmarks[1, :3] = np.nan
+    model.update(landmarks, 0.1)
+    predicted = model.predict(0.2)
+    assert np.isfinite(predicted[0, :3]).all()
+    assert np.isnan(predicted[1, :3]).all()
@@ -0,0 +1,276 @@
+# full screen lockout view: camera frames, contact HUD, cursed memes
+#
+# this module pulls in OpenCV, NumPy and the vision stack, so the health bar
+# only imports it (through load_vision) shortly before it is needed
+import os
+import time
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QIcon
+from PyQt5 import uic
+from PyQt5.QtWidgets import QApplication, QLabel, QProgressBar, QWidget
+import cv2
+
+import vision.render as render
+from vision.daemon import vision_from_env
+from vision.engine import VisionEngine
+from vision.contact_history import ContactHistory
+from core.metrics import metrics
+from core.scheduler import PeriodicTask
+import core.state as health_state
+from ui.frame_view import frame_view_from_env
+from ui.meme_compositor import MemeCompositor
+
+# presentation timer interval, 33fps for smooth video
+FRAME_INTERVAL_MS = 30
+
+# TOUCH_GRASS_FIRST_FRAME_MS: lockout -> first camera frame target, a warning
+# is printed when a lockout misses it
+FIRST_FRAME_ENV = "TOUCH_GRASS_FIRST_FRAME_MS"
+FIRST_FRAME_TARGET = float(os.environ.get(FIRST_FRAME_ENV, "500")) / 1000.0
+
+MEME_PATHS = ['assets/grass-meme1.jpg', 'assets/grass-meme2.jpg',
+              'assets/grass-meme3.jpg', 'assets/leaf.jpg',
+              'assets/warning-text.jpg']
+
+
+def load_meme_images():
+    # Load cursed meme images
+    meme_images = []
+    for path in MEME_PATHS:
+        img = cv2.imread(path)
+        if img is not None:
+            # Resize to reasonable size (300x300)
+            img = cv2.resize(img, (300, 300))
+            meme_images.append(img)
+        else:
+            print(f"Warning: Could not load {path}")
+
+    print(f"Loaded {len(meme_images)} meme images")
+    return meme_images
+
+
+def load_vision():
+    # everything the lockout screen needs that can be built off the GUI
+    # thread: the vision engine (or daemon client) and the meme sprites, whose
+    # masks and rotated variants are cached rather than rebuilt every frame
+    vision = vision_from_env()
+    meme_images = load_meme_images()
+    return vision, meme_images, MemeCompositor(meme_images)
+
+
+class CameraWidget(QWidget):
+    def __init__(self, main_window, vision, meme_images, memes):
+        super().__init__()
+        uic.loadUi('data/camera_alert.ui', self)
+        self.setWindowIcon(QIcon('data/grass.png'))
+        self.setWindowTitle("GRASS ALERT")
+        self.setWindowFlags(Qt.Window | Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint)
+        self.grabMouse()
+
+        self.main_window = main_window
+
+        self.video_label = self.findChild(QLabel, "cameraLabel")
+        screen_geometry = QApplication.primaryScreen().geometry()
+        screen_width = screen_geometry.width()
+        screen_height = screen_geometry.height()
+        self.video_label.setGeometry(0, 0, screen_width, screen_height)
+        # frames are painted by a view inside the label, which keeps the
+        # label's place below the alert text and the progress bar
+        self.frame_view = frame_view_from_env(self.video_label)
+        self.frame_view.setGeometry(self.video_label.rect())
+
+        self.progressBar = self.findChild(QProgressBar, "progressBar")
+        self.progressBar.setMinimum(0)
+        self.progressBar.setMaximum(100)
+        self.value = 0
+        self.progressBar.setValue(self.value)
+        self.progressBar.setGeometry(50, screen_height - 100, screen_width - 100, 30)
+
+        # camera, models and worker threads (vision/engine.py), or a client of
+        # the vision daemon when TOUCH_GRASS_DAEMON is set
+        self.vision = vision
+
+        # contact status text on the right side, lower on screen; cached
+        # between contact changes and placed relative to the frame size
+        self.hud = render.HudLayer(anchor=(0.625, 0.63), reference_height=1080,
+                                   line_height=30, font_scale=0.7,
+                                   percent_scale=1.2, percent_thickness=3,
+                                   labels=("CONTACT", "no contact"),
+                                   no_contact_color=(150, 150, 150),
+                                   percent_format="Contact: {:.0f}%")
+
+        # per-part contact over the last frames, debounced for progress
+        self.history = ContactHistory()
+
+        # cursed meme images and their compositor (see load_vision)
+        self.meme_images = meme_images
+        self.memes = memes
+
+        # Animation state for cursed effects
+        self.frame_count = 0
+        self.meme_positions = []
+        self.meme_rotations = []
+        self.meme_scales = []
+        self.meme_opacities = []
+
+        # Initialize random properties for each meme
+        import random
+        for i in range(len(self.meme_images)):
+            self.meme_positions.append([
+                random.randint(100, screen_width - 400),
+                random.randint(100, screen_height - 400)
+            ])
+            self.meme_rotations.append(random.uniform(0, 360))
+            self.meme_scales.append(random.uniform(0.5, 1.5))
+            self.meme_opacities.append(1.0)
+
+        # time of the last lockout, until its first camera frame is shown
+        self.locked_at = None
+
+        # ctypes.windll is Windows-only, removed for macOS compatibility
+        # presentation timer, only started while the lockout screen is shown
+        self.timer = PeriodicTask(main_window.scheduler, FRAME_INTERVAL_MS / 1000,
+                                  self.update_frame)
+
+    def reset(self, value=0):
+        self.value = value
+        self.progressBar.setValue(int(self.value))
+        self.history.reset()
+        self.frame_count = 0
+        # Reset meme animations
+        import random
+        screen_geometry = QApplication.primaryScreen().geometry()
+        screen_width = screen_geometry.width()
+        screen_height = screen_geometry.height()
+        for i in range(len(self.meme_images)):
+            self.meme_positions[i] = [
+                random.randint(100, screen_width - 400),
+                random.randint(100, screen_height - 400)
+            ]
+            self.meme_rotations[i] = random.uniform(0, 360)
+            self.meme_scales[i] = random.uniform(0.5, 1.5)
+            self.meme_opacities[i] = 1.0
+
+        self.locked_at = time.perf_counter()
+        self.vision.lock_out()
+        self.timer.start()
+
+    def stop_camera(self):
+        self.timer.stop()
+        self.vision.recover()
+
+    def update_frame(self):
+        # newest analysed frame, stale ones were already dropped by the pipeline
+        packet = self.vision.latest()
+        if packet is None:
+            self.check_vision()
+            return
+        if self.locked_at is not None:
+            self.first_frame_shown()
+
+        # follow the capture rate the quality governor settled on
+        interval = max(FRAME_INTERVAL_MS / 1000, self.vision.frame_interval)
+        if interval != self.timer.interval:
+            self.timer.set_interval(interval)
+
+        final_frame, result = packet.result
+        contact = result.contact
+
+        # cursed animated memes if progress bar is below 5%
+        import random
+        import math
+        with metrics.stage("memes"):
+            if self.value < 5:
+                self.frame_count += 1
+                for i in range(len(self.memes)):
+                    # cursed movement patterns
+                    time = self.frame_count * 0.05
+
+                    # aggressive spinning
+                    self.meme_rotations[i] += random.uniform(-15, 15)
+
+                    # chaotic movement - blast around the screen!
+                    self.meme_positions[i][0] += math.sin(time + i) * random.uniform(10, 30)
+                    self.meme_positions[i][1] += math.cos(time * 1.3 + i) * random.uniform(10, 30)
+
+                    # random teleportation occasionally
+                    if random.random() < 0.02:
+                        h, w = final_frame.shape[:2]
+                        self.meme_positions[i][0] = random.randint(0, max(1, w - 300))
+                        self.meme_positions[i][1] = random.randint(0, max(1, h - 300))
+
+                    # keep in bounds (with wraparound)
+                    h, w = final_frame.shape[:2]
+                    self.meme_positions[i][0] = self.meme_positions[i][0] % max(1, w - 300)
+                    self.meme_positions[i][1] = self.meme_positions[i][1] % max(1, h - 300)
+
+                    # pulsing scale - more extreme
+                    self.meme_scales[i] = 0.5 + 0.8 * abs(math.sin(time * 3 + i))
+
+                    # aggressive blinking
+                    if random.random() < 0.1:  # More frequent blinks
+                        self.meme_opacities[i] = random.uniform(0.2, 1.0)
+                    else:
+                        self.meme_opacities[i] = min(1.0, self.meme_opacities[i] + 0.1)
+
+                    # overlay with opacity using the meme's cached mask
+                    alpha = self.meme_opacities[i] * 0.8
+                    self.memes.draw(final_frame, i,
+                                    self.meme_positions[i][0], self.meme_positions[i][1],
+                                    self.meme_rotations[i], self.meme_scales[i], alpha)
+
+        # draw contact status text
+        with metrics.stage("hud"):
+            self.hud.draw(final_frame, contact, self.vision.render_level)
+            if metrics.hud:
+                render.draw_perf_hud(final_frame, metrics.snapshot())
+
+        # track contact duration per part
+        self.history.push(result.parts, packet.captured_at)
+
+        # update progress bar based on contact (smooth incremental progress)
+        progress_increment = self.history.gain()
+        if progress_increment > 0:
+            self.value = min(self.value + progress_increment, health_state.FULL_HEALTH)
+            self.progressBar.setValue(int(self.value))
+            self.main_window.store.record(health_state.GAIN, progress_increment, self.value)
+
+            if self.value >= 100:
+                self.stop_camera()
+                self.hide()
+                self.releaseMouse()
+                self.main_window.setWindowState(Qt.WindowNoState)
+                self.main_window.showNormal()
+                self.main_window.activateWindow()
+                self.main_window.raise_()
+                self.main_window.reset()
+
+        # scaled once into the view's BGR buffer, painted on the next repaint
+        with metrics.stage("present"):
+            self.frame_view.show_frame(final_frame)
+        metrics.frame()
+
+    def check_vision(self):
+        # a daemon that went away leaves its client without frames for good;
+        # the lockout carries on with an in-process engine instead
+        if getattr(self.vision, "connected", True):
+            return
+        print("Warning: Vision daemon unavailable, running in-process")
+        lost, self.vision = self.vision, VisionEngine()
+        lost.close()
+        self.vision.lock_out()
+
+    def first_frame_shown(self):
+        # lockout -> first camera frame, the delay the preload is there to hide
+        elapsed = time.perf_counter() - self.locked_at
+        self.locked_at = None
+        metrics.record("lockout_first_frame", elapsed)
+        if elapsed > FIRST_FRAME_TARGET:
+            print(f"Warning: First camera frame took {elapsed * 1000:.0f} ms after lockout "
+                  f"(target {FIRST_FRAME_TARGET * 1000:.0f} ms)")
+
+    def closeEvent(self, event):
+        # stop the worker threads and release the camera and MediaPipe
+        self.stop_camera()
+        super().closeEvent(event)
@@ -0,0 +1,118 @@
+# presents BGR camera frames with a single scale and no colour conversion
+#
+# paintEvent draws the covering part of the frame straight into the window,
+# so the one rescale happens while compositing: no RGB copy, no QPixmap copy
+# and no intermediate scaled image.
+#
+#   raster (default) - the frame is padded to 4 bytes per pixel in a buffer
+#                      that is reused for every frame. QImage.Format_RGB32 is
+#                      B, G, R, X in memory, so that is BGR plus padding, no
+#                      channel swap, and it is the format Qt's raster engine
+#                      scales fastest (a Format_BGR888 wrap is cheaper to make
+#                      but about 3x slower to draw scaled)
+#   gl               - TOUCH_GRASS_DISPLAY=gl. the frame buffer itself is
+#                      wrapped as Format_BGR888 and a QOpenGLWidget uploads it
+#                      as a texture and scales it on the GPU; that also works
+#                      with software GL (e.g. QT_OPENGL=software or Mesa
+#                      llvmpipe). the frames come from pooled buffers
+#                      (core/buffers.py) that are not reused while the view
+#                      still holds one
+import os
+
+import cv2
+import numpy as np
+from PyQt5.QtCore import QRect, Qt
+from PyQt5.QtGui import QImage, QOpenGLContext, QPainter
+from PyQt5.QtWidgets import QOpenGLWidget, QWidget
+
+# TOUCH_GRASS_DISPLAY=raster|gl
+DISPLAY_ENV = "TOUCH_GRASS_DISPLAY"
+DISPLAY_BACKENDS = ("raster", "gl")
+
+
+def cover_crop(frame_size, view_size):
+    # source rectangle (x, y, w, h) that fills the view without distortion,
+    # centred and cut at the edges like Qt.KeepAspectRatioByExpanding
+    frame_width, frame_height = frame_size
+    view_width, view_height = view_size
+    scale = max(view_width / frame_width, view_height / frame_height)
+    width = min(frame_width, max(1, round(view_width / scale)))
+    height = min(frame_height, max(1, round(view_height / scale)))
+    return (frame_width - width) // 2, (frame_height - height) // 2, width, height
+
+
+class FramePainter:
+    # shared by the raster and the GL view
+    smooth = False
+
+    def init_frames(self):
+        self._frame = None
+        self._image = None
+        self._source = None
+
+    def show_frame(self, frame):
+        # frame is a BGR uint8 array
+        height, width = frame.shape[:2]
+        self._image = self.wrap(frame)
+        self._source = QRect(*cover_crop((width, height), (self.width(), self.height())))
+        self.update()
+
+    def paint_frame(self):
+        if self._image is None:
+            return
+        painter = QPainter(self)
+        if self.smooth:
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        painter.drawImage(self.rect(), self._image, self._source)
+        painter.end()
+
+
+class FrameView(FramePainter, QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.init_frames()
+        # every pixel is painted, Qt need not clear the background first
+        self.setAttribute(Qt.WA_OpaquePaintEvent, True)
+
+    def wrap(self, frame):
+        # BGR -> BGRX into the reused buffer; the QImage over it is only
+        # rebuilt when the frame size changes
+        height, width = frame.shape[:2]
+        if self._frame is None or self._frame.shape[:2] != (height, width):
+            self._frame = np.empty((height, width, 4), np.uint8)
+            self._image = QImage(self._frame.data, width, height, width * 4,
+                                 QImage.Format_RGB32)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA, dst=self._frame)
+        return self._image
+
+    def paintEvent(self, event):
+        self.paint_frame()
+
+
+class GLFrameView(FramePainter, QOpenGLWidget):
+    # filtering is free once the frame is a texture
+    smooth = True
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.init_frames()
+
+    def wrap(self, frame):
+        # no copy: the frame is kept until the next one replaces it
+        height, width = frame.shape[:2]
+        self._frame = frame
+        return QImage(frame.data, width, height, frame.strides[0], QImage.Format_BGR888)
+
+    def paintGL(self):
+        self.paint_frame()
+
+
+def frame_view_from_env(parent=None):
+    backend = os.environ.get(DISPLAY_ENV, "raster")
+    if backend not in DISPLAY_BACKENDS:
+        print(f"Warning: Unknown display backend {backend}, using raster")
+        backend = "raster"
+    if backend == "gl" and not QOpenGLContext().create():
+        print("Warning: No OpenGL context available, using raster display")
+        backend = "raster"
+    return GLFrameView(parent) if backend == "gl" else FrameView(parent)
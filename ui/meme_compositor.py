@@ -0,0 +1,141 @@
+# cached sprite compositor for the cursed meme overlay
+#
+# each meme's mask is computed once, rotated/scaled variants are cached in a
+# bounded LRU keyed by quantized angle and scale and cropped to their bounding
+# box, and blending happens in place on the frame with uint8 cv2 calls.
+import collections
+
+import cv2
+import numpy as np
+
+MEME_SIZE = 300
+# larger than the meme so the rotated image fits
+CANVAS_SIZE = 450
+# pixels darker than this are treated as background of the meme image
+MASK_THRESHOLD = 10
+
+# variant cache: angles snap to 10 degrees, scales to 0.1, and the cache
+# is bounded by the bytes held in cached variants
+ANGLE_STEP = 10.0
+SCALE_STEP = 0.1
+SPRITE_CACHE_BYTES = 96 * 1024 * 1024
+
+
+class MemeVariant:
+    # one rotated/scaled meme, cropped to the bounding box of its mask
+    __slots__ = ("image", "mask", "dx", "dy", "nbytes")
+
+    def __init__(self, image, mask, dx, dy):
+        self.image = image
+        self.mask = mask
+        self.dx = dx
+        self.dy = dy
+        self.nbytes = image.nbytes + mask.nbytes
+
+
+class MemeSprite:
+    # meme image and its mask, built once at load
+    def __init__(self, image):
+        if image.shape[:2] != (MEME_SIZE, MEME_SIZE):
+            image = cv2.resize(image, (MEME_SIZE, MEME_SIZE))
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        _, self.mask = cv2.threshold(gray, MASK_THRESHOLD, 255, cv2.THRESH_BINARY)
+        self.image = image
+
+    def render(self, angle, scale):
+        # rotate/scale about the canvas centre, warping straight into the
+        # bounding box of the result instead of a full canvas
+        offset = (CANVAS_SIZE - MEME_SIZE) / 2
+        center = (CANVAS_SIZE / 2, CANVAS_SIZE / 2)
+        M = cv2.getRotationMatrix2D(center, angle, scale)
+        M[:, 2] += M[:, :2] @ (offset, offset)
+
+        corners = np.array([[0, 0, 1], [MEME_SIZE, 0, 1],
+                            [0, MEME_SIZE, 1], [MEME_SIZE, MEME_SIZE, 1]], np.float64)
+        placed = corners @ M.T
+        x0, y0 = np.maximum(np.floor(placed.min(axis=0)), 0).astype(int)
+        x1, y1 = np.minimum(np.ceil(placed.max(axis=0)), CANVAS_SIZE).astype(int)
+        if x1 <= x0 or y1 <= y0:
+            return None
+
+        M[:, 2] -= (x0, y0)
+        size = (x1 - x0, y1 - y0)
+        image = cv2.warpAffine(self.image, M, size)
+        mask = cv2.warpAffine(self.mask, M, size, flags=cv2.INTER_NEAREST)
+        return MemeVariant(image, mask, x0, y0)
+
+
+class MemeCompositor:
+    def __init__(self, images, cache_bytes=SPRITE_CACHE_BYTES):
+        self.sprites = [MemeSprite(image) for image in images]
+        self.cache_bytes = cache_bytes
+        self._cache = collections.OrderedDict()
+        self._cached_bytes = 0
+        # blend scratch space, reused for every meme on every frame
+        self._scratch = np.empty((CANVAS_SIZE, CANVAS_SIZE, 3), dtype=np.uint8)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def variant(self, index, angle, scale):
+        angle_step = int(round((angle % 360.0) / ANGLE_STEP))
+        scale_step = max(1, int(round(scale / SCALE_STEP)))
+        key = (index, angle_step, scale_step)
+
+        variant = self._cache.get(key)
+        if variant is not None or key in self._cache:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return variant
+
+        self.misses += 1
+        variant = self.sprites[index].render(angle_step * ANGLE_STEP,
+                                             scale_step * SCALE_STEP)
+        self._cache[key] = variant
+        if variant is not None:
+            self._cached_bytes += variant.nbytes
+        while self._cached_bytes > self.cache_bytes and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            if evicted is not None:
+                self._cached_bytes -= evicted.nbytes
+        return variant
+
+    def draw(self, frame, index, x, y, angle, scale, alpha):
+        # blend meme `index` onto frame in place, canvas top-left at (x, y)
+        variant = self.variant(index, angle, scale)
+        if variant is None or alpha <= 0:
+            return
+
+        frame_h, frame_w = frame.shape[:2]
+        x = max(0, min(frame_w - CANVAS_SIZE, int(x)))
+        y = max(0, min(frame_h - CANVAS_SIZE, int(y)))
+
+        # clip the sprite's bounding box to the frame
+        x0, y0 = x + variant.dx, y + variant.dy
+        x1 = min(x0 + variant.image.shape[1], frame_w)
+        y1 = min(y0 + variant.image.shape[0], frame_h)
+        if x1 <= x0 or y1 <= y0:
+            return
+
+        w, h = x1 - x0, y1 - y0
+        roi = frame[y0:y1, x0:x1]
+        sprite = variant.image[:h, :w]
+        mask = variant.mask[:h, :w]
+
+        if alpha >= 1.0:
+            cv2.copyTo(sprite, mask, roi)
+            return
+
+        blended = self._scratch[:h, :w]
+        cv2.addWeighted(roi, 1.0 - alpha, sprite, alpha, 0, dst=blended)
+        cv2.copyTo(blended, mask, roi)
+
+    def stats(self):
+        return {
+            "cached": len(self._cache),
+            "cached_bytes": self._cached_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
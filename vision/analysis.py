@@ -0,0 +1,83 @@
+# analysis-only entry point for the vision package
+#
+# analyze_frame() returns masks, landmarks and contact results and never draws
+# anything. drawing lives in vision/render.py and is opt-in, so headless and
+# background runs pay nothing for visualisation.
+import cv2
+import numpy as np
+
+import vision.body_tracker as body_tracker
+import vision.contact_logic as contact_logic
+import vision.grass_detection as grass_detection
+from core.metrics import metrics
+
+
+# contact flags when nobody is in view
+NO_CONTACT = np.zeros(0, dtype=bool)
+
+
+class ContactResult:
+    # the part of an analysis that crosses process boundaries (vision daemon)
+    __slots__ = ("parts", "detected")
+
+    def __init__(self, parts, detected):
+        # (x, y, visibility, contact) per body part, see contact_logic.part_rows
+        self.parts = parts
+        self.detected = detected  # somebody is in view
+
+    @property
+    def contact(self):
+        # bool per body part in contact_logic.PART_NAMES order, empty when
+        # nobody is in view
+        if not self.detected:
+            return NO_CONTACT
+        return self.parts[:, contact_logic.CONTACT] > 0
+
+    @property
+    def contact_status(self):
+        # part name -> bool, for JSON and other readers that want names
+        return dict(zip(contact_logic.PART_NAMES, self.contact.tolist()))
+
+    def contact_count(self):
+        return int(np.count_nonzero(self.contact))
+
+    def contact_percentage(self):
+        total_parts = max(len(self.contact), 1)
+        return (self.contact_count() / total_parts) * 100
+
+
+class FrameAnalysis(ContactResult):
+    __slots__ = ("grass", "tracking")
+
+    def __init__(self, grass, tracking, parts):
+        super().__init__(parts, bool(tracking.pose_landmarks))
+        self.grass = grass  # GrassMask (pyramid level, full() on demand)
+        self.tracking = tracking  # TrackingResult from vision/trackers.py
+
+    @property
+    def landmarks(self):
+        return self.tracking.landmarks
+
+    def summary(self):
+        # parts is built fresh for every frame, nothing else writes to it
+        return ContactResult(self.parts, self.detected)
+
+
+def analyze_frame(frame, tracker, grass_detector=None, lut=None, arena=None):
+    # frame is the mirrored BGR camera frame; grass_detector is an
+    # IncrementalGrassDetector, or None for a one-off pyramid mask. arena is
+    # an optional FrameArena (core/buffers.py) for the RGB copy
+    with metrics.stage("grass"):
+        if grass_detector is not None:
+            grass = grass_detector.detect(frame)
+        else:
+            grass = grass_detection.detect_grass_mask(frame, lut=lut)
+
+    with metrics.stage("pose"):
+        image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB,
+                             dst=arena.scratch_like("rgb", frame) if arena is not None else None)
+        tracking = body_tracker.as_tracker(tracker).process(image)
+
+    with metrics.stage("contact"):
+        parts = contact_logic.part_rows(tracking.landmarks, grass)
+    return FrameAnalysis(grass, tracking, parts)
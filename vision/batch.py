@@ -0,0 +1,258 @@
+# headless batch analysis of recorded sessions across a process pool
+#
+#   python -m vision.batch sessions/*.mp4 --out audit.npz
+#   python -m vision.batch session.tgraw --workers 8 --shard-frames 900
+#
+# every session is split into frame ranges and the ranges are spread over the
+# pool. each worker owns its tracker and grass detector, decodes its own range
+# (raw dumps are memory mapped, so those frames come straight from the shared
+# page cache) and writes its per-frame results into shared-memory columns.
+# only the small job tuples are pickled. the parent then derives contact
+# percentage and the health trajectory and writes one columnar .npz file.
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import vision.contact_logic as contact_logic
+from vision.contact_history import ContactHistory
+from core.buffers import FrameArena
+import vision.grass_detection as grass_detection
+import vision.grass_lut as grass_lut
+import vision.sources as frame_sources
+import vision.trackers as trackers
+
+PARTS = contact_logic.PART_NAMES
+PART_INDICES = contact_logic.PART_LANDMARKS
+
+# frames per job; every job starts its tracker from scratch, so very small
+# shards pay for extra detections at the boundaries
+SHARD_FRAMES = 900
+
+FULL_HEALTH = 100.0
+
+# per-frame columns kept in shared memory: name -> (dtype, trailing shape)
+COLUMNS = {
+    "frame": (np.int32, ()),
+    "timestamp": (np.float32, ()),
+    "detected": (np.bool_, ()),
+    "grass_fraction": (np.float32, ()),
+    "contact": (np.bool_, (len(PARTS),)),
+    "coverage": (np.float32, (len(PARTS),)),
+}
+
+
+class SharedColumns:
+    # one shared memory block per column, attachable from other processes
+    def __init__(self, rows, names=None):
+        self.rows = rows
+        self._blocks = {}
+        self.arrays = {}
+        for name, (dtype, shape) in COLUMNS.items():
+            full_shape = (rows,) + shape
+            nbytes = max(int(np.prod(full_shape)) * np.dtype(dtype).itemsize, 1)
+            if names is None:
+                block = shared_memory.SharedMemory(create=True, size=nbytes)
+            else:
+                block = shared_memory.SharedMemory(name=names[name])
+            self._blocks[name] = block
+            self.arrays[name] = np.ndarray(full_shape, dtype=dtype, buffer=block.buf)
+
+        if names is None:
+            # rows no worker reached stay marked with frame -1
+            self.arrays["frame"][:] = -1
+
+    def names(self):
+        return {name: block.name for name, block in self._blocks.items()}
+
+    def close(self, unlink=False):
+        self.arrays = {}
+        for block in self._blocks.values():
+            block.close()
+            if unlink:
+                block.unlink()
+        self._blocks = {}
+
+
+def plan_jobs(paths, shard_frames=SHARD_FRAMES):
+    # (session index, path, first frame, end frame, first output row) per shard
+    jobs = []
+    rows = 0
+    for session, path in enumerate(paths):
+        source = frame_sources.open_source(path, realtime=False, decode_ahead=0)
+        with source:
+            count = source.frame_count()
+        if count == 0:
+            print(f"Warning: No frames in {path}")
+        for start in range(0, count, shard_frames):
+            stop = min(start + shard_frames, count)
+            jobs.append((session, path, start, stop, rows + start))
+        rows += count
+    return jobs, rows
+
+
+# per-process worker state, set up once by the pool initializer
+_worker = {}
+
+
+def _init_worker(column_names, rows, tracker_spec, lut_path):
+    # one thread per worker for OpenCV; the pool provides the parallelism
+    cv2.setNumThreads(1)
+    backend, _, complexity = tracker_spec.partition(":")
+    complexity = int(complexity) if complexity else trackers.DEFAULT_MODEL_COMPLEXITY
+    lut = grass_lut.GrassLUT.load(lut_path) if lut_path else None
+
+    _worker["columns"] = SharedColumns(rows, column_names)
+    _worker["tracker"] = trackers.create_tracker(backend, complexity)
+    _worker["detector"] = grass_detection.IncrementalGrassDetector(lut=lut)
+    _worker["arena"] = FrameArena()
+
+
+def analyze_range(job):
+    # analyses frames [start, stop) of one session into the shared columns
+    session, path, start, stop, row = job
+    columns = _worker["columns"].arrays
+    tracker = _worker["tracker"]
+    detector = _worker["detector"]
+    arena = _worker["arena"]
+    tracker.reset()
+    detector.reset()
+
+    began = time.perf_counter()
+    source = frame_sources.open_source(path, realtime=False, decode_ahead=0)
+    done = 0
+    with source:
+        source.seek(start)
+        for index in range(start, stop):
+            ret, frame = source.read()
+            if not ret:
+                break
+            # same orientation as the live pipeline, which mirrors the camera
+            frame = cv2.flip(frame, 1, dst=arena.scratch_like("mirrored", frame))
+
+            grass = detector.detect(frame)
+            tracking = tracker.process(
+                cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=arena.scratch_like("rgb", frame)))
+            landmarks = tracking.landmarks
+
+            out = row + (index - start)
+            columns["frame"][out] = index
+            columns["timestamp"][out] = source.timestamp
+            columns["grass_fraction"][out] = np.count_nonzero(grass.level) / grass.level.size
+            detected = bool(np.isfinite(landmarks[:contact_logic.POSE_LANDMARK_COUNT, 0]).any())
+            columns["detected"][out] = detected
+            if detected:
+                contact, coverage = contact_logic.detect_contacts(landmarks, grass)
+                columns["contact"][out] = contact[PART_INDICES]
+                columns["coverage"][out] = coverage[PART_INDICES]
+            else:
+                columns["contact"][out] = False
+                columns["coverage"][out] = 0.0
+            done += 1
+
+    return session, done, time.perf_counter() - began
+
+
+def health_trajectory(contact, timestamps):
+    # lockout recovery replayed over one session with the same debounced
+    # ContactHistory as CameraWidget.update_frame: health starts at zero and
+    # every frame adds the history's gain
+    history = ContactHistory()
+    rows = np.full((len(PARTS), contact_logic.PART_FIELDS), np.nan, dtype=np.float32)
+    health = np.zeros(len(contact), dtype=np.float32)
+    value = 0.0
+    for i in range(len(contact)):
+        rows[:, contact_logic.CONTACT] = contact[i]
+        history.push(rows, timestamps[i])
+        value = min(FULL_HEALTH, value + history.gain())
+        health[i] = value
+    return health
+
+
+def run_batch(paths, out, workers=None, shard_frames=SHARD_FRAMES,
+              tracker_spec=trackers.DEFAULT_BACKEND, lut_path=None):
+    jobs, rows = plan_jobs(paths, shard_frames)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs) or 1))
+    print(f"{len(paths)} session(s), {rows} frames in {len(jobs)} shard(s) "
+          f"on {workers} worker(s)")
+
+    columns = SharedColumns(rows)
+    began = time.perf_counter()
+    analysed = 0
+    try:
+        # spawn, not fork: mediapipe and OpenCV threads do not survive a fork
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(workers, initializer=_init_worker,
+                          initargs=(columns.names(), rows, tracker_spec, lut_path)) as pool:
+            # longest shards first keeps the tail of the run short
+            ordered = sorted(jobs, key=lambda job: job[3] - job[2], reverse=True)
+            for session, done, seconds in pool.imap_unordered(analyze_range, ordered):
+                analysed += done
+                print(f"  {os.path.basename(paths[session])}: {done} frames "
+                      f"in {seconds:.1f}s ({done / max(seconds, 1e-9):.1f} fps)")
+
+        results = collect(columns, jobs, paths)
+    finally:
+        columns.close(unlink=True)
+
+    elapsed = time.perf_counter() - began
+    np.savez_compressed(out, **results)
+    print(f"Analysed {analysed} frames in {elapsed:.1f}s "
+          f"({analysed / max(elapsed, 1e-9):.1f} fps), wrote {out}")
+    return results
+
+
+def collect(columns, jobs, paths):
+    # copies the rows that were reached out of shared memory and adds the
+    # derived per-session columns
+    session_of_row = np.empty(columns.rows, dtype=np.int16)
+    for session, _, start, stop, row in jobs:
+        session_of_row[row:row + stop - start] = session
+
+    arrays = columns.arrays
+    valid = arrays["frame"] >= 0
+    results = {name: array[valid].copy() for name, array in arrays.items()}
+    results["session"] = session_of_row[valid]
+
+    contact_counts = results["contact"].sum(axis=1)
+    results["contact_percentage"] = (contact_counts * (100.0 / len(PARTS))).astype(np.float32)
+    results["health"] = np.zeros(len(contact_counts), dtype=np.float32)
+    for session in range(len(paths)):
+        rows = results["session"] == session
+        results["health"][rows] = health_trajectory(results["contact"][rows],
+                                                    results["timestamp"][rows])
+
+    results["sessions"] = np.array(paths)
+    results["parts"] = np.array(PARTS)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch analysis of recorded sessions")
+    parser.add_argument("sessions", nargs="+",
+                        help="video files, image directories or .tgraw dumps")
+    parser.add_argument("--out", default="batch_results.npz")
+    parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--shard-frames", type=int, default=SHARD_FRAMES)
+    parser.add_argument("--tracker", default=trackers.DEFAULT_BACKEND,
+                        help="backend[:complexity], e.g. pose:1")
+    parser.add_argument("--lut", default=os.environ.get(grass_lut.LUT_PATH_ENV),
+                        help="calibrated grass table")
+    args = parser.parse_args(argv)
+
+    run_batch(args.sessions, args.out, args.workers, args.shard_frames,
+              args.tracker, args.lut)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,29 +1,39 @@
 import mediapipe as mp
 import cv2
 import vision.contact_logic as contact_logic
+import vision.trackers as trackers
+from vision.sources import source_from_env
 
 # Initialize Mediapipe drawing utilities and holistic model components
 mp_drawing = mp.solutions.drawing_utils
 mp_holistic = mp.solutions.holistic
 
-# Start capturing video from the webcams
-cap = cv2.VideoCapture(0)
 
+def as_tracker(tracker):
+    # tracker is any backend from vision/trackers.py; a bare mediapipe
+    # solution such as Holistic is wrapped on the fly
+    if not hasattr(tracker, "warm_up"):
+        tracker = trackers.SolutionTracker(tracker)
+    return tracker
 
-def body_tracker(frame, grass_mask, holistic):
-    height, width, _ = frame.shape
 
-    # BGR image to RGB before processing
-    image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+def track_body(frame, grass_mask, tracker, arena=None):
+    # analysis only: landmarks and contact, nothing is drawn
+    # BGR image to RGB before processing, into the arena's buffer if given
+    image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB,
+                         dst=arena.scratch_like("rgb", frame) if arena is not None else None)
 
-    # process the image and get the holistic results
-    results = holistic.process(image)
+    # process the image and get the landmarks (possibly predicted)
+    results = as_tracker(tracker).process(image)
 
-    # convert back to BGR for OpenCV
-    image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    parts = contact_logic.part_rows(results.landmarks, grass_mask)
+    return results, parts[:, contact_logic.CONTACT] > 0
 
-    contact_status = contact_logic.check_grass_contact(
-        results.pose_landmarks, grass_mask, height, width)
+
+def draw_body(image, results, contact):
+    # contact is a bool per body part in contact_logic.PART_NAMES order
+    # draws landmarks and contact highlights onto a BGR image in place
+    height, width, _ = image.shape
 
     # draw the landmarks
     if results.pose_landmarks:
@@ -38,33 +48,35 @@ def body_tracker(frame, grass_mask, holistic):
         )
 
         # highlight landmarks that are in contact with grass
-        for part, in_contact in contact_status.items():
-            if in_contact:
-                if 'foot' in part:
-                    landmark_idx = mp_holistic.PoseLandmark.LEFT_FOOT_INDEX if 'left' in part else mp_holistic.PoseLandmark.RIGHT_FOOT_INDEX
-                elif 'hand' in part:
-                    landmark_idx = mp_holistic.PoseLandmark.LEFT_INDEX if 'left' in part else mp_holistic.PoseLandmark.RIGHT_INDEX
-                elif 'knee' in part:
-                    landmark_idx = mp_holistic.PoseLandmark.LEFT_KNEE if 'left' in part else mp_holistic.PoseLandmark.RIGHT_KNEE
-
-                lmrk = results.pose_landmarks.landmark[landmark_idx]
-                x = int(lmrk.x * width)
-                y = int(lmrk.y * height)
-
-                # circle for contact
-                cv2.circle(image, (x, y), 15, (0, 255, 0), -1)
+        for landmark_idx in contact_logic.PART_LANDMARKS[contact]:
+            lmrk = results.pose_landmarks.landmark[landmark_idx]
+            x = int(lmrk.x * width)
+            y = int(lmrk.y * height)
+
+            # circle for contact
+            cv2.circle(image, (x, y), 15, (0, 255, 0), -1)
 
         mp_drawing.draw_landmarks(
             image, results.left_hand_landmarks, mp_holistic.HAND_CONNECTIONS)
         mp_drawing.draw_landmarks(
             image, results.right_hand_landmarks, mp_holistic.HAND_CONNECTIONS)
 
-    return image, contact_status
+    return image
+
+
+def body_tracker(frame, grass_mask, tracker):
+    # tracking plus drawing on a copy of the frame; see track_body for the
+    # analysis-only path
+    results, contact = track_body(frame, grass_mask, tracker)
+    image = draw_body(frame.copy(), results, contact)
+    return image, dict(zip(contact_logic.PART_NAMES, contact.tolist()))
 
 
 if __name__ == "__main__":
     # next we process the video feed frame by frame
-    with mp_holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=0.5) as holistic:
+    cap = source_from_env().acquire()
+    tracker = trackers.tracker_from_env()
+    try:
         while cap.isOpened():
             ret, frame = cap.read()
 
@@ -72,7 +84,7 @@ if __name__ == "__main__":
                 break
 
             # process the frame to detect body landmarks
-            result, _ = body_tracker(frame, None, holistic)
+            result, _ = body_tracker(frame, None, tracker)
 
             # display processed frame
             cv2.imshow('full body detection', result)
@@ -80,6 +92,8 @@ if __name__ == "__main__":
             # temporary quit key
             if cv2.waitKey(10) & 0xFF == ord('q'):
                 break
+    finally:
+        tracker.close()
 
     # release resources
     cap.release()
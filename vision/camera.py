@@ -0,0 +1,137 @@
+# one shared, lazily opened webcam handle for every entry point
+#
+# nothing touches the device at import time. the first acquire() opens it with a
+# cheap capture format and the last release() closes it again, so the camera is
+# only held while something is actually reading frames.
+import sys
+import threading
+
+import cv2
+
+CAMERA_INDEX = 0
+
+# cheap capture format: MJPG keeps USB bandwidth low at 720p, and a 1-frame
+# driver buffer means read() never hands back a stale frame
+TARGET_WIDTH = 1280
+TARGET_HEIGHT = 720
+TARGET_FPS = 30
+CAPTURE_FOURCC = "MJPG"
+DRIVER_BUFFER_SIZE = 1
+
+
+def default_backend():
+    # AVFoundation is the only backend that behaves well on macOS
+    if sys.platform == "darwin":
+        return cv2.CAP_AVFOUNDATION
+    return cv2.CAP_ANY
+
+
+class CameraManager:
+    def __init__(self, index=CAMERA_INDEX, width=TARGET_WIDTH, height=TARGET_HEIGHT,
+                 fps=TARGET_FPS, fourcc=CAPTURE_FOURCC, backend=None):
+        self.index = index
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.fourcc = fourcc
+        self.backend = default_backend() if backend is None else backend
+
+        self._lock = threading.Lock()
+        self._cap = None
+        self._users = 0
+
+    def acquire(self):
+        # open the device on first use; every acquire needs a matching release
+        with self._lock:
+            if self._cap is None:
+                self._cap = self._open()
+            self._users += 1
+        return self
+
+    def release(self):
+        with self._lock:
+            if self._users == 0:
+                return
+            self._users -= 1
+            if self._users == 0 and self._cap is not None:
+                self._cap.release()
+                self._cap = None
+
+    def close(self):
+        # drop the device regardless of how many users still hold it
+        with self._lock:
+            self._users = 0
+            if self._cap is not None:
+                self._cap.release()
+                self._cap = None
+
+    def is_opened(self):
+        with self._lock:
+            return self._cap is not None and self._cap.isOpened()
+
+    # keep the cv2.VideoCapture spelling so existing loops keep working
+    isOpened = is_opened
+
+    def read(self):
+        with self._lock:
+            if self._cap is None:
+                return False, None
+            return self._cap.read()
+
+    def set_resolution(self, width, height):
+        # applied to the open device right away, otherwise on the next open
+        with self._lock:
+            if (width, height) == (self.width, self.height):
+                return
+            self.width, self.height = width, height
+            if self._cap is not None and self._cap.isOpened():
+                self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+                self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+
+    def negotiated_format(self):
+        # what the driver actually agreed to, which may differ from the request
+        with self._lock:
+            if self._cap is None:
+                return None
+            fourcc = int(self._cap.get(cv2.CAP_PROP_FOURCC))
+            return {
+                "width": int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                "height": int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                "fps": self._cap.get(cv2.CAP_PROP_FPS),
+                "fourcc": "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)),
+                "buffer_size": int(self._cap.get(cv2.CAP_PROP_BUFFERSIZE)),
+            }
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.index, self.backend)
+        if not cap.isOpened():
+            print(f"Warning: Could not open camera {self.index}")
+            return cap
+
+        # the fourcc has to be set before the resolution on most drivers
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc))
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        cap.set(cv2.CAP_PROP_FPS, self.fps)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, DRIVER_BUFFER_SIZE)
+        return cap
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+_shared_camera = None
+_shared_lock = threading.Lock()
+
+
+def shared_camera():
+    # process-wide manager; cheap to call, never opens the device by itself
+    global _shared_camera
+    with _shared_lock:
+        if _shared_camera is None:
+            _shared_camera = CameraManager()
+        return _shared_camera
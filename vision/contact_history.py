@@ -0,0 +1,103 @@
+# fixed-size history of per-part contact records
+#
+# every analysed frame contributes one (parts, PART_FIELDS) row block of
+# position, visibility and contact (contact_logic.part_rows) to a preallocated
+# ring, so tracking contact over time allocates no dicts or strings. contact is
+# debounced per part with hysteresis: a part becomes active after ENTER_FRAMES
+# frames of contact in a row and inactive after EXIT_FRAMES frames without.
+# dwell times, smoothed positions and the lockout progress gain are read off
+# the same arrays.
+import numpy as np
+
+from vision.contact_logic import CONTACT, PART_FIELDS, PART_NAMES, X, Y
+
+HISTORY_FRAMES = 64
+# 10 frames = 0.33 seconds of contact before a part counts
+ENTER_FRAMES = 10
+# short dropouts of a detection do not end a contact
+EXIT_FRAMES = 3
+
+# lockout recovery: progress per frame for the first active part and for
+# every further one
+BASE_INCREMENT = 0.3
+PER_PART_INCREMENT = 1.1
+
+
+class ContactHistory:
+    def __init__(self, capacity=HISTORY_FRAMES, enter_frames=ENTER_FRAMES,
+                 exit_frames=EXIT_FRAMES):
+        parts = len(PART_NAMES)
+        self.capacity = capacity
+        self.enter_frames = enter_frames
+        self.exit_frames = exit_frames
+        self.rows = np.empty((capacity, parts, PART_FIELDS), dtype=np.float32)
+        self.times = np.empty(capacity, dtype=np.float64)
+        # per part: debounced state, consecutive frames with / without
+        # contact and the time it last became active
+        self.active = np.zeros(parts, dtype=bool)
+        self._on = np.zeros(parts, dtype=np.int32)
+        self._off = np.zeros(parts, dtype=np.int32)
+        self._since = np.zeros(parts, dtype=np.float64)
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.rows.fill(np.nan)
+        self.times.fill(0.0)
+        self.active[:] = False
+        self._on[:] = 0
+        self._off[:] = 0
+        self._since[:] = 0.0
+
+    def push(self, rows, t):
+        # rows from contact_logic.part_rows, t in seconds
+        slot = self.frames % self.capacity
+        self.rows[slot] = rows
+        self.times[slot] = t
+        self.frames += 1
+
+        contact = rows[:, CONTACT] > 0
+        self._on += 1
+        self._on *= contact
+        self._off += 1
+        self._off *= ~contact
+
+        entering = ~self.active & (self._on >= self.enter_frames)
+        leaving = self.active & (self._off >= self.exit_frames)
+        self._since[entering] = t
+        self.active ^= entering | leaving
+
+    @property
+    def last_time(self):
+        return self.times[(self.frames - 1) % self.capacity] if self.frames else 0.0
+
+    def recent(self, frames):
+        # rows and times of the last `frames` frames, oldest first
+        count = min(frames, self.frames, self.capacity)
+        slots = np.arange(self.frames - count, self.frames) % self.capacity
+        return self.rows[slots], self.times[slots]
+
+    def dwell(self, now=None):
+        # seconds each part has been active, 0 for inactive parts
+        if now is None:
+            now = self.last_time
+        return np.where(self.active, now - self._since, 0.0)
+
+    def smoothed(self, frames=5):
+        # mean (x, y) per part over the last frames it was seen in, NaN if none
+        rows, _ = self.recent(frames)
+        positions = rows[:, :, X:Y + 1]
+        seen = np.isfinite(positions)
+        total = np.where(seen, positions, 0.0).sum(axis=0)
+        count = seen.sum(axis=0)
+        return np.where(count > 0, total / np.maximum(count, 1), np.nan)
+
+    def active_count(self):
+        return int(np.count_nonzero(self.active))
+
+    def gain(self):
+        # lockout progress earned by the current frame
+        active = self.active_count()
+        if not active:
+            return 0.0
+        return BASE_INCREMENT + (active - 1) * PER_PART_INCREMENT
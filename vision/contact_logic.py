@@ -10,54 +10,221 @@ import vision.body_tracker as body_tracker
 mp_drawing = mp.solutions.drawing_utils
 mp_holistic = mp.solutions.holistic
 
-# Start capturing video from the webcam
-cap = cv2.VideoCapture(0)
 
+# layout of the landmark array used by the contact engine: 33 pose landmarks,
+# then 21 left hand and 21 right hand landmarks, each row (x, y, z, visibility)
+# in normalised image coordinates. missing landmarks are NaN.
+POSE_LANDMARK_COUNT = 33
+HAND_LANDMARK_COUNT = 21
+LEFT_HAND_OFFSET = POSE_LANDMARK_COUNT
+RIGHT_HAND_OFFSET = LEFT_HAND_OFFSET + HAND_LANDMARK_COUNT
+LANDMARK_COUNT = RIGHT_HAND_OFFSET + HAND_LANDMARK_COUNT
 
-def check_grass_contact(pose_landmarks, grass_mask, frame_height, frame_width):
-    if not pose_landmarks:
+# define which mediapipe landmarks correspond to body parts
+BODY_PARTS = {
+    'left_foot': int(mp_holistic.PoseLandmark.LEFT_FOOT_INDEX),
+    'right_foot': int(mp_holistic.PoseLandmark.RIGHT_FOOT_INDEX),
+    'left_hand': int(mp_holistic.PoseLandmark.LEFT_INDEX),
+    'right_hand': int(mp_holistic.PoseLandmark.RIGHT_INDEX),
+    'left_knee': int(mp_holistic.PoseLandmark.LEFT_KNEE),
+    'right_knee': int(mp_holistic.PoseLandmark.RIGHT_KNEE)
+}
+
+# the same parts as arrays, for per-part records without dicts
+PART_NAMES = tuple(BODY_PARTS)
+PART_LANDMARKS = np.array(list(BODY_PARTS.values()), dtype=np.intp)
+
+# columns of a per-part row: normalised position, visibility and contact
+X, Y, VISIBILITY, CONTACT = range(4)
+PART_FIELDS = 4
+
+# half side of the square checked around each landmark, in pixels, for a
+# person whose shoulders span REFERENCE_SHOULDER_WIDTH of the frame width
+CONTACT_RADIUS = 30
+REFERENCE_SHOULDER_WIDTH = 0.2
+MIN_RADIUS_SCALE = 0.5
+MAX_RADIUS_SCALE = 2.0
+
+
+def landmarks_to_array(pose_landmarks, left_hand_landmarks=None,
+                       right_hand_landmarks=None, out=None):
+    # pack mediapipe landmark lists into one (LANDMARK_COUNT, 4) float32 array
+    if out is None:
+        out = np.empty((LANDMARK_COUNT, 4), dtype=np.float32)
+    out.fill(np.nan)
+
+    groups = ((pose_landmarks, 0), (left_hand_landmarks, LEFT_HAND_OFFSET),
+              (right_hand_landmarks, RIGHT_HAND_OFFSET))
+    for landmarks, offset in groups:
+        if not landmarks:
+            continue
+        for i, lmrk in enumerate(landmarks.landmark):
+            # hand landmarks carry no visibility score, treat them as visible
+            visibility = lmrk.visibility if offset == 0 else 1.0
+            out[offset + i] = (lmrk.x, lmrk.y, lmrk.z, visibility)
+    return out
+
+
+def radius_for_landmarks(landmarks, frame_width, base_radius=CONTACT_RADIUS):
+    # scale the contact radius with how close the person is to the camera,
+    # using the shoulder span as the distance cue
+    left = landmarks[int(mp_holistic.PoseLandmark.LEFT_SHOULDER), 0]
+    right = landmarks[int(mp_holistic.PoseLandmark.RIGHT_SHOULDER), 0]
+    span = abs(float(left) - float(right))
+    if not np.isfinite(span) or span <= 0:
+        return float(base_radius)
+
+    scale = np.clip(span / REFERENCE_SHOULDER_WIDTH,
+                    MIN_RADIUS_SCALE, MAX_RADIUS_SCALE)
+    return float(base_radius * scale)
+
+
+class ContactQueryEngine:
+    # built once per grass mask, then answers contact queries for any number
+    # of landmarks in one vectorised call
+    #
+    # "box" mode counts grass pixels in a square around each landmark with a
+    # summed-area table. "distance" mode also builds a distance transform and
+    # counts a landmark as touching when grass lies within the radius.
+    def __init__(self, grass_mask, mode="box"):
+        if mode not in ("box", "distance"):
+            raise ValueError(f"Unknown contact mode: {mode}")
+
+        # pyramid masks are queried at their own level, coordinates are
+        # mapped from the full frame on the way in
+        if isinstance(grass_mask, grass_detection.GrassMask):
+            level = grass_mask.level
+            self.scale = grass_mask.scale
+            self.roi_top = grass_mask.roi_top
+            self.frame_height, self.frame_width = grass_mask.shape
+        else:
+            level = grass_mask
+            self.scale = 1.0
+            self.roi_top = 0
+            self.frame_height, self.frame_width = grass_mask.shape[:2]
+
+        self.mode = mode
+        self.height, self.width = level.shape[:2]
+        binary = (level > 0).astype(np.uint8)
+
+        # (h + 1, w + 1) table, integral[y, x] = grass pixels above and left
+        self.integral = cv2.integral(binary, sdepth=cv2.CV_32S)
+
+        self.distance = None
+        if mode == "distance":
+            # distance from every pixel to the nearest grass pixel
+            self.distance = cv2.distanceTransform(
+                1 - binary, cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+
+    def to_pixels(self, landmarks):
+        # normalised (x, y) -> integer coordinates in the mask level plus
+        # flags for landmarks inside the full frame
+        x = landmarks[:, 0] * self.frame_width
+        y = landmarks[:, 1] * self.frame_height
+        valid = (np.isfinite(x) & np.isfinite(y)
+                 & (x >= 0) & (x < self.frame_width)
+                 & (y >= 0) & (y < self.frame_height))
+        x = np.where(valid, x, 0) * self.scale
+        y = (np.where(valid, y, 0) - self.roi_top) * self.scale
+        return np.floor(x).astype(np.int32), np.floor(y).astype(np.int32), valid
+
+    def grass_in_boxes(self, xi, yi, radius):
+        # grass pixel count and area of the [x - r, x + r) square around each point
+        r = np.maximum(np.rint(np.asarray(radius) * self.scale), 1).astype(np.int32)
+        x0 = np.clip(xi - r, 0, self.width)
+        x1 = np.clip(xi + r, 0, self.width)
+        y0 = np.clip(yi - r, 0, self.height)
+        y1 = np.clip(yi + r, 0, self.height)
+
+        table = self.integral
+        count = table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0]
+        area = (x1 - x0) * (y1 - y0)
+        return count, area
+
+    def level_distance(self, xi, yi):
+        # distance to grass in full resolution pixels; rows above the ROI add
+        # their gap to the first classified row
+        xc = np.clip(xi, 0, self.width - 1)
+        yc = np.clip(yi, 0, self.height - 1)
+        gap = np.maximum(-yi, 0)
+        return (self.distance[yc, xc] + gap) / self.scale
+
+    def query(self, landmarks, radius=CONTACT_RADIUS):
+        # returns (contact, coverage) per landmark; radius is a scalar or a
+        # per-landmark array in full resolution pixels
+        xi, yi, valid = self.to_pixels(landmarks)
+        count, area = self.grass_in_boxes(xi, yi, radius)
+        coverage = np.where(valid & (area > 0), count / np.maximum(area, 1), 0.0)
+
+        if self.mode == "distance":
+            contact = valid & (self.level_distance(xi, yi) <= radius)
+        else:
+            contact = valid & (count > 0)
+        return contact, coverage.astype(np.float32)
+
+    def nearest_grass(self, landmarks):
+        # distance in pixels to the closest grass pixel, inf when off-frame
+        if self.distance is None:
+            raise ValueError("nearest_grass needs an engine built with mode='distance'")
+        xi, yi, valid = self.to_pixels(landmarks)
+        return np.where(valid, self.level_distance(xi, yi), np.inf)
+
+
+def detect_contacts(landmarks, grass_mask, radius=None, mode="box"):
+    # all landmarks against one mask; radius defaults to the distance-scaled one
+    width = grass_mask.shape[1]
+    if radius is None:
+        radius = radius_for_landmarks(landmarks, width)
+    return ContactQueryEngine(grass_mask, mode=mode).query(landmarks, radius)
+
+
+def touched_regions(landmarks, grass_mask, radius=None):
+    # index into grass_mask.regions() of the grass region nearest to each
+    # landmark within the contact radius, -1 for none
+    if not isinstance(grass_mask, grass_detection.GrassMask):
+        grass_mask = grass_detection.GrassMask(grass_mask, 1.0, 0, *grass_mask.shape[:2])
+    if radius is None:
+        radius = radius_for_landmarks(landmarks, grass_mask.frame_width)
+
+    x, y = grass_mask.to_level(landmarks[:, 0] * grass_mask.frame_width,
+                               landmarks[:, 1] * grass_mask.frame_height)
+    points = np.stack([x, y], axis=1)
+    return grass_mask.regions().nearest(points, np.asarray(radius) * grass_mask.scale)
+
+
+def part_rows(landmarks, grass_mask, out=None):
+    # one (x, y, visibility, contact) row per body part in PART_NAMES order,
+    # the compact per-frame contact record (see vision/contact_history.py)
+    if out is None:
+        out = np.empty((len(PART_NAMES), PART_FIELDS), dtype=np.float32)
+    out[:, X:Y + 1] = landmarks[PART_LANDMARKS, :2]
+    out[:, VISIBILITY] = landmarks[PART_LANDMARKS, 3]
+    out[:, CONTACT] = 0.0
+    if grass_mask is not None and np.isfinite(landmarks[:POSE_LANDMARK_COUNT, 0]).any():
+        contact, _ = detect_contacts(landmarks, grass_mask)
+        out[:, CONTACT] = contact[PART_LANDMARKS]
+    return out
+
+
+def contact_status_from_array(landmarks, grass_mask):
+    # per body part contact for a packed landmark array
+    if grass_mask is None or not np.isfinite(landmarks[:POSE_LANDMARK_COUNT, 0]).any():
         return {}
 
-    contact_status = {
-        "left_foot": False,
-        "right_foot": False,
-        "left_hand": False,
-        "right_hand": False,
-        "right_knee": False,
-        "left_knee": False
-    }
-
-    # define which mediapipe landmarks cprrespond to body parts
-    body_parts = {
-        'left_foot': mp_holistic.PoseLandmark.LEFT_FOOT_INDEX,
-        'right_foot': mp_holistic.PoseLandmark.RIGHT_FOOT_INDEX,
-        'left_hand': mp_holistic.PoseLandmark.LEFT_INDEX,
-        'right_hand': mp_holistic.PoseLandmark.RIGHT_INDEX,
-        'left_knee': mp_holistic.PoseLandmark.LEFT_KNEE,
-        'right_knee': mp_holistic.PoseLandmark.RIGHT_KNEE
-    }
-
-    # check for the grass-to-body contact
-    for part, landmark_idx in body_parts.items():
-        lmrk = pose_landmarks.landmark[landmark_idx]
-
-        # convert normalised coordinates to pixel coordinates
-        x = int(lmrk.x * frame_width)
-        y = int(lmrk.y * frame_height)
-
-        # check that coordinates are within the frame
-        if 0 <= x < frame_width and 0 <= y < frame_height:
-            # check if pixel is on grass
-            radius = 30
-            x_min = max(0, x - radius)
-            x_max = min(frame_width, x + radius)
-            y_min = max(0, y - radius)
-            y_max = min(frame_height, y + radius)
-
-            # if any pixel in the region is grass, count this as contact
-            region = grass_mask[y_min:y_max, x_min:x_max]
-            if np.any(region > 0):
-                contact_status[part] = True
-                print(f"Contact detected: {part}")
+    contact, _ = detect_contacts(landmarks, grass_mask)
+
+    contact_status = {}
+    for part, landmark_idx in BODY_PARTS.items():
+        contact_status[part] = bool(contact[landmark_idx])
+        if contact_status[part]:
+            print(f"Contact detected: {part}")
 
     return contact_status
+
+
+def check_grass_contact(pose_landmarks, grass_mask, frame_height, frame_width):
+    # grass_mask is a full resolution array or a pyramid GrassMask
+    if not pose_landmarks or grass_mask is None:
+        return {}
+
+    return contact_status_from_array(landmarks_to_array(pose_landmarks), grass_mask)
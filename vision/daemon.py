@@ -0,0 +1,386 @@
+# headless vision daemon and its thin client
+#
+#   python -m vision.daemon serve            # owns the camera and the models
+#   python -m vision.daemon watch            # contact results as JSON lines
+#   TOUCH_GRASS_DAEMON=auto python ui/health_bar.py
+#
+# the daemon runs a VisionEngine in its own process, so inference never holds
+# the UI's GIL. annotated frames go into a shared-memory FrameRing and every
+# result is announced to the connected clients over a local socket (a named
+# pipe on Windows) as a small message: ring sequence number, contact status
+# and a few timings. clients map the announced slot straight out of shared
+# memory. health updates and lockout/recover commands flow the other way.
+#
+# the connection is authenticated with a random key that the daemon writes
+# next to the socket, readable by its user only (0600). only processes of the
+# same user can read it, so nobody else gets to send the daemon pickles.
+import argparse
+import json
+import os
+import secrets
+import stat
+import sys
+import tempfile
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import vision.render as render
+from core.frame_ring import DEFAULT_SLOTS, FrameRing
+from core.metrics import configure_from_env
+from core.pipeline import FramePacket, LatestQueue
+from vision.engine import VisionEngine
+
+# TOUCH_GRASS_DAEMON=auto uses the default address, anything else is an address
+DAEMON_ENV = "TOUCH_GRASS_DAEMON"
+# bytes of the per-daemon connection key
+AUTHKEY_BYTES = 32
+
+# room for a 1080p BGR frame per slot
+SLOT_BYTES = 1920 * 1080 * 3
+
+
+def default_address():
+    if sys.platform == "win32":
+        return r"\\.\pipe\touch-grass-vision"
+    runtime = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(runtime, f"touch-grass-vision-{os.getuid()}.sock")
+
+
+def key_path(address):
+    # the key file sits next to the socket; a named pipe has no directory, so
+    # its key goes into the temp directory under the pipe's name
+    if sys.platform == "win32":
+        return os.path.join(tempfile.gettempdir(), address.rsplit("\\", 1)[-1] + ".key")
+    return address + ".key"
+
+
+def create_authkey(address):
+    # fresh random key in a file only this user can read
+    path = key_path(address)
+    key = secrets.token_bytes(AUTHKEY_BYTES)
+    if os.path.exists(path):
+        os.unlink(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def read_authkey(address):
+    # the running daemon's key; OSError if there is none or it is not private
+    path = key_path(address)
+    with open(path, "rb") as f:
+        info = os.fstat(f.fileno())
+        if sys.platform != "win32" and (info.st_uid != os.getuid()
+                                        or stat.S_IMODE(info.st_mode) & 0o077):
+            raise PermissionError(f"{path} must be owned by this user with mode 0600")
+        return f.read()
+
+
+class VisionDaemon:
+    def __init__(self, address=None, engine=None, slots=DEFAULT_SLOTS,
+                 slot_bytes=SLOT_BYTES):
+        self.address = address or default_address()
+        self.engine = engine if engine is not None else VisionEngine()
+        self.ring = FrameRing.create(slot_bytes, slots)
+        self.published = 0
+        self._authkey = None
+        self._clients = []
+        # connections that asked for a lockout and have not recovered yet
+        self._locked_out = set()
+        # frame shapes that did not fit a slot, warned about once each
+        self._oversized = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._listener = None
+        self._publisher = None
+        self._closed = False
+
+    def serve_forever(self):
+        self._remove_stale_socket()
+        self._authkey = create_authkey(self.address)
+        self._listener = Listener(self.address, authkey=self._authkey)
+        print(f"Vision daemon listening on {self.address}")
+        self._publisher = threading.Thread(target=self._publish, name="publisher", daemon=True)
+        self._publisher.start()
+        try:
+            while not self._stop.is_set():
+                try:
+                    conn = self._listener.accept()
+                except (OSError, EOFError, AuthenticationError) as e:
+                    if self._stop.is_set():
+                        break
+                    # failed handshake, e.g. a client with the wrong key
+                    print(f"Warning: Rejected vision client: {e}")
+                    continue
+                threading.Thread(target=self._serve_client, args=(conn,),
+                                 name="vision-client", daemon=True).start()
+        finally:
+            self.close()
+
+    def close(self):
+        # called by the owner and again when serve_forever's loop ends
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._stop.set()
+        self.engine.close()
+        if self._publisher is not None:
+            # the publisher polls the engine every 0.1 s; the ring must
+            # outlive its last write
+            self._publisher.join(1.0)
+            self._publisher = None
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        if self._authkey is not None:
+            self._authkey = None
+            try:
+                os.unlink(key_path(self.address))
+            except OSError:
+                pass
+        self.ring.close()
+
+    def _remove_stale_socket(self):
+        # a socket file left behind by a daemon that died; refuse to steal a
+        # live daemon's address
+        if sys.platform == "win32" or not os.path.exists(self.address):
+            return
+        try:
+            key = read_authkey(self.address)
+        except OSError as e:
+            # without the key there is no telling a dead daemon from a live
+            # one, and a live one must keep its address
+            raise SystemExit(f"Cannot check for a vision daemon on {self.address} ({e}); "
+                             f"remove the socket if no daemon is running")
+        try:
+            Client(self.address, authkey=key).close()
+        except (ConnectionRefusedError, FileNotFoundError):
+            # nobody listens on the socket any more
+            os.unlink(self.address)
+            return
+        except (OSError, EOFError, AuthenticationError):
+            # somebody answers, just not the way we expect
+            pass
+        raise SystemExit(f"A vision daemon is already running on {self.address}")
+
+    def _serve_client(self, conn):
+        conn.send({"ring": self.ring.name})
+        with self._lock:
+            self._clients.append(conn)
+        try:
+            while True:
+                command, value = conn.recv()
+                if command == "health":
+                    self.engine.on_health(value)
+                elif command == "lock_out":
+                    with self._lock:
+                        self._locked_out.add(conn)
+                    self.engine.lock_out()
+                elif command == "recover":
+                    self._release(conn)
+                elif command == "close":
+                    break
+        except (OSError, EOFError):
+            pass
+        finally:
+            with self._lock:
+                self._clients.remove(conn)
+            conn.close()
+            self._release(conn)
+
+    def _release(self, conn):
+        # the engine recovers once no connected client is locked out any
+        # more, so one client's recover does not stop another one's lockout
+        with self._lock:
+            was_locked_out = conn in self._locked_out
+            self._locked_out.discard(conn)
+            still_locked_out = bool(self._locked_out)
+        if was_locked_out and not still_locked_out:
+            self.engine.recover()
+
+    def _publish(self):
+        while not self._stop.is_set():
+            packet = self.engine.latest(timeout=0.1)
+            if packet is None:
+                continue
+
+            scene, result = packet.result
+            try:
+                seq = self.ring.publish(scene, packet.captured_at)
+            except ValueError as e:
+                # e.g. a camera that delivers more than 1080p; keep serving
+                # and say so once per frame shape
+                if scene.shape not in self._oversized:
+                    self._oversized.add(scene.shape)
+                    print(f"Warning: Dropping {scene.shape[1]}x{scene.shape[0]} frames: {e}")
+                continue
+            self.published += 1
+            # plain tuple, so it unpickles whatever module name we run under
+            message = (seq, packet.captured_at, packet.analysis_time, result.summary(),
+                       self.engine.render_level, self.engine.frame_interval)
+            with self._lock:
+                clients = list(self._clients)
+            for conn in clients:
+                try:
+                    conn.send(message)
+                except (OSError, EOFError):
+                    pass
+
+
+class VisionClient:
+    # stands in for a VisionEngine while the daemon does the work
+    def __init__(self, address=None):
+        self.address = address or default_address()
+        self._conn = Client(self.address, authkey=read_authkey(self.address))
+        hello = self._conn.recv()
+        self.ring = FrameRing.attach(hello["ring"])
+
+        self.render_level = render.level_from_env()
+        self.frame_interval = 0.0
+        self.dropped = 0
+        self.connected = True
+        self._messages = LatestQueue(1)
+        self._frame = None
+        self._send_lock = threading.Lock()
+        threading.Thread(target=self._receive, name="vision-receiver", daemon=True).start()
+
+    def _receive(self):
+        try:
+            while True:
+                self._messages.put(self._conn.recv())
+        except (OSError, EOFError):
+            print("Warning: Lost connection to the vision daemon")
+            self.connected = False
+            self._messages.close()
+
+    def _send(self, command, value=None):
+        try:
+            with self._send_lock:
+                self._conn.send((command, value))
+        except (OSError, EOFError):
+            pass
+
+    def on_health(self, value):
+        self._send("health", value)
+
+    def lock_out(self):
+        self._send("lock_out")
+
+    def recover(self):
+        self._send("recover")
+
+    def latest(self, timeout=None, copy=True):
+        # newest announced frame as a FramePacket whose result is
+        # (frame, ContactResult). with copy=False the frame is a view into
+        # shared memory that is only valid while ring.valid(packet.seq)
+        if timeout is None:
+            message = self._messages.get_nowait()
+        else:
+            message = self._messages.get(timeout)
+        if message is None:
+            return None
+        seq, captured_at, analysis_time, result, render_level, frame_interval = message
+
+        if copy:
+            # private copy the caller may draw on
+            frame = self._frame = self.ring.read(seq, self._frame)
+        else:
+            frame = self.ring.view(seq)
+        if frame is None:
+            # lapped by the writer before we got to it
+            self.dropped += 1
+            return None
+
+        self.render_level = render_level
+        self.frame_interval = frame_interval
+        packet = FramePacket(seq, captured_at, frame, (frame, result))
+        packet.analysis_time = analysis_time
+        return packet
+
+    def stats(self):
+        return {"address": self.address, "latest": self.ring.latest, "dropped": self.dropped}
+
+    def close(self):
+        self._send("close")
+        self._conn.close()
+        self.ring.close()
+
+
+def client_from_env():
+    # VisionClient when TOUCH_GRASS_DAEMON is set and the daemon is reachable
+    address = os.environ.get(DAEMON_ENV)
+    if not address:
+        return None
+    if address == "auto":
+        address = default_address()
+    try:
+        return VisionClient(address)
+    except (OSError, EOFError, AuthenticationError) as e:
+        print(f"Warning: No vision daemon on {address} ({e}), running in-process")
+        return None
+
+
+def vision_from_env():
+    # the daemon's client if there is one, otherwise an in-process VisionEngine
+    client = client_from_env()
+    return client if client is not None else VisionEngine()
+
+
+def watch(address):
+    # streams contact results as JSON lines, for tools that want live results
+    client = VisionClient(address)
+    client.lock_out()
+    try:
+        while client.connected:
+            packet = client.latest(timeout=1.0, copy=False)
+            if packet is None:
+                continue
+            _, result = packet.result
+            print(json.dumps({
+                "seq": packet.seq,
+                "captured_at": packet.captured_at,
+                "analysis_ms": packet.analysis_time * 1000.0,
+                "detected": result.detected,
+                "contact": result.contact_status,
+            }), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.recover()
+        client.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless vision daemon")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="run the daemon")
+    serve.add_argument("--address", default=default_address())
+    serve.add_argument("--slots", type=int, default=DEFAULT_SLOTS,
+                       help="frames kept in the shared-memory ring")
+
+    watch_parser = commands.add_parser("watch", help="print live contact results")
+    watch_parser.add_argument("--address", default=default_address())
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        configure_from_env()
+        daemon = VisionDaemon(args.address, slots=args.slots)
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    else:
+        watch(args.address)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# camera, models and worker threads behind the lockout screen
+#
+# VisionEngine owns the frame source, grass detector, pose tracker, capture ->
+# analysis pipeline, its lifecycle and the quality governor. the lockout screen
+# drives it in-process, and the vision daemon (vision/daemon.py) hosts one for
+# clients in other processes; VisionClient mirrors this interface.
+import vision.analysis as analysis
+import vision.grass_detection as grass_detection
+import vision.grass_lut as grass_lut
+import vision.render as render
+import vision.trackers as trackers
+from core.buffers import FrameArena
+from core.metrics import metrics
+from core.pipeline import FramePipeline, PipelineLifecycle
+from core.scheduler import QualityGovernor, budget_from_env
+from vision.sources import source_from_env
+
+
+class VisionEngine:
+    def __init__(self, source=None, budget=None):
+        # shared webcam (or TOUCH_GRASS_SOURCE replay) - only opened while
+        # the pipeline is warm
+        self.camera = source if source is not None else source_from_env(loop=True)
+
+        # calibrated grass colour table, if one is configured
+        self.grass_lut = grass_lut.load_calibrated()
+
+        # how much visualisation is drawn (none / hud / full); the quality
+        # governor may lower it but never above the configured one
+        self.max_render_level = render.level_from_env()
+        self.render_level = self.max_render_level
+
+        # tile-based grass mask, only changed tiles are reclassified
+        self.grass_detector = grass_detection.IncrementalGrassDetector(
+            lut=self.grass_lut)
+
+        # pose tracker (Holistic by default, see vision/trackers.py), built
+        # during warm-up shortly before lockout
+        self.tracker = None
+        # inference interval asked for through TOUCH_GRASS_INFER_EVERY
+        self.min_infer_every = 1
+
+        # extra seconds between frames asked for by the governor, which the
+        # presentation side should follow as well
+        self.frame_interval = 0.0
+
+        # buffers for the analysis thread: RGB copy, overlay scratch and the
+        # rendered scenes, reused once the caller lets go of them
+        self.arena = FrameArena()
+
+        # capture and analysis run on worker threads, callers only collect
+        self.pipeline = FramePipeline(self.camera, self.analyze_frame)
+
+        # nothing runs until the health bar gets close to zero
+        self.lifecycle = PipelineLifecycle(
+            self.warm_up, self.pipeline.start, self.pipeline.stop, self.cool_down)
+
+        # trades resolution, mask scale, inference rate and drawing for
+        # latency on slow machines, only with TOUCH_GRASS_BUDGET_MS set
+        if budget is None:
+            budget = budget_from_env()
+        self.governor = None
+        if budget is not None:
+            self.governor = QualityGovernor(self.apply_quality, budget)
+
+    def on_health(self, value):
+        self.lifecycle.on_health(value)
+
+    def lock_out(self):
+        # every lockout starts at full quality
+        if self.governor is not None:
+            self.governor.reset()
+
+        # workers start as soon as the warm-up has finished
+        self.lifecycle.lock_out()
+
+    def recover(self):
+        # stop the workers first so nothing reads from a released device
+        self.lifecycle.recover()
+
+    def warm_up(self):
+        # runs on a background thread before lockout: open the device and
+        # push one frame through the model so the first real frame is fast
+        self.camera.acquire()
+        if self.tracker is None:
+            # decimation stays adjustable when the governor is on
+            self.tracker = trackers.tracker_from_env(decimated=self.governor is not None)
+            self.min_infer_every = getattr(self.tracker, "infer_every", 1)
+            if self.governor is not None:
+                self.tracker.infer_every = max(self.min_infer_every,
+                                               self.governor.settings.infer_every)
+        self.tracker.warm_up()
+
+    def cool_down(self):
+        # release the device and the model graph while the bar ticks down
+        self.grass_detector.reset()
+        if self.tracker is not None:
+            self.tracker.close()
+            self.tracker = None
+        self.camera.release()
+
+    def apply_quality(self, settings):
+        # called by the governor from whoever collects results; the workers
+        # pick the new values up on their next frame
+        if hasattr(self.camera, "set_resolution"):
+            self.camera.set_resolution(*settings.resolution)
+        self.grass_detector.scale = settings.mask_scale
+        tracker = self.tracker
+        if isinstance(tracker, trackers.DecimatedTracker):
+            tracker.infer_every = max(self.min_infer_every, settings.infer_every)
+        self.render_level = min(settings.render_level, self.max_render_level,
+                                key=render.RENDER_LEVELS.index)
+        self.pipeline.set_frame_interval(settings.frame_interval)
+        self.frame_interval = settings.frame_interval
+        metrics.gauge("quality", settings.name)
+
+    def analyze_frame(self, frame):
+        # runs on the analysis thread - must not touch any widgets
+
+        # grass mask, landmarks and contact - nothing is drawn here
+        result = analysis.analyze_frame(frame, self.tracker, self.grass_detector,
+                                        arena=self.arena)
+
+        # grass overlay and landmarks, only at the "full" render level
+        with metrics.stage("render"):
+            scene = render.render_scene(frame, result, self.render_level,
+                                        arena=self.arena)
+        return scene, result
+
+    def latest(self, timeout=None):
+        # newest analysed packet, stale ones were already dropped by the
+        # pipeline; packet.result is (scene, FrameAnalysis)
+        packet = self.pipeline.latest(timeout)
+        if packet is not None and self.governor is not None:
+            self.governor.observe(packet.analysis_time, packet.result[1].detected)
+        return packet
+
+    def stats(self):
+        stats = self.pipeline.stats()
+        stats["buffers"] = self.arena.stats()
+        tracker = self.tracker
+        if tracker is not None and hasattr(tracker, "stats"):
+            stats["tracker"] = tracker.stats()
+        if self.governor is not None:
+            stats["quality"] = self.governor.stats()
+        return stats
+
+    def close(self):
+        self.recover()
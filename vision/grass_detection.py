@@ -1,39 +1,296 @@
+import functools
+
 import mediapipe as mp
 import cv2
 import numpy as np
 
+from core.buffers import FrameArena
+from vision.grass_regions import MIN_REGION_AREA, GrassRegions
+from vision.sources import source_from_env
+
 # Initialize Mediapipe drawing utilities and holistic model components
 mp_drawing = mp.solutions.drawing_utils
 mp_holistic = mp.solutions.holistic
 
-# Start capturing video from the webcam
-cap = cv2.VideoCapture(0, cv2.CAP_AVFOUNDATION)
 
+# lower bound of the grass search area, as a fraction of the frame height
+ROI_TOP = 0.4
+
+# HSV range counted as grass
+LOWER_GREEN = np.array([35, 40, 40])
+UPPER_GREEN = np.array([85, 255, 255])
+
+# default downscale for pyramid mode (1/4 of the camera resolution)
+PYRAMID_SCALE = 0.25
 
-def detect_grass(frame_orig):
-    # Note: frame is already flipped in main.py
 
-    # green mask to detect grass
-    # BGR to HSV for better color detection
-    hsv_frame = cv2.cvtColor(frame_orig, cv2.COLOR_BGR2HSV)
+def cleanup_kernel_size(scale):
+    # 5x5 at full resolution, shrinking with the level but never below 3x3
+    return max(3, int(round(5 * scale)) | 1)
 
-    # only consider lower part of the frame for grass detection
-    height, width, _ = hsv_frame.shape
-    hsv_frame[0:int(height*0.4), :] = 0
 
-    lower_green = np.array([35, 40, 40])
-    upper_green = np.array([85, 255, 255])
+@functools.lru_cache(maxsize=None)
+def cleanup_kernel(kernel_size):
+    return np.ones((kernel_size, kernel_size), np.uint8)
 
-    # binary mask where grass pixels are white (255)
-    grass_mask = cv2.inRange(hsv_frame, lower_green, upper_green)
+
+def _scratch(arena, name, shape, dtype=np.uint8):
+    # arena buffer, or None to let OpenCV allocate
+    return arena.scratch(name, shape, dtype) if arena is not None else None
+
+
+def classify_grass(frame, kernel_size=5, lut=None, arena=None, out=None):
+    # binary-ish grass mask (0 or blurred 255) for a BGR image. with a
+    # FrameArena every intermediate is reused and the mask is written to
+    # `out` when given
+    shape = frame.shape[:2]
+    if lut is not None:
+        # calibrated colour table (see vision/grass_lut.py)
+        grass_mask = lut.classify(frame, arena, out=_scratch(arena, "grass_raw", shape))
+    else:
+        # BGR to HSV for better color detection
+        hsv_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV,
+                                 dst=_scratch(arena, "hsv", frame.shape))
+
+        # binary mask where grass pixels are white (255)
+        grass_mask = cv2.inRange(hsv_frame, LOWER_GREEN, UPPER_GREEN,
+                                 dst=_scratch(arena, "grass_raw", shape))
 
     # remove noise
-    grass_mask = cv2.GaussianBlur(grass_mask, (5, 5), 0)
+    grass_mask = cv2.GaussianBlur(grass_mask, (kernel_size, kernel_size), 0,
+                                  dst=_scratch(arena, "grass_blur", shape))
 
     # clean up the mask with morphological operations
-    kernel = np.ones((5, 5), np.uint8)
-    grass_mask = cv2.morphologyEx(grass_mask, cv2.MORPH_CLOSE, kernel)
-    grass_mask = cv2.morphologyEx(grass_mask, cv2.MORPH_OPEN, kernel)
+    kernel = cleanup_kernel(kernel_size)
+    grass_mask = cv2.morphologyEx(grass_mask, cv2.MORPH_CLOSE, kernel,
+                                  dst=_scratch(arena, "grass_closed", shape))
+    return cv2.morphologyEx(grass_mask, cv2.MORPH_OPEN, kernel, dst=out)
+
+
+class GrassMask:
+    # grass mask stored at a pyramid level, covering only the rows below the
+    # ROI. contact queries read `level` directly; the full resolution mask is
+    # only built when something like the overlay asks for it.
+    def __init__(self, level, scale, roi_top, frame_height, frame_width):
+        self.level = level
+        self.scale = scale
+        self.roi_top = roi_top
+        self.frame_height = frame_height
+        self.frame_width = frame_width
+        self._full = None
+        self._regions = None
+
+    @property
+    def shape(self):
+        return (self.frame_height, self.frame_width)
+
+    def to_level(self, x, y):
+        # full resolution pixel coordinates -> coordinates in `level`
+        return x * self.scale, (y - self.roi_top) * self.scale
+
+    def to_frame(self, x, y):
+        # coordinates in `level` -> full resolution pixel coordinates
+        return x / self.scale, y / self.scale + self.roi_top
+
+    def regions(self, min_area=MIN_REGION_AREA):
+        # connected regions of `level`, in level coordinates, built on first
+        # use; min_area is in full resolution pixels
+        if self._regions is None or self._regions[0] != min_area:
+            self._regions = (min_area, GrassRegions(self.level, min_area * self.scale ** 2))
+        return self._regions[1]
+
+    def full(self, out=None):
+        # with `out` the mask is written there instead of a cached new array
+        if out is None and self._full is not None:
+            return self._full
+
+        full = out if out is not None else np.empty(self.shape, np.uint8)
+        full[:self.roi_top] = 0
+        roi_height = self.frame_height - self.roi_top
+        if self.scale == 1.0:
+            full[self.roi_top:] = self.level
+        else:
+            cv2.resize(self.level, (self.frame_width, roi_height),
+                       dst=full[self.roi_top:], interpolation=cv2.INTER_NEAREST)
+        if out is None:
+            self._full = full
+        return full
+
+
+def detect_grass_mask(frame, scale=PYRAMID_SCALE, roi_top=ROI_TOP, lut=None):
+    # pyramid mode: classify only the lower ROI at a reduced resolution,
+    # with the HSV thresholds or a calibrated GrassLUT
+    height, width = frame.shape[:2]
+    top = int(height * roi_top)
+    roi = frame[top:]
+
+    if scale != 1.0:
+        # bilinear decimation is several times cheaper than INTER_AREA and the
+        # blur in classify_grass absorbs the extra aliasing
+        roi = cv2.resize(roi, None, fx=scale, fy=scale,
+                         interpolation=cv2.INTER_LINEAR)
+        # the resize may round, so remember the exact level scale
+        scale = roi.shape[1] / width
+
+    level = classify_grass(roi, cleanup_kernel_size(scale), lut)
+    return GrassMask(level, scale, top, height, width)
+
+
+def _scaled_size(image, scale):
+    # (width, height) cv2.resize picks for fx=fy=scale, to size its dst
+    height, width = image.shape[:2]
+    return (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+
+
+# incremental mode: tile size in mask-level pixels, grey difference that
+# counts a pixel as changed, fraction of changed pixels that marks a tile as
+# changed, and frames between full refreshes
+TILE_SIZE = 32
+PIXEL_CHANGE_THRESHOLD = 20
+CHANGE_THRESHOLD = 0.02
+# the change check runs on a further downsampled grey copy of the level
+DIFF_DOWNSCALE = 4
+FULL_REFRESH_INTERVAL = 60
+# above this fraction of changed tiles a full pass is cheaper than tiling
+MAX_CHANGED_FRACTION = 0.5
+
+
+class IncrementalGrassDetector:
+    # pyramid grass mask that only reclassifies tiles which changed since the
+    # previous frame and reuses the rest of the previous mask
+    def __init__(self, scale=PYRAMID_SCALE, roi_top=ROI_TOP, lut=None,
+                 tile_size=TILE_SIZE, change_threshold=CHANGE_THRESHOLD,
+                 refresh_interval=FULL_REFRESH_INTERVAL):
+        self.scale = scale
+        self.roi_top = roi_top
+        self.lut = lut
+        self.tile_size = tile_size
+        self.change_threshold = change_threshold
+        self.refresh_interval = refresh_interval
+        # scratch space and the masks handed out, reused frame to frame
+        self.arena = FrameArena()
+        self.reset()
+
+    def reset(self):
+        self._level = None
+        self._grey = None
+        self._spare_grey = None
+        self._since_refresh = 0
+
+        self.frames = 0
+        self.full_refreshes = 0
+        self.tiles_total = 0
+        self.tiles_reclassified = 0
+
+    def detect(self, frame):
+        arena = self.arena
+        height, width = frame.shape[:2]
+        top = int(height * self.roi_top)
+        roi = frame[top:]
+        if self.scale != 1.0:
+            size = _scaled_size(roi, self.scale)
+            roi = cv2.resize(roi, None, dst=arena.scratch("roi", size[::-1] + (3,)),
+                             fx=self.scale, fy=self.scale, interpolation=cv2.INTER_LINEAR)
+        scale = roi.shape[1] / width
+        kernel_size = cleanup_kernel_size(scale)
+        size = _scaled_size(roi, 1 / DIFF_DOWNSCALE)
+        thumb = cv2.resize(roi, None, dst=arena.scratch("thumb", size[::-1] + (3,)),
+                           fx=1 / DIFF_DOWNSCALE, fy=1 / DIFF_DOWNSCALE,
+                           interpolation=cv2.INTER_NEAREST)
+        # the previous frame's grey copy stays around for the comparison, so
+        # two buffers take turns
+        spare = self._spare_grey
+        if spare is None or spare.shape != size[::-1]:
+            spare = None
+        grey = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY, dst=spare)
+
+        self.frames += 1
+        self._since_refresh += 1
+        rows = -(-roi.shape[0] // self.tile_size)
+        cols = -(-roi.shape[1] // self.tile_size)
+        self.tiles_total += rows * cols
+
+        changed = None
+        if (self._level is not None and self._level.shape == roi.shape[:2]
+                and self._grey.shape == grey.shape
+                and self._since_refresh < self.refresh_interval):
+            changed = self._changed_tiles(grey, rows, cols)
+
+        if changed is None or changed.mean() > MAX_CHANGED_FRACTION:
+            # first frame, resolution change, periodic refresh or a big change
+            level = self._level
+            if level is not None and level.shape != roi.shape[:2]:
+                level = None
+            self._level = classify_grass(roi, kernel_size, self.lut, arena, out=level)
+            self._since_refresh = 0
+            self.full_refreshes += 1
+            self.tiles_reclassified += rows * cols
+        else:
+            self._update_tiles(roi, changed, kernel_size)
+
+        self._spare_grey, self._grey = self._grey, grey
+        return GrassMask(arena.copy(self._level), scale, top, height, width)
+
+    def _changed_tiles(self, grey, rows, cols):
+        # fraction of changed pixels per tile. the grey copies are
+        # DIFF_DOWNSCALE times smaller than the level, so a tile is a block of
+        # tile_size / DIFF_DOWNSCALE pixels; the thresholded difference is
+        # padded to whole blocks and summed per block, so every flag belongs
+        # to the tile it describes even when the level is not a multiple of
+        # the tile size
+        block = max(1, self.tile_size // DIFF_DOWNSCALE)
+        height, width = min(grey.shape[0], rows * block), min(grey.shape[1], cols * block)
+        diff = cv2.absdiff(grey, self._grey, dst=self.arena.scratch_like("diff", grey))
+        moved = self.arena.scratch("moved", (rows * block, cols * block))
+        moved[height:] = 0
+        moved[:height, width:] = 0
+        cv2.threshold(diff[:height, :width], PIXEL_CHANGE_THRESHOLD, 1, cv2.THRESH_BINARY,
+                      dst=moved[:height, :width])
+        counts = moved.reshape(rows, block, cols, block).sum(axis=(1, 3), dtype=np.int32)
+
+        # pixels per block, fewer along the bottom and right edges
+        block_rows = np.minimum(block, height - np.arange(rows) * block).clip(min=0)
+        block_cols = np.minimum(block, width - np.arange(cols) * block).clip(min=0)
+        area = np.outer(block_rows, block_cols)
+        changed = counts > self.change_threshold * np.maximum(area, 1)
+
+        # the blur and morphology in classify_grass carry a change up to the
+        # halo (less than a tile) into the neighbouring tiles, so those are
+        # reclassified as well
+        return cv2.dilate(changed.view(np.uint8), cleanup_kernel(3)).view(bool)
+
+    def _update_tiles(self, roi, changed, kernel_size):
+        # reclassify each changed tile with a halo, so the blur and morphology
+        # see the same neighbourhood as in a full pass, then keep its centre
+        halo = 2 * kernel_size
+        height, width = self._level.shape
+        size = self.tile_size
+        for row, col in zip(*np.nonzero(changed)):
+            y0, x0 = row * size, col * size
+            y1, x1 = min(y0 + size, height), min(x0 + size, width)
+            py0, px0 = max(0, y0 - halo), max(0, x0 - halo)
+            py1, px1 = min(height, y1 + halo), min(width, x1 + halo)
+
+            patch = classify_grass(roi[py0:py1, px0:px1], kernel_size, self.lut)
+            self._level[y0:y1, x0:x1] = patch[y0 - py0:y1 - py0, x0 - px0:x1 - px0]
+            self.tiles_reclassified += 1
+
+    def stats(self):
+        reused = self.tiles_total - self.tiles_reclassified
+        return {
+            "frames": self.frames,
+            "full_refreshes": self.full_refreshes,
+            "tiles_total": self.tiles_total,
+            "tiles_reclassified": self.tiles_reclassified,
+            "hit_rate": reused / self.tiles_total if self.tiles_total else 0.0,
+        }
+
+
+def detect_grass(frame_orig):
+    # Note: frame is already flipped in main.py
+
+    # green mask to detect grass, only in the lower part of the frame
+    grass_mask = detect_grass_mask(frame_orig, scale=1.0).full()
 
     # extract just the grass regions (preserving original colors)
     grass_detected = cv2.bitwise_and(
@@ -46,21 +303,16 @@ def detect_grass(frame_orig):
     # blend original frame with overlay (30% overlay, 70% original)
     result = cv2.addWeighted(frame_orig, 0.55, overlay, 0.3, 0)
 
-    # draw contours around detected grass regions (plane detection style)
-    contours, _ = cv2.findContours(
-        grass_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    # cv2.drawContours(result, contours, -1, (0, 255, 255), 2)  # Yellow contours
-
-    # remove small areas to reduce noise
-    min_contour_area = 500  # Minimum area threshold
-    for contour in contours:
-        if cv2.contourArea(contour) < min_contour_area:
-            cv2.drawContours(result, [contour], -1, (0, 255, 255), -1)
+    # mark small areas as noise, all regions labelled in one pass
+    regions = GrassRegions(grass_mask, min_area=MIN_REGION_AREA)
+    if regions.dropped_area:
+        result[regions.dropped_mask()] = (0, 255, 255)
     return result, grass_mask
 
 
 if __name__ == "__main__":
     # Process the video feed frame by frame
+    cap = source_from_env().acquire()
     with mp_holistic.Holistic(min_detection_confidence=0.7, min_tracking_confidence=0.5) as holistic:
         while cap.isOpened():
             ret, frame_orig = cap.read()
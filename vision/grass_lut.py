@@ -0,0 +1,215 @@
+# quantized BGR -> grass lookup table classifier
+#
+# every colour is quantized to 6 bits per channel, giving 64^3 table entries.
+# on disk the table is bit-packed (32 KB) behind a small header and memory
+# mapped on load. classifying a frame is one gather into the table, with no
+# HSV conversion. tables are built offline from labelled frames:
+#
+#   python -m vision.grass_lut calibrate --images samples/ --masks labels/ --out lawn.glut
+#
+# a mask is any image with the same file stem as its frame, white where grass is.
+import argparse
+import os
+import sys
+
+import cv2
+import numpy as np
+
+LUT_BITS = 6
+LUT_LEVELS = 1 << LUT_BITS
+LUT_SIZE = LUT_LEVELS ** 3
+# one bit per entry on disk
+LUT_BYTES = LUT_SIZE // 8
+
+LUT_MAGIC = b"GLUT"
+LUT_VERSION = 1
+HEADER_SIZE = 8
+
+# set this to a calibrated table to use it instead of the HSV thresholds
+LUT_PATH_ENV = "TOUCH_GRASS_LUT"
+
+# a calibrated bin needs this many labelled samples to override the prior
+MIN_SAMPLES = 4
+GRASS_RATIO = 0.5
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+# per-channel 8 bit -> 6 bit quantization, applied with cv2.LUT
+_QUANTIZE = (np.arange(256) >> (8 - LUT_BITS)).astype(np.uint8)
+# weights turning quantized (b, g, r) into a flat table index
+_INDEX_WEIGHTS = np.array(
+    [[LUT_LEVELS * LUT_LEVELS, LUT_LEVELS, 1]], dtype=np.float32)
+
+
+def color_indices(frame, arena=None):
+    # flat table index for every pixel of a BGR image, as int32; with a
+    # FrameArena (core/buffers.py) the intermediates are reused
+    if arena is None:
+        quantized = cv2.LUT(frame, _QUANTIZE)
+        # the weighted sum stays below 2^18, exact in float32
+        index = cv2.transform(quantized.astype(np.float32), _INDEX_WEIGHTS)
+        return index.astype(np.int32)
+
+    height, width = frame.shape[:2]
+    quantized = cv2.LUT(frame, _QUANTIZE, dst=arena.scratch_like("lut_quantized", frame))
+    as_float = arena.scratch("lut_float", frame.shape, np.float32)
+    np.copyto(as_float, quantized)
+    index = cv2.transform(as_float, _INDEX_WEIGHTS,
+                          dst=arena.scratch("lut_index", (height, width), np.float32))
+    indices = arena.scratch("lut_indices", (height, width), np.int32)
+    np.copyto(indices, index, casting="unsafe")
+    return indices
+
+
+def bin_centers():
+    # one BGR pixel per table entry, at the centre of its quantization bin
+    levels = (np.arange(LUT_LEVELS) << (8 - LUT_BITS)) + (1 << (7 - LUT_BITS))
+    b, g, r = np.meshgrid(levels, levels, levels, indexing="ij")
+    centers = np.stack([b, g, r], axis=-1).astype(np.uint8)
+    return centers.reshape(LUT_SIZE, 1, 3)
+
+
+class GrassLUT:
+    def __init__(self, table):
+        # dense 0/255 table; 256 KB, small enough to stay in cache
+        self.table = np.ascontiguousarray(table, dtype=np.uint8).reshape(LUT_SIZE)
+
+    @classmethod
+    def from_hsv(cls, lower, upper):
+        # table equivalent to an HSV inRange threshold
+        hsv = cv2.cvtColor(bin_centers(), cv2.COLOR_BGR2HSV)
+        return cls(cv2.inRange(hsv, lower, upper))
+
+    @classmethod
+    def default(cls):
+        import vision.grass_detection as grass_detection
+        return cls.from_hsv(grass_detection.LOWER_GREEN, grass_detection.UPPER_GREEN)
+
+    @classmethod
+    def load(cls, path):
+        packed = np.memmap(path, dtype=np.uint8, mode="r")
+        if len(packed) < HEADER_SIZE or bytes(packed[:4]) != LUT_MAGIC \
+                or packed[4] != LUT_VERSION or packed[5] != LUT_BITS:
+            raise ValueError(f"{path} is not a grass lookup table")
+        # unpackbits would zero-fill a truncated body, i.e. silently turn
+        # the missing colours into "not grass"
+        body = len(packed) - HEADER_SIZE
+        if body != LUT_BYTES:
+            raise ValueError(f"{path} has {body} table bytes, expected {LUT_BYTES}")
+
+        bits = np.unpackbits(packed[HEADER_SIZE:], count=LUT_SIZE, bitorder="little")
+        return cls(bits * np.uint8(255))
+
+    def save(self, path):
+        header = np.zeros(HEADER_SIZE, dtype=np.uint8)
+        header[:4] = np.frombuffer(LUT_MAGIC, dtype=np.uint8)
+        header[4] = LUT_VERSION
+        header[5] = LUT_BITS
+        packed = np.packbits(self.table > 0, bitorder="little")
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header.tobytes())
+            f.write(packed.tobytes())
+        os.replace(tmp_path, path)
+
+    def classify(self, frame, arena=None, out=None):
+        # 0/255 mask, same shape as the frame without the channel axis
+        return np.take(self.table, color_indices(frame, arena), out=out)
+
+    def coverage(self):
+        # fraction of the colour space classified as grass
+        return float(np.count_nonzero(self.table)) / LUT_SIZE
+
+
+def load_calibrated():
+    # table named by $TOUCH_GRASS_LUT, or None to keep the HSV thresholds
+    path = os.environ.get(LUT_PATH_ENV)
+    if not path:
+        return None
+    try:
+        return GrassLUT.load(path)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not load grass table {path}: {e}")
+        return None
+
+
+def calibrate(samples, prior=None, min_samples=MIN_SAMPLES, grass_ratio=GRASS_RATIO):
+    # build a table from (frame, mask) pairs; bins with too few samples keep
+    # the prior's answer (the HSV thresholds by default)
+    grass_counts = np.zeros(LUT_SIZE, dtype=np.int64)
+    total_counts = np.zeros(LUT_SIZE, dtype=np.int64)
+
+    for frame, mask in samples:
+        index = color_indices(frame).ravel()
+        labels = mask.ravel() > 0
+        total_counts += np.bincount(index, minlength=LUT_SIZE)
+        grass_counts += np.bincount(index[labels], minlength=LUT_SIZE)
+
+    if prior is None:
+        prior = GrassLUT.default()
+
+    table = prior.table.copy()
+    seen = total_counts >= min_samples
+    grass = grass_counts >= grass_ratio * total_counts
+    table[seen] = np.where(grass[seen], 255, 0)
+    return GrassLUT(table), int(np.count_nonzero(seen))
+
+
+def labelled_samples(image_dir, mask_dir):
+    # yields (frame, mask) pairs matched by file stem
+    masks = {}
+    for name in os.listdir(mask_dir):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() in IMAGE_EXTENSIONS:
+            masks[stem] = os.path.join(mask_dir, name)
+
+    for name in sorted(os.listdir(image_dir)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() not in IMAGE_EXTENSIONS or stem not in masks:
+            continue
+
+        frame = cv2.imread(os.path.join(image_dir, name))
+        mask = cv2.imread(masks[stem], cv2.IMREAD_GRAYSCALE)
+        if frame is None or mask is None:
+            print(f"Warning: Could not load {name}")
+            continue
+        if mask.shape != frame.shape[:2]:
+            mask = cv2.resize(mask, (frame.shape[1], frame.shape[0]),
+                              interpolation=cv2.INTER_NEAREST)
+        yield frame, mask
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build grass lookup tables")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cal = commands.add_parser("calibrate", help="build a table from labelled frames")
+    cal.add_argument("--images", required=True, help="directory of sample frames")
+    cal.add_argument("--masks", required=True, help="directory of grass masks")
+    cal.add_argument("--out", required=True, help="table file to write")
+    cal.add_argument("--prior", help="table used for colours with no samples")
+    cal.add_argument("--min-samples", type=int, default=MIN_SAMPLES)
+    cal.add_argument("--ratio", type=float, default=GRASS_RATIO)
+
+    default = commands.add_parser("default", help="write the HSV-equivalent table")
+    default.add_argument("--out", required=True, help="table file to write")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "default":
+        lut = GrassLUT.default()
+        lut.save(args.out)
+    else:
+        prior = GrassLUT.load(args.prior) if args.prior else None
+        samples = labelled_samples(args.images, args.masks)
+        lut, calibrated = calibrate(samples, prior, args.min_samples, args.ratio)
+        lut.save(args.out)
+        print(f"Calibrated {calibrated} of {LUT_SIZE} colour bins")
+
+    print(f"Wrote {args.out} ({lut.coverage() * 100:.1f}% of colours are grass)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
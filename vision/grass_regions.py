@@ -0,0 +1,129 @@
+# connected grass regions of a mask, indexed for spatial queries
+#
+# one connectedComponentsWithStats pass labels every region and yields its
+# area, bounding box and centroid; small regions are filtered with array ops.
+# the kept regions' bounding boxes are bucketed into a coarse grid, so "which
+# grass region is near this point" only looks at a few cells instead of
+# rescanning the mask.
+import cv2
+import numpy as np
+
+# regions below this many pixels are treated as noise (full resolution)
+MIN_REGION_AREA = 500
+# grid cell side in mask pixels
+GRID_CELL = 32
+
+
+class GrassRegions:
+    def __init__(self, mask, min_area=0, cell_size=GRID_CELL):
+        self.shape = mask.shape[:2]
+        self.cell_size = cell_size
+        binary = (mask > 0).view(np.uint8)
+        count, self.labels, stats, centroids = cv2.connectedComponentsWithStats(
+            binary, connectivity=8, ltype=cv2.CV_32S)
+
+        # label 0 is the background
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        keep = areas >= min_area
+        # label -> region index, -1 for the background and dropped regions
+        self.label_index = np.full(count, -1, np.int32)
+        self.label_index[1:][keep] = np.arange(np.count_nonzero(keep), dtype=np.int32)
+
+        self.areas = areas[keep]
+        x, y, w, h = stats[1:][keep, :4].T
+        # x0, y0, x1, y1 with exclusive x1 / y1
+        self.boxes = np.stack([x, y, x + w, y + h], axis=1)
+        self.centroids = centroids[1:][keep]
+        self.dropped_area = int(areas[~keep].sum())
+        self._build_grid()
+
+    def __len__(self):
+        return len(self.areas)
+
+    def _build_grid(self):
+        # CSR layout: regions overlapping cell c are
+        # _cell_regions[_cell_start[c]:_cell_start[c + 1]]
+        cell = self.cell_size
+        height, width = self.shape
+        self.rows = -(-height // cell)
+        self.cols = -(-width // cell)
+
+        cx0 = self.boxes[:, 0] // cell
+        cy0 = self.boxes[:, 1] // cell
+        ncx = (self.boxes[:, 2] - 1) // cell - cx0 + 1
+        ncy = (self.boxes[:, 3] - 1) // cell - cy0 + 1
+        per_region = ncx * ncy
+
+        # one entry per (region, cell) pair its bounding box covers
+        region = np.repeat(np.arange(len(self), dtype=np.int32), per_region)
+        first = np.repeat(np.cumsum(per_region) - per_region, per_region)
+        offset = np.arange(len(region)) - first
+        row = np.repeat(cy0, per_region) + offset // np.repeat(ncx, per_region)
+        col = np.repeat(cx0, per_region) + offset % np.repeat(ncx, per_region)
+        cells = row * self.cols + col
+
+        order = np.argsort(cells, kind="stable")
+        self._cell_regions = region[order]
+        self._cell_start = np.searchsorted(cells[order], np.arange(self.rows * self.cols + 1))
+
+    def candidates(self, x0, y0, x1, y1):
+        # indices of regions whose grid cells overlap the rectangle
+        cell = self.cell_size
+        c0, c1 = max(int(x0) // cell, 0), min(int(x1) // cell, self.cols - 1)
+        r0, r1 = max(int(y0) // cell, 0), min(int(y1) // cell, self.rows - 1)
+        if c1 < c0 or r1 < r0:
+            return np.empty(0, np.int32)
+        found = [self._cell_regions[self._cell_start[r * self.cols + c0]:
+                                    self._cell_start[r * self.cols + c1 + 1]]
+                 for r in range(r0, r1 + 1)]
+        return np.unique(np.concatenate(found))
+
+    def box_distance(self, x, y, regions):
+        # distance from (x, y) to each region's bounding box, 0 inside it
+        boxes = self.boxes[regions]
+        dx = np.maximum(np.maximum(boxes[:, 0] - x, x - (boxes[:, 2] - 1)), 0)
+        dy = np.maximum(np.maximum(boxes[:, 1] - y, y - (boxes[:, 3] - 1)), 0)
+        return np.hypot(dx, dy)
+
+    def near(self, x, y, radius):
+        # regions whose bounding box lies within `radius` of (x, y), closest first
+        regions = self.candidates(x - radius, y - radius, x + radius, y + radius)
+        if len(regions) == 0:
+            return regions
+        distance = self.box_distance(x, y, regions)
+        close = distance <= radius
+        return regions[close][np.argsort(distance[close], kind="stable")]
+
+    def nearest(self, points, radius):
+        # closest region per (x, y) point within `radius`, -1 for none or for
+        # non-finite points; radius is a scalar or one per point
+        points = np.asarray(points, dtype=np.float64)
+        radius = np.broadcast_to(np.asarray(radius, dtype=np.float64), (len(points),))
+        nearest = np.full(len(points), -1, np.int32)
+        for i, ((x, y), r) in enumerate(zip(points, radius)):
+            if np.isfinite(x) and np.isfinite(y):
+                regions = self.near(x, y, r)
+                if len(regions):
+                    nearest[i] = regions[0]
+        return nearest
+
+    def region_at(self, x, y):
+        # region under a pixel, -1 for none
+        x, y = int(x), int(y)
+        if not (0 <= x < self.shape[1] and 0 <= y < self.shape[0]):
+            return -1
+        return int(self.label_index[self.labels[y, x]])
+
+    def mask(self, regions=None):
+        # 0/255 mask of the kept regions, or only of the given ones
+        if regions is None:
+            selected = self.label_index >= 0
+        else:
+            selected = np.isin(self.label_index, regions)
+        return selected.view(np.uint8)[self.labels] * np.uint8(255)
+
+    def dropped_mask(self):
+        # boolean mask of the regions filtered out as too small
+        dropped = self.label_index < 0
+        dropped[0] = False
+        return dropped[self.labels]
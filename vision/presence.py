@@ -0,0 +1,78 @@
+# cheap presence check that lets pose inference sleep on an empty scene
+#
+# most lockout time is spent looking at an empty frame, e.g. while the user is
+# out looking for grass. MotionDetector compares a tiny blurred greyscale copy
+# of every frame with the previous one, which costs a fraction of a
+# millisecond; trackers.PresenceGate uses it to skip the model while nothing
+# moves and reuse the last inference, empty or somebody standing still.
+import os
+
+import cv2
+import numpy as np
+
+# TOUCH_GRASS_PRESENCE=0 runs inference on every frame
+PRESENCE_ENV = "TOUCH_GRASS_PRESENCE"
+
+# width of the motion sample; the height follows the frame's aspect ratio
+SAMPLE_WIDTH = 64
+# grey level change that counts a sample pixel as moved
+MOTION_THRESHOLD = 12
+# share of moved sample pixels that counts as motion
+MOTION_FRACTION = 0.01
+# 30 frames = about a second at most between inferences on a still scene, in
+# case somebody stepped in or moved very slowly
+MAX_SKIPPED = 30
+
+
+def presence_gate_from_env():
+    return os.environ.get(PRESENCE_ENV, "1") != "0"
+
+
+class MotionDetector:
+    # frame differencing on a downscaled, blurred greyscale copy
+    def __init__(self, width=SAMPLE_WIDTH, threshold=MOTION_THRESHOLD,
+                 fraction=MOTION_FRACTION):
+        self.width = width
+        self.threshold = threshold
+        self.fraction = fraction
+        self.motion = 0.0
+        self._small = None
+        self._has_previous = False
+
+    def reset(self):
+        self.motion = 0.0
+        self._has_previous = False
+
+    def _sample_size(self, image):
+        # (width, height) of the sample; buffers follow the frame's shape
+        height, width = image.shape[:2]
+        size = (self.width, max(1, round(height * self.width / width)))
+        if self._small is None or self._small.shape != (size[1], size[0]) + image.shape[2:]:
+            self._small = np.empty((size[1], size[0]) + image.shape[2:], np.uint8)
+            self._grey = np.empty((size[1], size[0]), np.uint8)
+            self._previous = np.empty_like(self._grey)
+            self._diff = np.empty_like(self._grey)
+            self._has_previous = False
+        return size
+
+    def update(self, image):
+        # True if the RGB frame differs from the previous one
+        size = self._sample_size(image)
+        # bilinear only reads a few source pixels per sample, area averaging
+        # would cost milliseconds at 1080p; the blur below takes out the noise
+        cv2.resize(image, size, dst=self._small, interpolation=cv2.INTER_LINEAR)
+        cv2.cvtColor(self._small, cv2.COLOR_RGB2GRAY, dst=self._grey)
+        cv2.GaussianBlur(self._grey, (3, 3), 0, dst=self._grey)
+
+        if not self._has_previous:
+            # nothing to compare with yet
+            self._previous, self._grey = self._grey, self._previous
+            self._has_previous = True
+            self.motion = 1.0
+            return True
+
+        cv2.absdiff(self._grey, self._previous, dst=self._diff)
+        cv2.threshold(self._diff, self.threshold, 1, cv2.THRESH_BINARY, dst=self._diff)
+        self.motion = cv2.countNonZero(self._diff) / self._diff.size
+        self._previous, self._grey = self._grey, self._previous
+        return self.motion >= self.fraction
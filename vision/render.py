@@ -0,0 +1,244 @@
+# opt-in visualisation of FrameAnalysis results
+#
+# render levels:
+#   none - the camera frame is passed through untouched
+#   hud  - contact status text only
+#   full - grass overlay, body landmarks and contact highlights plus the HUD
+import os
+
+import cv2
+import numpy as np
+
+import vision.body_tracker as body_tracker
+import vision.contact_logic as contact_logic
+
+RENDER_NONE = "none"
+RENDER_HUD = "hud"
+RENDER_FULL = "full"
+RENDER_LEVELS = (RENDER_NONE, RENDER_HUD, RENDER_FULL)
+
+# TOUCH_GRASS_RENDER=none|hud|full
+RENDER_ENV = "TOUCH_GRASS_RENDER"
+
+# frame height the HudLayer's sizes are given for
+HUD_REFERENCE_HEIGHT = 720
+
+
+def level_from_env(default=RENDER_FULL):
+    level = os.environ.get(RENDER_ENV, default)
+    if level not in RENDER_LEVELS:
+        print(f"Warning: Unknown render level {level}, using {default}")
+        return default
+    return level
+
+
+def draw_grass_overlay(image, grass_mask, weight, arena=None):
+    # paints grass green at the given opacity; returns a new image, or blends
+    # in place when given a FrameArena (core/buffers.py) for the scratch space
+    if arena is None:
+        overlay = image.copy()
+        overlay[grass_mask > 0] = [0, 255, 0]
+        return cv2.addWeighted(image, 1.0 - weight, overlay, weight, 0)
+
+    green = arena.filled("green", image.shape, (0, 255, 0))
+    blended = cv2.addWeighted(image, 1.0 - weight, green, weight, 0,
+                              dst=arena.scratch_like("overlay", image))
+    cv2.copyTo(blended, grass_mask, image)
+    return image
+
+
+def draw_contact_regions(image, analysis, color=(0, 255, 255), thickness=2):
+    # outlines the grass regions that body parts in contact are touching
+    touching = contact_logic.PART_LANDMARKS[analysis.contact] if analysis.detected else ()
+    if not len(touching):
+        return image
+
+    grass = analysis.grass
+    landmarks = analysis.landmarks
+    radius = contact_logic.radius_for_landmarks(landmarks, grass.frame_width)
+    regions = contact_logic.touched_regions(landmarks[touching], grass, radius)
+    boxes = grass.regions().boxes
+    for region in np.unique(regions[regions >= 0]):
+        x0, y0, x1, y1 = boxes[region]
+        left, top = grass.to_frame(x0, y0)
+        right, bottom = grass.to_frame(x1, y1)
+        cv2.rectangle(image, (int(left), int(top)), (int(right) - 1, int(bottom) - 1),
+                      color, thickness)
+    return image
+
+
+def render_scene(frame, analysis, level, overlay_weight=0.15, arena=None):
+    # everything below the HUD: overlay and landmarks at the full level only
+    if level != RENDER_FULL:
+        return frame
+
+    image = arena.copy(frame) if arena is not None else frame.copy()
+    image = body_tracker.draw_body(image, analysis.tracking, analysis.contact)
+    grass_mask = analysis.grass.full(
+        arena.scratch("grass_full", frame.shape[:2]) if arena is not None else None)
+    image = draw_grass_overlay(image, grass_mask, overlay_weight, arena)
+    return draw_contact_regions(image, analysis)
+
+
+def draw_hud(image, contact, level, origin=(10, 30), line_height=25,
+             font_scale=0.9, percent_scale=1.0, thickness=2, percent_thickness=2,
+             labels=("Contact", "No Contact"), no_contact_color=(100, 100, 100),
+             percent_format="Contact Percentage: {:.1f}%"):
+    # contact status per body part plus the contact percentage, in place;
+    # contact is a bool per part in contact_logic.PART_NAMES order. draws
+    # the text every call, see HudLayer for the cached version
+    if level == RENDER_NONE:
+        return image
+
+    x_offset, y_offset = origin
+    for text, color, percent in hud_lines(contact, labels, no_contact_color, percent_format):
+        cv2.putText(image, text, (x_offset, y_offset), cv2.FONT_HERSHEY_SIMPLEX,
+                    percent_scale if percent else font_scale, color,
+                    percent_thickness if percent else thickness)
+        y_offset += line_height
+    return image
+
+
+def hud_lines(contact, labels, no_contact_color, percent_format):
+    # (text, colour, is the percentage line) for every HUD line
+    lines = [(f"{part}: {labels[0] if in_contact else labels[1]}",
+              (0, 255, 0) if in_contact else no_contact_color, False)
+             for part, in_contact in zip(contact_logic.PART_NAMES, contact.tolist())]
+    total_parts = max(len(contact), 1)
+    contact_percentage = (np.count_nonzero(contact) / total_parts) * 100
+    lines.append((percent_format.format(contact_percentage), (255, 255, 255), True))
+    return lines
+
+
+class HudLayer:
+    # draw_hud without per-frame text rendering. every distinct line is
+    # rendered once into a small image and mask, the HUD block is assembled
+    # from those only when the contact flags change, and each frame gets a
+    # single masked copy of the block.
+    #
+    # anchor is the block's top-left corner as a fraction of the frame and
+    # the sizes are for a frame reference_height pixels high, scaled to the
+    # actual one, so the HUD lands in the same place at any resolution
+    def __init__(self, anchor=(0.015, 0.02), reference_height=HUD_REFERENCE_HEIGHT,
+                 line_height=25, font_scale=0.9, percent_scale=1.0, thickness=2,
+                 percent_thickness=2, labels=("Contact", "No Contact"),
+                 no_contact_color=(100, 100, 100),
+                 percent_format="Contact Percentage: {:.1f}%"):
+        self.anchor = anchor
+        self.reference_height = reference_height
+        self.line_height = line_height
+        self.font_scale = font_scale
+        self.percent_scale = percent_scale
+        self.thickness = thickness
+        self.percent_thickness = percent_thickness
+        self.labels = labels
+        self.no_contact_color = no_contact_color
+        self.percent_format = percent_format
+        self.builds = 0
+        self._scale = None
+        self._glyphs = {}
+        self._key = None
+        self._block = None
+        self._mask = None
+
+    def _line(self, text, color, percent):
+        # rendered text and its mask, cached for the current scale
+        key = (text, color, percent)
+        line = self._glyphs.get(key)
+        if line is None:
+            font_scale = (self.percent_scale if percent else self.font_scale) * self._scale
+            thickness = max(1, round((self.percent_thickness if percent
+                                      else self.thickness) * self._scale))
+            (width, height), baseline = cv2.getTextSize(
+                text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+            pad = thickness
+            image = np.zeros((height + baseline + 2 * pad, width + 2 * pad, 3), np.uint8)
+            mask = np.zeros(image.shape[:2], np.uint8)
+            origin = (pad, pad + height)
+            cv2.putText(image, text, origin, cv2.FONT_HERSHEY_SIMPLEX, font_scale,
+                        color, thickness)
+            cv2.putText(mask, text, origin, cv2.FONT_HERSHEY_SIMPLEX, font_scale,
+                        255, thickness)
+            # ascent above the baseline, to line baselines up in the block
+            line = self._glyphs[key] = (image, mask, origin[1])
+        return line
+
+    def _build(self, contact):
+        lines = [self._line(*line) for line in hud_lines(
+            contact, self.labels, self.no_contact_color, self.percent_format)]
+        step = round(self.line_height * self._scale)
+        ascent = max(top for _, _, top in lines)
+        width = max(image.shape[1] for image, _, _ in lines)
+        height = max(ascent - top + i * step + image.shape[0]
+                     for i, (image, _, top) in enumerate(lines))
+
+        self._block = np.zeros((height, width, 3), np.uint8)
+        self._mask = np.zeros((height, width), np.uint8)
+        for i, (image, mask, top) in enumerate(lines):
+            y = ascent - top + i * step
+            h, w = mask.shape
+            # lines never overlap at sane line heights; where they do, the
+            # later one wins as with putText
+            cv2.copyTo(image, mask, self._block[y:y + h, :w])
+            self._mask[y:y + h, :w] |= mask
+        self.builds += 1
+
+    def draw(self, image, contact, level):
+        if level == RENDER_NONE:
+            return image
+
+        frame_height, frame_width = image.shape[:2]
+        scale = frame_height / self.reference_height
+        if scale != self._scale:
+            self._scale = scale
+            self._glyphs = {}
+            self._key = None
+        key = contact.tobytes()
+        if key != self._key:
+            self._build(contact)
+            self._key = key
+
+        # top-left corner, clipped to the frame
+        x = round(self.anchor[0] * frame_width)
+        y = round(self.anchor[1] * frame_height)
+        height, width = self._mask.shape
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + width, frame_width), min(y + height, frame_height)
+        if x1 > x0 and y1 > y0:
+            cv2.copyTo(self._block[y0 - y:y1 - y, x0 - x:x1 - x],
+                       self._mask[y0 - y:y1 - y, x0 - x:x1 - x], image[y0:y1, x0:x1])
+        return image
+
+
+def render(frame, analysis, level=RENDER_FULL, overlay_weight=0.15, arena=None,
+           hud=None, **hud_style):
+    # hud is an optional HudLayer, otherwise draw_hud with hud_style
+    image = render_scene(frame, analysis, level, overlay_weight, arena)
+    if level != RENDER_NONE and image is frame:
+        # the HUD draws in place, never onto the caller's camera frame
+        image = arena.copy(frame) if arena is not None else frame.copy()
+    if hud is not None:
+        return hud.draw(image, analysis.contact, level)
+    return draw_hud(image, analysis.contact, level, **hud_style)
+
+
+def draw_perf_hud(image, snapshot, origin=(10, 30), line_height=22, font_scale=0.55):
+    # fps, per-stage p50/p95 and dropped frames from a metrics snapshot
+    lines = [f"{snapshot['fps']:.1f} fps"]
+    for name, stage in sorted(snapshot["stages"].items()):
+        lines.append(f"{name}: {stage['p50_ms']:.1f} ms (p95 {stage['p95_ms']:.1f})")
+    gauges = snapshot["gauges"]
+    dropped = [f"{name[:-len('_dropped')]} {value}"
+               for name, value in sorted(gauges.items()) if name.endswith("_dropped")]
+    if dropped:
+        lines.append("dropped: " + ", ".join(dropped))
+
+    x, y = origin
+    width = int(max(len(line) for line in lines) * 11 * font_scale / 0.55)
+    cv2.rectangle(image, (x - 6, y - line_height + 4),
+                  (x + width, y + line_height * (len(lines) - 1) + 8), (0, 0, 0), -1)
+    for line in lines:
+        cv2.putText(image, line, (x, y), cv2.FONT_HERSHEY_SIMPLEX,
+                    font_scale, (255, 255, 255), 1)
+        y += line_height
+    return image
@@ -0,0 +1,537 @@
+# pluggable frame sources: live camera, video file, image directory and raw dumps
+#
+# every source looks like the shared CameraManager (acquire/release/read/
+# isOpened), so the pipeline and the entry points don't care where frames come
+# from. sources are picked with TOUCH_GRASS_SOURCE:
+#
+#   camera | camera:1              live webcam (the default)
+#   path/to/clip.mp4               video file
+#   path/to/frames/                directory of images, in name order
+#   path/to/session.tgraw          raw dump written by FrameRecorder
+#
+# TOUCH_GRASS_REPLAY=realtime replays files at their recorded timing, "fast"
+# hands frames out as quickly as they can be decoded. TOUCH_GRASS_RECORD=path
+# records whatever the source delivers to a raw dump for later replay.
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from vision.camera import CameraManager, shared_camera
+
+SOURCE_ENV = "TOUCH_GRASS_SOURCE"
+REPLAY_ENV = "TOUCH_GRASS_REPLAY"
+RECORD_ENV = "TOUCH_GRASS_RECORD"
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+RAW_EXTENSION = ".tgraw"
+
+# raw dumps: 16 byte header, then fixed-size records of a float64 timestamp
+# followed by the frame bytes. a truncated last record is simply ignored.
+RAW_MAGIC = b"TGRF"
+RAW_VERSION = 1
+RAW_HEADER_SIZE = 16
+
+# image directories have no timing of their own
+IMAGE_DIR_FPS = 30.0
+# frames decoded ahead of the consumer for file sources
+DECODE_AHEAD = 4
+# seconds a read waits for the decoder before it reports no frame
+DECODE_TIMEOUT = 1.0
+# frames the recorder may buffer before it starts dropping
+RECORD_QUEUE = 64
+
+
+def raw_record_dtype(height, width, channels=3):
+    return np.dtype([("t", "<f8"), ("frame", np.uint8, (height, width, channels))])
+
+
+def raw_header(height, width, channels=3):
+    header = np.zeros(RAW_HEADER_SIZE, dtype=np.uint8)
+    header[:4] = np.frombuffer(RAW_MAGIC, dtype=np.uint8)
+    header[4] = RAW_VERSION
+    header[5] = channels
+    header[8:16] = np.array([height, width], dtype="<u4").view(np.uint8)
+    return header.tobytes()
+
+
+class ReplayPacer:
+    # sleeps so frames come out at their recorded spacing, scaled by speed
+    def __init__(self, speed=1.0):
+        self.speed = speed
+        self.reset()
+
+    def reset(self):
+        self._origin = None
+
+    def wait(self, t):
+        now = time.monotonic()
+        if self._origin is None or t < self._origin[1]:
+            # first frame, or the source looped back to the start
+            self._origin = (now, t)
+            return
+        wall, start = self._origin
+        delay = wall + (t - start) / self.speed - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class FrameSource:
+    # file-backed source with the CameraManager interface
+    #
+    # subclasses implement _open, _close and _next, which returns the next
+    # (frame, timestamp in seconds) or None at the end. with realtime=True,
+    # read() sleeps so frames come out at their recorded spacing.
+    def __init__(self, loop=False, realtime=False, speed=1.0):
+        self.loop = loop
+        self.realtime = realtime
+        self.pacer = ReplayPacer(speed)
+        self.timestamp = None
+        self.frames = 0
+
+        self._lock = threading.Lock()
+        self._users = 0
+        self._opened = False
+
+    def acquire(self):
+        with self._lock:
+            if not self._opened:
+                self._open()
+                self._opened = True
+                self.pacer.reset()
+            self._users += 1
+        return self
+
+    def release(self):
+        with self._lock:
+            if self._users == 0:
+                return
+            self._users -= 1
+            if self._users == 0 and self._opened:
+                self._close()
+                self._opened = False
+
+    def close(self):
+        with self._lock:
+            self._users = 0
+            if self._opened:
+                self._close()
+                self._opened = False
+
+    def is_opened(self):
+        return self._opened
+
+    isOpened = is_opened
+
+    def read(self):
+        with self._lock:
+            if not self._opened:
+                return False, None
+            item = self._next()
+            if item is None and self.loop and self.frames:
+                self._rewind()
+                item = self._next()
+            if item is None:
+                return False, None
+
+        frame, t = item
+        if self.realtime:
+            self.pacer.wait(t)
+        self.timestamp = t
+        self.frames += 1
+        return True, frame
+
+    def seek(self, index):
+        # position the next read() at frame `index`
+        with self._lock:
+            self._seek(index)
+        self.pacer.reset()
+
+    def frame_count(self):
+        with self._lock:
+            return self._frame_count()
+
+    def _rewind(self):
+        self._close()
+        self._open()
+
+    def _seek(self, index):
+        raise NotImplementedError
+
+    def _frame_count(self):
+        raise NotImplementedError
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+    def _next(self):
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class VideoFileSource(FrameSource):
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._cap = None
+
+    def _open(self):
+        self._cap = cv2.VideoCapture(self.path)
+        if not self._cap.isOpened():
+            print(f"Warning: Could not open video {self.path}")
+
+    def _close(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    def _next(self):
+        ret, frame = self._cap.read()
+        if not ret:
+            return None
+        return frame, self._cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+
+    def _seek(self, index):
+        self._cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+
+    def _frame_count(self):
+        # container metadata, which can be slightly off for some codecs
+        return max(int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT)), 0)
+
+
+class ImageDirSource(FrameSource):
+    # every image in a directory, sorted by name, at a fixed frame rate
+    def __init__(self, path, fps=IMAGE_DIR_FPS, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.fps = fps
+        self._names = []
+        self._index = 0
+
+    def _open(self):
+        self._names = sorted(name for name in os.listdir(self.path)
+                             if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+        self._index = 0
+
+    def _next(self):
+        while self._index < len(self._names):
+            name = self._names[self._index]
+            t = self._index / self.fps
+            self._index += 1
+            frame = cv2.imread(os.path.join(self.path, name))
+            if frame is not None:
+                return frame, t
+            print(f"Warning: Could not load {name}")
+        return None
+
+    def _seek(self, index):
+        self._index = index
+
+    def _frame_count(self):
+        return len(self._names)
+
+
+class RawFrameSource(FrameSource):
+    # memory-mapped raw dump; frames are views into the file, no decoding
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._records = None
+        self._index = 0
+
+    def _open(self):
+        self._records = open_raw(self.path)
+        self._index = 0
+
+    def _close(self):
+        self._records = None
+
+    def _next(self):
+        if self._index >= len(self._records):
+            return None
+        record = self._records[self._index]
+        self._index += 1
+        return record["frame"], float(record["t"])
+
+    def _seek(self, index):
+        self._index = index
+
+    def _frame_count(self):
+        return len(self._records)
+
+
+def open_raw(path):
+    # structured memmap over every complete record of a raw dump
+    header = np.fromfile(path, dtype=np.uint8, count=RAW_HEADER_SIZE)
+    if len(header) < RAW_HEADER_SIZE or bytes(header[:4]) != RAW_MAGIC \
+            or header[4] != RAW_VERSION:
+        raise ValueError(f"{path} is not a raw frame dump")
+
+    height, width = header[8:16].view("<u4")
+    dtype = raw_record_dtype(int(height), int(width), int(header[5]))
+    count = (os.path.getsize(path) - RAW_HEADER_SIZE) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=RAW_HEADER_SIZE, shape=(count,))
+
+
+class DecodeAhead:
+    # decodes frames of a file source on a background thread, keeping up to
+    # `depth` frames ready. nothing is dropped, so replays stay deterministic;
+    # pacing happens on the consumer side. an exception in the decoder ends
+    # the stream and is raised again by read().
+    _END = object()
+
+    def __init__(self, source, depth=DECODE_AHEAD, timeout=DECODE_TIMEOUT):
+        self.source = source
+        self.depth = depth
+        self.timeout = timeout
+        self.realtime = source.realtime
+        self.pacer = source.pacer
+        self.timestamp = None
+        source.realtime = False
+        self._ready = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._users = 0
+
+    def acquire(self):
+        with self._lock:
+            if self._users == 0:
+                self.source.acquire()
+                self._ready = queue.Queue(self.depth)
+                self._stop.clear()
+                self.pacer.reset()
+                self._thread = threading.Thread(
+                    target=self._run, name="decode-ahead", daemon=True)
+                self._thread.start()
+            self._users += 1
+        return self
+
+    def release(self):
+        with self._lock:
+            if self._users == 0:
+                return
+            self._users -= 1
+            if self._users == 0:
+                self._shutdown()
+
+    def close(self):
+        with self._lock:
+            self._users = 0
+            self._shutdown()
+
+    def _shutdown(self):
+        # caller holds the lock
+        self._stop.set()
+        if self._thread is not None:
+            # unblock a decoder waiting on a full ring
+            while self._thread.is_alive():
+                try:
+                    self._ready.get_nowait()
+                except queue.Empty:
+                    pass
+                self._thread.join(0.05)
+            self._thread = None
+        self.source.close()
+
+    def is_opened(self):
+        return self._thread is not None
+
+    isOpened = is_opened
+
+    def read(self):
+        ready = self._ready
+        if ready is None:
+            return False, None
+        try:
+            item = ready.get(timeout=self.timeout)
+        except queue.Empty:
+            # decoder stalled, or released underneath us: a failed read, like
+            # a camera that misses a frame
+            return False, None
+        if item is self._END or isinstance(item, BaseException):
+            # keep reporting the end or the error to later readers too
+            ready.put(item)
+            if item is self._END:
+                return False, None
+            raise item
+
+        frame, t = item
+        if self.realtime:
+            self.pacer.wait(t)
+        self.timestamp = t
+        return True, frame
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                ret, frame = self.source.read()
+                item = (frame, self.source.timestamp) if ret else self._END
+            except Exception as e:
+                ret, item = False, e
+            while not self._stop.is_set():
+                try:
+                    self._ready.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if not ret:
+                return
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class FrameRecorder:
+    # appends frames to a raw dump from a writer thread, so recording costs the
+    # capture thread one queue put. frames that arrive while the queue is full
+    # are dropped and counted rather than stalling capture.
+    def __init__(self, path, queue_size=RECORD_QUEUE):
+        self.path = path
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(queue_size)
+        self._shape = None
+        self._start = None
+        self._thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+        self._thread.start()
+
+    def write(self, frame, t=None):
+        if t is None:
+            t = time.monotonic()
+        if self._start is None:
+            self._start = t
+        if self._shape is None:
+            self._shape = frame.shape
+        elif frame.shape != self._shape:
+            # a dump holds one frame size only
+            self.dropped += 1
+            return
+        try:
+            self._queue.put_nowait((np.ascontiguousarray(frame), t - self._start))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        f = None
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                frame, t = item
+                if f is None:
+                    height, width = frame.shape[:2]
+                    channels = frame.shape[2] if frame.ndim == 3 else 1
+                    f = open(self.path, "wb")
+                    f.write(raw_header(height, width, channels))
+                f.write(np.float64(t).tobytes())
+                f.write(frame.data)
+                self.written += 1
+        except OSError as e:
+            print(f"Warning: Could not record to {self.path}: {e}")
+        finally:
+            if f is not None:
+                f.close()
+
+
+class RecordingSource:
+    # passes frames through from another source and records them
+    def __init__(self, source, path):
+        self.source = source
+        self.path = path
+        self.recorder = None
+
+    def acquire(self):
+        self.source.acquire()
+        if self.recorder is None:
+            self.recorder = FrameRecorder(self.path)
+        return self
+
+    def release(self):
+        self.source.release()
+        if not self.source.is_opened():
+            self._stop_recording()
+
+    def close(self):
+        self.source.close()
+        self._stop_recording()
+
+    def _stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            print(f"Recorded {self.recorder.written} frames to {self.path}")
+            self.recorder = None
+
+    def is_opened(self):
+        return self.source.is_opened()
+
+    isOpened = is_opened
+
+    def read(self):
+        ret, frame = self.source.read()
+        recorder = self.recorder
+        if ret and recorder is not None:
+            recorder.write(frame, getattr(self.source, "timestamp", None))
+        return ret, frame
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+def open_source(spec="camera", realtime=True, loop=False, decode_ahead=DECODE_AHEAD):
+    # source for a TOUCH_GRASS_SOURCE style spec
+    name, _, arg = spec.partition(":")
+    if name == "camera":
+        if not arg:
+            return shared_camera()
+        return CameraManager(int(arg))
+
+    if os.path.isdir(spec):
+        source = ImageDirSource(spec, realtime=realtime, loop=loop)
+    elif spec.endswith(RAW_EXTENSION):
+        source = RawFrameSource(spec, realtime=realtime, loop=loop)
+    else:
+        source = VideoFileSource(spec, realtime=realtime, loop=loop)
+
+    if decode_ahead > 0:
+        return DecodeAhead(source, decode_ahead)
+    return source
+
+
+def source_from_env(loop=False):
+    # frame source, replay speed and recording picked through TOUCH_GRASS_*
+    spec = os.environ.get(SOURCE_ENV, "camera")
+    realtime = os.environ.get(REPLAY_ENV, "realtime") != "fast"
+    source = open_source(spec, realtime=realtime, loop=loop)
+
+    record_path = os.environ.get(RECORD_ENV)
+    if record_path:
+        source = RecordingSource(source, record_path)
+    return source
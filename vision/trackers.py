@@ -0,0 +1,406 @@
+# pose tracking backends behind one interface
+#
+# every tracker takes an RGB frame and returns a TrackingResult holding the
+# packed (LANDMARK_COUNT, 4) landmark array used by the contact engine plus the
+# mediapipe landmark lists used for drawing. DecimatedTracker wraps any backend
+# and only runs inference every N frames, predicting the frames in between;
+# PresenceGate skips inference while the scene is empty and still.
+import os
+import time
+
+import mediapipe as mp
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+import vision.contact_logic as contact_logic
+from core.metrics import metrics
+from vision.presence import MAX_SKIPPED, MotionDetector, presence_gate_from_env
+
+mp_holistic = mp.solutions.holistic
+mp_pose = mp.solutions.pose
+
+# "holistic" runs face mesh, both hands and pose; "pose" runs pose only
+BACKENDS = ("holistic", "pose")
+DEFAULT_BACKEND = "holistic"
+DEFAULT_MODEL_COMPLEXITY = 1
+
+# TOUCH_GRASS_TRACKER=backend[:complexity], e.g. "pose:0"
+TRACKER_ENV = "TOUCH_GRASS_TRACKER"
+# TOUCH_GRASS_INFER_EVERY=N runs inference on every Nth frame only
+INFER_EVERY_ENV = "TOUCH_GRASS_INFER_EVERY"
+# TOUCH_GRASS_PREDICTOR=velocity|kalman fills the frames in between
+PREDICTOR_ENV = "TOUCH_GRASS_PREDICTOR"
+
+
+class TrackingResult:
+    __slots__ = ("landmarks", "pose_landmarks", "left_hand_landmarks",
+                 "right_hand_landmarks", "inferred")
+
+    def __init__(self, landmarks, pose_landmarks=None, left_hand_landmarks=None,
+                 right_hand_landmarks=None, inferred=True):
+        self.landmarks = landmarks
+        self.pose_landmarks = pose_landmarks
+        self.left_hand_landmarks = left_hand_landmarks
+        self.right_hand_landmarks = right_hand_landmarks
+        self.inferred = inferred
+
+    @classmethod
+    def from_array(cls, landmarks, inferred=False):
+        # landmark lists rebuilt from a (predicted) array, for drawing
+        return cls(
+            landmarks,
+            _landmark_list(landmarks[:contact_logic.POSE_LANDMARK_COUNT]),
+            _landmark_list(landmarks[contact_logic.LEFT_HAND_OFFSET:
+                                     contact_logic.RIGHT_HAND_OFFSET]),
+            _landmark_list(landmarks[contact_logic.RIGHT_HAND_OFFSET:]),
+            inferred=inferred,
+        )
+
+
+def _landmark_list(rows):
+    if not np.isfinite(rows[:, 0]).any():
+        return None
+    landmark_list = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z, visibility in rows.tolist():
+        lmrk = landmark_list.landmark.add()
+        if x == x:  # NaN check
+            lmrk.x, lmrk.y, lmrk.z, lmrk.visibility = x, y, z, visibility
+        else:
+            lmrk.visibility = 0.0
+    return landmark_list
+
+
+class SolutionTracker:
+    # adapts any mediapipe solution object with a process() method
+    def __init__(self, solution):
+        self.solution = solution
+
+    def process(self, image):
+        results = self.solution.process(image)
+        pose = results.pose_landmarks
+        left = getattr(results, "left_hand_landmarks", None)
+        right = getattr(results, "right_hand_landmarks", None)
+        landmarks = contact_logic.landmarks_to_array(pose, left, right)
+        return TrackingResult(landmarks, pose, left, right)
+
+    def warm_up(self, width=640, height=480):
+        # push one blank frame through the graph so the first real one is fast
+        self.solution.process(np.zeros((height, width, 3), dtype=np.uint8))
+
+    def reset(self):
+        pass
+
+    def close(self):
+        self.solution.close()
+
+
+class HolisticTracker(SolutionTracker):
+    def __init__(self, model_complexity=DEFAULT_MODEL_COMPLEXITY,
+                 min_detection_confidence=0.5, min_tracking_confidence=0.5):
+        super().__init__(mp_holistic.Holistic(
+            model_complexity=model_complexity,
+            min_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence))
+
+
+class PoseTracker(SolutionTracker):
+    # pose landmarks only - no face mesh, no hand models
+    def __init__(self, model_complexity=DEFAULT_MODEL_COMPLEXITY,
+                 min_detection_confidence=0.5, min_tracking_confidence=0.5):
+        super().__init__(mp_pose.Pose(
+            model_complexity=model_complexity,
+            min_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence))
+
+
+# landmarks of a frame that was not run through the model; read only. built
+# on first use: contact_logic imports this module through body_tracker, so its
+# constants may not exist yet while this one is being imported
+_no_landmarks = None
+
+
+def _empty_landmarks():
+    global _no_landmarks
+    if _no_landmarks is None:
+        landmarks = np.full((contact_logic.LANDMARK_COUNT, 4), np.nan, dtype=np.float32)
+        landmarks.setflags(write=False)
+        _no_landmarks = landmarks
+    return _no_landmarks
+
+
+class ConstantVelocityPredictor:
+    # extrapolates every landmark from its last two observations
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._last = None
+        self._last_time = None
+        self._velocity = None
+
+    def update(self, landmarks, t):
+        if self._last is not None and t > self._last_time:
+            velocity = (landmarks - self._last) / (t - self._last_time)
+            # landmarks that just appeared or vanished do not move
+            self._velocity = np.nan_to_num(velocity, nan=0.0)
+        else:
+            self._velocity = np.zeros_like(landmarks)
+        self._last = landmarks.copy()
+        self._last_time = t
+
+    def predict(self, t):
+        if self._last is None:
+            return None
+        predicted = self._last.copy()
+        dt = t - self._last_time
+        # visibility is carried over, only positions move
+        predicted[:, :3] += self._velocity[:, :3] * dt
+        return predicted
+
+
+class KalmanPredictor:
+    # constant-velocity Kalman filter per coordinate, vectorised over all
+    # landmarks; smoother than ConstantVelocityPredictor on jittery input
+    def __init__(self, process_noise=1.0, measurement_noise=1e-4):
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.reset()
+
+    def reset(self):
+        self._state = None  # (N, 3, 2): position, velocity per coordinate
+        self._cov = None  # (N, 3, 2, 2)
+        self._seen = None
+        self._visibility = None
+        self._time = None
+
+    def _initial_cov(self, shape):
+        cov = np.zeros(shape + (2, 2), dtype=np.float64)
+        cov[..., 0, 0] = self.measurement_noise
+        cov[..., 1, 1] = 1.0
+        return cov
+
+    def _propagate(self, dt):
+        # x' = F x, P' = F P F^T + Q for F = [[1, dt], [0, 1]]
+        pos = self._state[..., 0] + self._state[..., 1] * dt
+        state = np.stack([pos, self._state[..., 1]], axis=-1)
+
+        p = self._cov
+        q = self.process_noise
+        p00 = p[..., 0, 0] + dt * (p[..., 1, 0] + p[..., 0, 1]) + dt * dt * p[..., 1, 1]
+        p01 = p[..., 0, 1] + dt * p[..., 1, 1]
+        p11 = p[..., 1, 1]
+        cov = np.empty_like(p)
+        cov[..., 0, 0] = p00 + q * dt ** 3 / 3
+        cov[..., 0, 1] = cov[..., 1, 0] = p01 + q * dt ** 2 / 2
+        cov[..., 1, 1] = p11 + q * dt
+        return state, cov
+
+    def update(self, landmarks, t):
+        measured = landmarks[:, :3].astype(np.float64)
+        seen = np.isfinite(measured)
+        measured = np.nan_to_num(measured)
+
+        if self._state is None:
+            self._state = np.zeros(measured.shape + (2,), dtype=np.float64)
+            self._cov = self._initial_cov(measured.shape)
+            fresh = seen
+        else:
+            state, cov = self._propagate(max(t - self._time, 0.0))
+
+            # scalar measurement of position: K = P H^T / (H P H^T + R)
+            innovation = measured - state[..., 0]
+            s = cov[..., 0, 0] + self.measurement_noise
+            k0 = cov[..., 0, 0] / s
+            k1 = cov[..., 1, 0] / s
+            state[..., 0] += k0 * innovation
+            state[..., 1] += k1 * innovation
+
+            # P' = (I - K H) P
+            new_cov = np.empty_like(cov)
+            new_cov[..., 0, 0] = (1 - k0) * cov[..., 0, 0]
+            new_cov[..., 0, 1] = (1 - k0) * cov[..., 0, 1]
+            new_cov[..., 1, 0] = cov[..., 1, 0] - k1 * cov[..., 0, 0]
+            new_cov[..., 1, 1] = cov[..., 1, 1] - k1 * cov[..., 0, 1]
+
+            self._state, self._cov = state, new_cov
+            fresh = seen & ~self._seen
+
+        # landmarks seen for the first time start at rest where they were seen
+        self._state[fresh, 0] = measured[fresh]
+        self._state[fresh, 1] = 0.0
+        self._cov[fresh] = self._initial_cov((1,))[0]
+
+        self._seen = seen
+        self._visibility = landmarks[:, 3].copy()
+        self._time = t
+
+    def predict(self, t):
+        if self._state is None:
+            return None
+        state, _ = self._propagate(max(t - self._time, 0.0))
+        predicted = np.empty((state.shape[0], 4), dtype=np.float32)
+        predicted[:, :3] = np.where(self._seen, state[..., 0], np.nan)
+        predicted[:, 3] = self._visibility
+        return predicted
+
+
+PREDICTORS = {
+    "velocity": ConstantVelocityPredictor,
+    "kalman": KalmanPredictor,
+}
+
+
+class DecimatedTracker:
+    # runs the wrapped tracker on every Nth frame and predicts the rest
+    def __init__(self, tracker, infer_every=2, predictor="velocity", clock=time.monotonic):
+        self.tracker = tracker
+        self.infer_every = max(1, infer_every)
+        self.predictor = PREDICTORS[predictor]()
+        self.clock = clock
+        self.frames = 0
+        self.inferences = 0
+
+    def process(self, image):
+        t = self.clock()
+        infer = self.frames % self.infer_every == 0
+        self.frames += 1
+
+        if not infer:
+            predicted = self.predictor.predict(t)
+            if predicted is not None:
+                return TrackingResult.from_array(predicted)
+
+        result = self.tracker.process(image)
+        self.inferences += 1
+        if result.pose_landmarks:
+            self.predictor.update(result.landmarks, t)
+        else:
+            # nobody in frame, do not extrapolate a ghost
+            self.predictor.reset()
+        return result
+
+    def warm_up(self, width=640, height=480):
+        self.tracker.warm_up(width, height)
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.predictor.reset()
+        self.tracker.reset()
+
+    def close(self):
+        self.tracker.close()
+
+    def stats(self):
+        stats = {
+            "frames": self.frames,
+            "inferences": self.inferences,
+            "infer_every": self.infer_every,
+        }
+        if hasattr(self.tracker, "stats"):
+            stats["presence"] = self.tracker.stats()
+        return stats
+
+
+class PresenceGate:
+    # runs the wrapped tracker only when the scene moves: frames without
+    # motion reuse the last inference, i.e. an empty result on an empty scene
+    # and the same landmarks for somebody standing still. the first frame with
+    # motion, or every max_skipped-th frame, goes to the model again
+    def __init__(self, tracker, detector=None, max_skipped=MAX_SKIPPED):
+        self.tracker = tracker
+        self.detector = detector if detector is not None else MotionDetector()
+        self.max_skipped = max_skipped
+        self.present = False
+        self.frames = 0
+        self.inferences = 0
+        self.skipped = 0
+        self.saved_seconds = 0.0
+        self._since_inference = 0
+        self._inference_seconds = 0.0
+        self._last = None
+
+    def process(self, image):
+        self.frames += 1
+        moved = self.detector.update(image)
+        if not (moved or self._last is None or self._since_inference >= self.max_skipped):
+            self._since_inference += 1
+            self.skipped += 1
+            # what the model would have cost, going by its recent runs
+            self.saved_seconds += self._inference_seconds
+            metrics.count("pose_skipped")
+            if not self.present:
+                return TrackingResult(_empty_landmarks(), inferred=False)
+            last = self._last
+            return TrackingResult(last.landmarks, last.pose_landmarks,
+                                  last.left_hand_landmarks, last.right_hand_landmarks,
+                                  inferred=False)
+
+        began = time.perf_counter()
+        result = self.tracker.process(image)
+        seconds = time.perf_counter() - began
+        if self.inferences:
+            self._inference_seconds += 0.1 * (seconds - self._inference_seconds)
+        else:
+            self._inference_seconds = seconds
+        self.inferences += 1
+        self._since_inference = 0
+        self.present = bool(result.pose_landmarks)
+        self._last = result
+        return result
+
+    def warm_up(self, width=640, height=480):
+        self.tracker.warm_up(width, height)
+        self.reset()
+
+    def reset(self):
+        # a new session may start with somebody already in view
+        self.present = False
+        self._since_inference = 0
+        self._last = None
+        self.detector.reset()
+        self.tracker.reset()
+
+    def close(self):
+        self.tracker.close()
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "inferences": self.inferences,
+            "skipped": self.skipped,
+            "skipped_pct": self.skipped * 100.0 / max(self.frames, 1),
+            "saved_ms": self.saved_seconds * 1000.0,
+            "motion": self.detector.motion,
+            "present": self.present,
+        }
+
+
+def create_tracker(backend=DEFAULT_BACKEND, model_complexity=DEFAULT_MODEL_COMPLEXITY,
+                   infer_every=1, predictor="velocity", decimated=False, gated=False):
+    # decimated=True wraps the backend even at infer_every=1, so the interval
+    # can be changed later on. gated=True puts a PresenceGate in front of the
+    # model, inside the decimation so predicted frames cost nothing extra
+    if backend == "holistic":
+        tracker = HolisticTracker(model_complexity)
+    elif backend == "pose":
+        tracker = PoseTracker(model_complexity)
+    else:
+        raise ValueError(f"Unknown tracker backend: {backend}")
+
+    if gated:
+        tracker = PresenceGate(tracker)
+    if infer_every > 1 or decimated:
+        tracker = DecimatedTracker(tracker, infer_every, predictor)
+    return tracker
+
+
+def tracker_from_env(decimated=False):
+    # backend and decimation picked through the TOUCH_GRASS_* variables
+    spec = os.environ.get(TRACKER_ENV, DEFAULT_BACKEND)
+    backend, _, complexity = spec.partition(":")
+    model_complexity = int(complexity) if complexity else DEFAULT_MODEL_COMPLEXITY
+    infer_every = int(os.environ.get(INFER_EVERY_ENV, "1"))
+    predictor = os.environ.get(PREDICTOR_ENV, "velocity")
+    return create_tracker(backend, model_complexity, infer_every, predictor, decimated,
+                          gated=presence_gate_from_env())